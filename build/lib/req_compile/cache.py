@@ -0,0 +1,61 @@
+"""Manage a wheel directory shared between runs of req-compile"""
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import sys
+
+from req_compile.cmdline import add_logging_args
+from req_compile.repos.artifactcache import get_artifact_cache, parse_size
+
+
+def cache_main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Manage a wheel directory passed to req-compile --wheel-dir"
+    )
+    add_logging_args(parser)
+    commands = parser.add_subparsers(dest="command")
+
+    info = commands.add_parser("info", help="Print the size of a wheel directory")
+    info.add_argument("wheel_dir", metavar="wheel_dir")
+
+    prune = commands.add_parser(
+        "prune",
+        help="Remove the least recently used files from a wheel directory",
+    )
+    prune.add_argument("wheel_dir", metavar="wheel_dir")
+    prune.add_argument(
+        "--max-size",
+        type=parse_size,
+        required=True,
+        metavar="size",
+        help="Size to prune the directory to, e.g. 500M or 10G",
+    )
+
+    args = parser.parse_args(args=args)
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, stream=sys.stderr)
+    else:
+        logging.basicConfig(level=logging.CRITICAL, stream=sys.stderr)
+
+    if args.command is None:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+    if not os.path.isdir(args.wheel_dir):
+        print("{} is not a directory".format(args.wheel_dir), file=sys.stderr)
+        sys.exit(1)
+
+    cache = get_artifact_cache(args.wheel_dir)
+    if args.command == "prune":
+        removed, freed = cache.prune(args.max_size)
+        print("Removed {} files, freeing {} bytes".format(removed, freed))
+    print(
+        "{}: {} files, {} bytes".format(
+            cache.directory, len(cache.artifacts()), cache.size()
+        )
+    )
+
+
+if __name__ == "__main__":
+    cache_main()
@@ -0,0 +1,455 @@
+# pylint: disable=too-many-nested-blocks
+"""Logic for compiling requirements"""
+from __future__ import print_function
+
+import itertools
+import logging
+import operator
+import sys
+from collections import defaultdict, namedtuple
+from multiprocessing.pool import ThreadPool
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import pkg_resources
+import six
+
+import req_compile.containers
+import req_compile.dists
+import req_compile.errors
+import req_compile.metadata
+import req_compile.metadata.source
+import req_compile.repos.pypi
+import req_compile.repos.repository
+import req_compile.utils
+from req_compile.containers import RequirementContainer
+from req_compile.dists import DependencyNode, DistributionCollection
+from req_compile.errors import NoCandidateException
+from req_compile.repos.repository import BaseRepository
+from req_compile.repos.source import SourceRepository
+from req_compile.utils import (
+    is_pinned_requirement,
+    merge_requirements,
+    normalize_project_name,
+    parse_requirement,
+    parse_version,
+)
+from req_compile.versions import VersionSet
+
+MAX_DOWNGRADE = 3
+
+LOG = logging.getLogger("req_compile.compile")
+
+_DEPTH_LOGGERS = {}  # type: Dict[int, logging.LoggerAdapter]
+
+# A node to compile, with the source that requires it, the depth it is at and the
+# number of downgrades allowed to resolve its conflicts
+_CompileStep = namedtuple("_CompileStep", "node source depth max_downgrade")
+
+
+class FrontierFetcher(object):
+    """Fetches candidates for the unsolved nodes of the frontier concurrently.
+
+    Results are keyed by the exact requirement and downgrade limit they were fetched
+    with. The solver only consumes a result if it asks for the same requirement,
+    so the solution is identical to fetching each candidate when it is needed"""
+
+    def __init__(self, repo, jobs):
+        # type: (BaseRepository, int) -> None
+        self.repo = repo
+        self.own_setup_py_workers = req_compile.metadata.source.use_setup_py_workers(
+            jobs
+        )
+        self.pool = ThreadPool(jobs)
+        self.pending = {}  # type: Dict[Tuple[pkg_resources.Requirement, int], Any]
+
+    def fetch(self, reqs, max_downgrade):
+        # type: (Iterable[pkg_resources.Requirement], int) -> None
+        """Start fetching candidates for the requirements in the background"""
+        for req in reqs:
+            key = (req, max_downgrade)
+            if key not in self.pending:
+                self.pending[key] = self.pool.apply_async(
+                    self.repo.get_candidate,
+                    (req,),
+                    dict(max_downgrade=max_downgrade),
+                )
+
+    def get_candidate(self, req, max_downgrade):
+        # type: (pkg_resources.Requirement, int) -> Tuple[RequirementContainer, bool]
+        """Fetch the candidate, using the background result if there is one"""
+        result = self.pending.pop((req, max_downgrade), None)
+        if result is None:
+            return self.repo.get_candidate(req, max_downgrade=max_downgrade)
+        return result.get()
+
+    def close(self):
+        # type: () -> None
+        self.pool.terminate()
+        self.pool.join()
+        if self.own_setup_py_workers:
+            req_compile.metadata.source.configure_setup_py_workers(0)
+
+
+class CompileOptions(object):
+    """Static options for a compile_roots"""
+
+    extras = None  # type: Optional[Iterable[str]]
+    allow_circular_dependencies = True
+    pinned_requirements = {}  # type: Mapping[str, pkg_resources.Requirement]
+    fetcher = None  # type: Optional[FrontierFetcher]
+
+
+def _build_spec_req(node, options):
+    # type: (DependencyNode, CompileOptions) -> pkg_resources.Requirement
+    """Build the requirement a candidate for an unsolved node must satisfy"""
+    spec_req = node.build_constraints()
+
+    if options.pinned_requirements:
+        pin = options.pinned_requirements.get(
+            normalize_project_name(spec_req.project_name), spec_req
+        )
+        spec_req = merge_requirements(spec_req, pin)
+    return spec_req
+
+
+def _fetch_frontier(nodes, options, max_downgrade):
+    # type: (Iterable[DependencyNode], CompileOptions, int) -> None
+    """Start fetching candidates for all of the unsolved nodes concurrently"""
+    if options.fetcher is None:
+        return
+    spec_reqs = [
+        _build_spec_req(node, options) for node in nodes if node.metadata is None
+    ]
+    options.fetcher.fetch(
+        [
+            spec_req
+            for spec_req in spec_reqs
+            if not VersionSet.from_requirement(spec_req).is_empty()
+        ],
+        max_downgrade,
+    )
+
+
+def _depth_logger(depth):
+    # type: (int) -> logging.LoggerAdapter
+    """Get a logger that indents its messages to the given depth"""
+    logger = _DEPTH_LOGGERS.get(depth)
+    if logger is None:
+        logger = _DEPTH_LOGGERS[depth] = logging.LoggerAdapter(LOG, dict(depth=depth))
+    return logger
+
+
+def compile_roots(
+    node,  # type: DependencyNode
+    source,  # type: Optional[DependencyNode]
+    repo,  # type: BaseRepository
+    dists,  # type: DistributionCollection
+    options,  # type: CompileOptions
+    depth=1,  # type: int
+    max_downgrade=MAX_DOWNGRADE,  # type: int
+):
+    # type: (...) -> None
+    """
+    Compile a node and everything it depends on. The graph is walked iteratively using
+    an explicit stack of pending node compilations, so there is no limit to the depth
+    of the dependency graph
+
+    Args:
+        node: The node to compile
+        source: The source node of this provided node. This is used to build the graph
+        repo: The repository to provide candidates.
+        dists: The solution that is being built incrementally
+        options: Static options for the compile (including extras)
+        depth: Depth the compilation has descended into
+        max_downgrade: The maximum number of version downgrades that will be allowed for conflicts
+    """
+    stack = [
+        _compile_node(node, source, repo, dists, options, depth, max_downgrade)
+    ]  # type: List[Iterator[_CompileStep]]
+    error = None  # type: Optional[BaseException]
+    while stack:
+        try:
+            if error is None:
+                step = next(stack[-1])
+            else:
+                # Deliver the failure of a nested compilation to the step that
+                # requested it, which may recover by backtracking
+                step, error = stack[-1].throw(error), None
+        except StopIteration:
+            stack.pop()
+            continue
+        except Exception as ex:  # pylint: disable=broad-except
+            stack.pop()
+            if not stack:
+                raise
+            error = ex
+            continue
+        stack.append(
+            _compile_node(
+                step.node,
+                step.source,
+                repo,
+                dists,
+                options,
+                step.depth,
+                step.max_downgrade,
+            )
+        )
+
+
+def _compile_node(
+    node,  # type: DependencyNode
+    source,  # type: Optional[DependencyNode]
+    repo,  # type: BaseRepository
+    dists,  # type: DistributionCollection
+    options,  # type: CompileOptions
+    depth,  # type: int
+    max_downgrade,  # type: int
+):  # pylint: disable=too-many-statements,too-many-locals,too-many-branches
+    # type: (...) -> Iterator[_CompileStep]
+    """
+    Compile a single node. Each node that must be compiled before continuing is
+    yielded, and compile_roots resumes this once it is done. If compiling it failed,
+    the exception is raised at the yield
+
+    Args:
+        See compile_roots
+    """
+    logger = _depth_logger(depth)
+    logger.debug("Processing node %s", node)
+
+    if node.metadata is not None:
+        can_reuse = node.complete and all(dep.complete for dep in node.dependencies)
+        if not can_reuse:
+            try:
+                _fetch_frontier(node.dependencies, options, max_downgrade)
+                for req in sorted(node.dependencies):
+                    if not req.complete or req.metadata is None:
+                        if dists.reaches(req, node):
+                            if options.allow_circular_dependencies:
+                                logger.debug(
+                                    "Skipping node %s because it includes this node",
+                                    node,
+                                )
+                                continue
+                            raise ValueError(
+                                "Circular dependency: {node} -> {req} -> {node}".format(
+                                    node=node,
+                                    req=req,
+                                )
+                            )
+                        yield _CompileStep(req, node, depth + 1, max_downgrade)
+            except NoCandidateException:
+                if max_downgrade == 0:
+                    raise
+                yield _CompileStep(node, source, depth, 0)
+        else:
+            logger.info("Reusing dist %s %s", node.metadata.name, node.metadata.version)
+    else:
+        spec_req = _build_spec_req(node, options)
+
+        try:
+            if VersionSet.from_requirement(spec_req).is_empty():
+                # The constraints conflict, so no candidate needs to be looked up
+                raise NoCandidateException(spec_req)
+            if options.fetcher is not None:
+                metadata, cached = options.fetcher.get_candidate(
+                    spec_req, max_downgrade
+                )
+            else:
+                metadata, cached = repo.get_candidate(
+                    spec_req, max_downgrade=max_downgrade
+                )
+            logger.debug(
+                "Acquired candidate %s %s [%s] (%s)",
+                metadata,
+                spec_req,
+                metadata.origin,
+                "cached" if cached else "download",
+            )
+            reason = None
+            if source is not None:
+                reason = source.dependencies[node]
+                if options.extras and isinstance(metadata.origin, SourceRepository):
+                    reason = merge_requirements(
+                        reason,
+                        parse_requirement(
+                            reason.project_name + "[" + ",".join(options.extras) + "]"
+                        ),
+                    )
+
+            nodes_to_recurse = dists.add_dist(metadata, source, reason)
+            _fetch_frontier(
+                itertools.chain(
+                    *(recurse_node.dependencies for recurse_node in nodes_to_recurse)
+                ),
+                options,
+                max_downgrade,
+            )
+            for recurse_node in sorted(nodes_to_recurse):
+                for child_node in sorted(recurse_node.dependencies):
+                    if dists.contains_node(child_node):
+                        yield _CompileStep(
+                            child_node, recurse_node, depth + 1, max_downgrade
+                        )
+
+            node.complete = True
+        except NoCandidateException:
+            if max_downgrade == 0:
+                raise
+
+            exc_info = sys.exc_info()
+
+            nodes = sorted(node.reverse_deps)
+
+            allowed_versions = {
+                revnode: VersionSet.from_requirement(revnode.dependencies[node])
+                for revnode in nodes
+            }
+            violate_score = defaultdict(int)  # type: Dict[DependencyNode, int]
+            for idx, revnode in enumerate(nodes):
+                for next_node in nodes[idx + 1 :]:
+                    if allowed_versions[revnode].isdisjoint(
+                        allowed_versions[next_node]
+                    ):
+                        logger.error("Violating pair: {} {}".format(revnode, next_node))
+                        violate_score[revnode] += 1
+                        violate_score[next_node] += 1
+
+            try:
+                baddest_node = next(
+                    node
+                    for node, _ in sorted(
+                        violate_score.items(), key=operator.itemgetter(1)
+                    )
+                    if node.metadata is not None and not node.metadata.meta
+                )
+            except StopIteration:
+                six.reraise(*exc_info)
+
+            bad_meta = baddest_node.metadata
+            assert bad_meta is not None
+
+            new_constraints = [
+                parse_requirement("{}!={}".format(bad_meta.name, bad_meta.version))
+            ]
+            bad_constraint = req_compile.containers.DistInfo(
+                "#bad#-{}-{}".format(baddest_node, depth),
+                parse_version("0.0.0"),
+                new_constraints,
+                meta=True,
+            )
+            dists.remove_dists(baddest_node, remove_upstream=False)
+            dists.remove_dists(node, remove_upstream=False)
+
+            bad_constraints = dists.add_dist(bad_constraint, None, None)
+            try:
+                for node_to_compile in (node, baddest_node):
+                    yield _CompileStep(node_to_compile, None, depth, max_downgrade - 1)
+
+                print(
+                    "Could not use {} {} - pin to this version to see why not".format(
+                        bad_meta.name, bad_meta.version
+                    ),
+                    file=sys.stderr,
+                )
+            finally:
+                dists.remove_dists(bad_constraints, remove_upstream=True)
+
+
+def perform_compile(
+    input_reqs,  # type: Iterable[RequirementContainer]
+    repo,  # type: BaseRepository
+    constraint_reqs=None,  # type: Iterable[RequirementContainer]
+    extras=None,  # type: Iterable[str]
+    allow_circular_dependencies=True,  # type: bool
+    jobs=1,  # type: int
+):
+    # type: (...) -> Tuple[DistributionCollection, Set[DependencyNode]]
+    """
+    Perform a compilation using the given inputs and constraints
+
+    Args:
+        input_reqs:
+            List of mapping of input requirements. If provided a mapping,
+            requirements will be kept separate during compilation for better
+            insight into the resolved requirements
+        repo: Repository to use as a source of Python packages.
+        extras: Extras to apply automatically to source projects
+        constraint_reqs: Constraints to use when compiling
+        allow_circular_dependencies: Whether or not to allow circular dependencies
+        jobs: Number of threads used to fetch candidates for the unsolved nodes of the
+            graph concurrently. The solution does not depend on this value
+    Returns:
+        the solution and root nodes used to generate it
+    """
+    results = req_compile.dists.DistributionCollection(on_placeholder=repo.prefetch)
+
+    constraint_nodes = set()
+    nodes = set()
+    all_pinned = True
+    pinned_requirements = {}
+
+    if constraint_reqs is not None:
+        for constraint_source in constraint_reqs:
+            all_pinned &= all([is_pinned_requirement(req) for req in constraint_source])
+            if all_pinned:
+                for req in constraint_source:
+                    pinned_requirements[normalize_project_name(req.project_name)] = req
+
+        if not all_pinned:
+            for constraint_source in constraint_reqs:
+                constraint_node = results.add_dist(constraint_source, None, None)
+                constraint_nodes |= constraint_node
+                nodes |= constraint_nodes
+
+    roots = set()
+    for req_source in input_reqs:
+        roots |= results.add_dist(req_source, None, None)
+
+    nodes |= roots
+
+    options = CompileOptions()
+    options.allow_circular_dependencies = allow_circular_dependencies
+    options.extras = extras
+
+    if all_pinned:
+        LOG.info("All constraints were pins - no need to solve the constraints")
+        options.pinned_requirements = pinned_requirements
+
+    if jobs > 1:
+        options.fetcher = FrontierFetcher(repo, jobs)
+
+    try:
+        for node in sorted(nodes):
+            compile_roots(node, None, repo, results, options)
+    except (NoCandidateException, req_compile.errors.MetadataError) as ex:
+        _add_constraints(all_pinned, constraint_reqs, results)
+        ex.results = results
+        raise
+    finally:
+        if options.fetcher is not None:
+            options.fetcher.close()
+
+    # Add the constraints in so it will show up as a contributor in the results.
+    # The same is done in the exception block above
+    _add_constraints(all_pinned, constraint_reqs, results)
+
+    return results, roots
+
+
+def _add_constraints(all_pinned, constraint_reqs, results):
+    # type: (bool, Optional[Iterable[RequirementContainer]], DistributionCollection) -> None
+    if all_pinned and constraint_reqs is not None:
+        for constraint_source in constraint_reqs:
+            results.add_dist(constraint_source, None, None)
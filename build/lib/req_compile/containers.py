@@ -0,0 +1,199 @@
+import shutil
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import packaging.utils
+import packaging.version
+import pkg_resources
+
+from req_compile import utils
+from req_compile.utils import filter_req, marker_extras, reduce_requirements
+
+# Cache key for the requirements selected by any extra that is not declared
+_UNDECLARED = object()
+
+
+class RequirementContainer(object):
+    """A container for a list of requirements"""
+
+    def __init__(self, name, reqs, meta=False):
+        # type: (str, Iterable[pkg_resources.Requirement], bool) -> None
+        self.name = name
+        self.reqs = list(reqs) if reqs else []
+        self.origin = None
+        self.meta = meta
+        self.version = None  # type: Optional[packaging.version.Version]
+
+        # The lists are shared between callers and must not be modified
+        self._requires = {}  # type: Dict[Any, List[pkg_resources.Requirement]]
+        self._declared_extras = None  # type: Optional[FrozenSet[str]]
+        self._canonical_extras = None  # type: Optional[FrozenSet[str]]
+
+    def __iter__(self):
+        return iter(self.reqs)
+
+    def add_requirement(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Add a requirement. Requirements must not be modified any other way once
+        they have been queried"""
+        self.reqs.append(req)
+        self._requires = {}
+        self._declared_extras = None
+        self._canonical_extras = None
+
+    @property
+    def declared_extras(self):
+        # type: () -> FrozenSet[str]
+        """The extras referenced by the markers of the requirements"""
+        if self._declared_extras is None:
+            extras = set()  # type: Set[str]
+            for req in self.reqs:
+                extras |= marker_extras(req.marker)
+            self._declared_extras = frozenset(extras)
+        return self._declared_extras
+
+    def requires(self, extra=None):
+        # type: (str) -> Iterable[pkg_resources.Requirement]
+        if self._canonical_extras is None:
+            self._canonical_extras = frozenset(
+                packaging.utils.canonicalize_name(declared)
+                for declared in self.declared_extras
+            )
+        # Every extra that is not declared selects the same requirements. Markers
+        # may compare extras by their normalized names (PEP 685), so "Socks_Proxy"
+        # is the declared extra "socks-proxy"
+        key = extra
+        if extra and packaging.utils.canonicalize_name(extra) not in (
+            self._canonical_extras
+        ):
+            key = _UNDECLARED
+        result = self._requires.get(key)
+        if result is None:
+            result = self._requires[key] = reduce_requirements(
+                req for req in self.reqs if filter_req(req, extra)
+            )
+        return result
+
+    def to_definition(self, extras):
+        # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
+        raise NotImplementedError()
+
+
+class RequirementsFile(RequirementContainer):
+    """Represents a requirements file - a text file containing a list of requirements"""
+
+    def __init__(self, filename, reqs, **_kwargs):
+        # type: (str, Iterable[pkg_resources.Requirement], **Any) -> None
+        super(RequirementsFile, self).__init__(filename, reqs, meta=True)
+
+    def __repr__(self):
+        # type: () -> str
+        return "RequirementsFile({})".format(self.name)
+
+    @classmethod
+    def from_file(cls, full_path, **kwargs):
+        # type: (str, **Any) -> RequirementsFile
+        """Load requirements from a file and build a RequirementsFile
+
+        Args:
+            full_path (str): The path to the file to load
+
+        Keyword Args:
+            Additional arguments to forward to the class constructor
+        """
+        reqs = utils.reqs_from_files([full_path])
+        return cls(full_path, reqs, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+    def to_definition(self, extras):
+        # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
+        return self.name, None
+
+
+class DistInfo(RequirementContainer):
+    """Metadata describing a distribution of a project"""
+
+    def __init__(self, name, version, reqs, meta=False):
+        # type: (str, packaging.version.Version, Iterable[pkg_resources.Requirement], bool) -> None
+        """
+        Args:
+            name: The project name
+            version: Parsed version of the project
+            reqs: The list of requirements for the project
+            meta: Whether or not hte requirement is a meta-requirement
+        """
+        super(DistInfo, self).__init__(name, reqs, meta=meta)
+        self.version = version
+        self.source = None
+
+    def __str__(self):
+        # type: () -> str
+        return "{}=={}".format(*self.to_definition(None))
+
+    def to_definition(self, extras):
+        # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
+        req_expr = "{}{}".format(
+            self.name, ("[" + ",".join(sorted(extras)) + "]") if extras else ""
+        )
+        return req_expr, self.version
+
+    def __repr__(self):
+        # type: () -> str
+        return (
+            self.name
+            + " "
+            + str(self.version)
+            + "\n"
+            + "\n".join([str(req) for req in self.reqs])
+        )
+
+
+class PkgResourcesDistInfo(RequirementContainer):
+    def __init__(self, dist, temp_dir=None):
+        # type: (pkg_resources.Distribution, Optional[str]) -> None
+        """
+        Args:
+            dist: The distribution to wrap
+            temp_dir: Temporary directory holding the distribution, removed along
+                with this object
+        """
+        super(PkgResourcesDistInfo, self).__init__(dist.project_name, [])
+        self.dist = dist
+        self.version = dist.parsed_version  # type: ignore
+        self.temp_dir = temp_dir
+
+    def __str__(self):
+        # type: () -> str
+        return "{}=={}".format(*self.to_definition(None))
+
+    @property
+    def declared_extras(self):
+        # type: () -> FrozenSet[str]
+        return frozenset(self.dist.extras)
+
+    def requires(self, extra=None):
+        # type: (str) -> Iterable[pkg_resources.Requirement]
+        result = self._requires.get(extra)
+        if result is None:
+            result = self._requires[extra] = self.dist.requires(
+                extras=(extra,) if extra else ()
+            )
+        return result
+
+    def to_definition(self, extras):
+        # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
+        req_expr = "{}{}".format(
+            self.dist.project_name,
+            ("[" + ",".join(sorted(extras)) + "]") if extras else "",
+        )
+        return req_expr, self.version
+
+    def __del__(self):
+        # type: () -> None
+        if self.temp_dir is None:
+            return
+        try:
+            shutil.rmtree(self.temp_dir)
+        except EnvironmentError:
+            pass
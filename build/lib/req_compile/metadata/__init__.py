@@ -0,0 +1 @@
+from .metadata import extract_metadata, guess_project_name
@@ -0,0 +1,130 @@
+import functools
+import io
+import logging
+import os
+import zipfile
+from typing import Optional
+
+import six
+import toml
+from six.moves import configparser
+
+from req_compile.containers import RequirementContainer
+from req_compile.errors import MetadataError
+from req_compile.repos.repository import Repository
+
+from .dist_info import _fetch_from_wheel
+from .extractor import NonExtractor, TarExtractor, ZipExtractor
+from .pyproject import fetch_from_pyproject
+from .setup_ast import evaluate_setup_kwargs
+from .source import _fetch_from_source
+
+LOG = logging.getLogger("req_compile.metadata")
+
+
+def extract_metadata(filename, run_setup_py=True, origin=None):
+    # type: (str, bool, Repository) -> Optional[RequirementContainer]
+    """Extract a DistInfo from a file or directory
+
+    Args:
+        filename: File or path to extract metadata from
+        run_setup_py: Whether or not this call is permitted to run setup.py files
+        origin: Origin of the metadata
+
+    Returns:
+        (RequirementContainer) the result of the metadata extraction
+    """
+    LOG.info("Extracting metadata for %s", filename)
+    _, ext = os.path.splitext(filename)
+    result = None
+    ext = ext.lower()
+    if ext == ".whl":
+        LOG.debug("Extracting from wheel")
+        try:
+            result = _fetch_from_wheel(filename)
+        except zipfile.BadZipfile as ex:
+            raise MetadataError(
+                os.path.basename(filename).replace(".whl", ""), "0.0", ex
+            )
+    elif ext == ".zip":
+        LOG.debug("Extracting from a zipped source package")
+        result = _fetch_from_source(filename, ZipExtractor, run_setup_py=run_setup_py)
+    elif ext in (".gz", ".bz2", ".tgz"):
+        LOG.debug("Extracting from a tar package")
+        if ext == ".tgz":
+            ext = "gz"
+        result = _fetch_from_source(
+            os.path.abspath(filename),
+            functools.partial(TarExtractor, ext.replace(".", "")),
+            run_setup_py=run_setup_py,
+        )
+    elif ext in (".egg",):
+        LOG.debug("Attempted to resolve an unsupported format")
+        return None
+    elif os.path.exists(os.path.join(filename, "pyproject.toml")):
+        LOG.debug("Extracting from a pyproject.toml")
+        result = fetch_from_pyproject(filename)
+
+    if result is None:
+        LOG.debug("Extracting directly from a source directory")
+        result = _fetch_from_source(
+            os.path.abspath(filename), NonExtractor, run_setup_py=run_setup_py
+        )
+
+    if result is not None:
+        result.origin = origin
+    return result
+
+
+def guess_project_name(source_dir):
+    # type: (str) -> Optional[str]
+    """Cheaply find the name a source directory declares for its project, from
+    the [project] table of pyproject.toml, the [metadata] of setup.cfg or a
+    literal name passed to setup() in setup.py. Nothing is run
+
+    Args:
+        source_dir: The project directory
+
+    Returns:
+        The declared name, or None if it can only be found by extracting the
+        metadata
+    """
+    pyproject_file = os.path.join(source_dir, "pyproject.toml")
+    if os.path.exists(pyproject_file):
+        try:
+            project = toml.load(pyproject_file).get("project")
+        except (toml.TomlDecodeError, EnvironmentError, UnicodeDecodeError):
+            project = None
+        if isinstance(project, dict):
+            name = project.get("name")
+            if isinstance(name, six.string_types):
+                return name
+
+    setup_cfg_file = os.path.join(source_dir, "setup.cfg")
+    if os.path.exists(setup_cfg_file):
+        parser = configparser.RawConfigParser()
+        try:
+            parser.read(setup_cfg_file)
+            if parser.has_option("metadata", "name"):
+                name = parser.get("metadata", "name").strip()
+                # attr: and file: directives need the project to be imported
+                if name and ":" not in name:
+                    return name
+        except (configparser.Error, UnicodeDecodeError):
+            pass
+
+    setup_file = os.path.join(source_dir, "setup.py")
+    if os.path.exists(setup_file):
+
+        def _open(filename, *args, **kwargs):
+            return io.open(os.path.join(source_dir, filename), *args, **kwargs)
+
+        try:
+            with io.open(setup_file, encoding="utf-8") as handle:
+                contents = handle.read()
+        except (EnvironmentError, UnicodeDecodeError):
+            return None
+        kwargs = evaluate_setup_kwargs(contents, setup_file, _open, keys=("name",))
+        if kwargs is not None and isinstance(kwargs.get("name"), six.string_types):
+            return kwargs["name"]
+    return None
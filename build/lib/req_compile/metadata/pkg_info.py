@@ -0,0 +1,136 @@
+"""Static metadata shipped inside source distributions"""
+import logging
+import posixpath
+import re
+from typing import Iterable, List, Optional, Tuple
+
+import pkg_resources
+
+from req_compile import utils
+from req_compile.containers import DistInfo
+
+from .dist_info import _parse_flat_metadata
+from .extractor import Extractor
+
+LOG = logging.getLogger("req_compile.metadata.pkg_info")
+
+# From this core metadata version, fields not marked as Dynamic are the same as
+# a build would produce (PEP 643)
+STATIC_METADATA_VERSION = (2, 2)
+
+# An .egg-info written by setuptools when the sdist was made, either in the top
+# level directory or in a src directory below it
+EGG_INFO_RE = re.compile(r"^[^/]+/(?:[^/]+/)?[^/]+\.egg-info/PKG-INFO$")
+
+
+def _metadata_headers(contents):
+    # type: (str) -> str
+    """The header section of a PKG-INFO, without the description that may follow"""
+    return contents.replace("\r\n", "\n").split("\n\n", 1)[0]
+
+
+def _header_values(headers, field):
+    # type: (str, str) -> List[str]
+    prefix = field.lower() + ":"
+    return [
+        line.partition(":")[2].strip()
+        for line in headers.split("\n")
+        if line.lower().startswith(prefix)
+    ]
+
+
+def _metadata_version(headers):
+    # type: (str) -> Optional[Tuple[int, ...]]
+    metadata_version = _header_values(headers, "Metadata-Version")
+    if not metadata_version:
+        return None
+    try:
+        return tuple(int(part) for part in metadata_version[0].split("."))
+    except ValueError:
+        return None
+
+
+def _has_dynamic_requirements(headers):
+    # type: (str) -> bool
+    """Whether a PKG-INFO says its Requires-Dist fields are computed by the build"""
+    dynamic = {value.lower() for value in _header_values(headers, "Dynamic")}
+    return "requires-dist" in dynamic
+
+
+def _parse_requires_txt(contents):
+    # type: (str) -> Iterable[pkg_resources.Requirement]
+    """Parse the requires.txt of an .egg-info. Requirements of extras and
+    environments are listed in [extra:marker] sections"""
+    for section, lines in pkg_resources.split_sections(contents):
+        extra, condition = (section or "").partition(":")[::2]
+        for line in lines:
+            req_text, line_marker = line.partition(";")[::2]
+            markers = [
+                marker.strip() for marker in (line_marker, condition) if marker.strip()
+            ]
+            if extra:
+                markers.append('extra == "{}"'.format(extra.strip()))
+            if len(markers) > 1:
+                markers = ["({})".format(marker) for marker in markers]
+            if markers:
+                req_text = "{}; {}".format(req_text.strip(), " and ".join(markers))
+            req = utils.parse_requirement(req_text)
+            if req is not None:
+                yield req
+
+
+def _read(extractor, name):
+    # type: (Extractor, str) -> str
+    # An absolute path within the archive does not depend on the working directory
+    return extractor.contents(extractor.fake_root + "/" + name)
+
+
+def _fetch_from_pkg_info(extractor):
+    # type: (Extractor) -> Optional[DistInfo]
+    """Read the metadata of a source distribution archive from the PKG-INFO it
+    ships, or from the requires.txt of its .egg-info, without running any of its
+    code
+
+    Returns:
+        The metadata, or None if it is missing or its requirements may depend on
+        running setup.py
+    """
+    names = [
+        name[2:] if name.startswith("./") else name for name in extractor.names()
+    ]
+    pkg_info = next(
+        (
+            name
+            for name in names
+            if name.count("/") <= 1 and posixpath.basename(name) == "PKG-INFO"
+        ),
+        None,
+    )
+    if pkg_info is None:
+        return None
+
+    headers = _metadata_headers(_read(extractor, pkg_info))
+    result = _parse_flat_metadata(headers)
+    if result.name is None or result.version is None:
+        return None
+
+    metadata_version = _metadata_version(headers)
+    if metadata_version is not None and metadata_version >= STATIC_METADATA_VERSION:
+        if _has_dynamic_requirements(headers):
+            # The requires.txt of the .egg-info is as dynamic as the PKG-INFO
+            return None
+        LOG.debug("Using the requirements in %s", pkg_info)
+        return result
+
+    # Older metadata can't say whether its requirements are static, but the
+    # .egg-info written with it records what setup.py produced
+    egg_infos = [name for name in names if EGG_INFO_RE.match(name)]
+    if len(egg_infos) != 1:
+        return None
+    requires_txt = posixpath.join(posixpath.dirname(egg_infos[0]), "requires.txt")
+    reqs = []  # type: List[pkg_resources.Requirement]
+    # setuptools leaves requires.txt out if there are no requirements
+    if requires_txt in names:
+        reqs = list(_parse_requires_txt(_read(extractor, requires_txt)))
+    LOG.debug("Using the requirements in %s", egg_infos[0])
+    return DistInfo(result.name, result.version, reqs)
@@ -0,0 +1,699 @@
+"""Static evaluation of setup.py files, for the common case of a setup() call
+with literal arguments"""
+import ast
+import copy
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import six
+
+LOG = logging.getLogger("req_compile.metadata.setup_ast")
+
+# The setup() arguments metadata is extracted from. The others are never evaluated
+SETUP_KWARGS = (
+    "name",
+    "version",
+    "install_requires",
+    "extras_require",
+    "setup_requires",
+)
+
+# setup() arguments that need setup.py to be run to be understood
+DYNAMIC_KWARGS = ("pbr", "d2to1", "use_pyscaffold")
+
+# Methods of str that can be evaluated. They don't have side effects
+STR_METHODS = frozenset(
+    (
+        "endswith",
+        "format",
+        "join",
+        "lower",
+        "lstrip",
+        "partition",
+        "replace",
+        "rstrip",
+        "split",
+        "splitlines",
+        "startswith",
+        "strip",
+        "upper",
+    )
+)
+
+# Methods that modify the list they are called on
+LIST_METHODS = frozenset(("append", "extend", "insert", "remove"))
+
+# Builtins that can change any variable
+SCOPE_FUNCTIONS = frozenset(("exec", "execfile", "globals", "locals", "vars"))
+
+# Evaluating comprehensions over huge inputs isn't worth it
+MAX_ITERATIONS = 10000
+
+# The parser of some Python releases keeps its recursion depth in shared state,
+# and concurrent parses fail (CPython gh-106905)
+_PARSE_LOCK = threading.Lock()
+
+
+class TooDynamic(Exception):
+    """The setup.py can't be understood without running it"""
+
+
+class _Value(object):
+    """An already evaluated argument"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _SetupTooDynamic(TooDynamic):
+    """The setup() call itself can't be evaluated, so nothing can be"""
+
+
+class _Module(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _Function(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _File(object):
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __iter__(self):
+        return iter(self.contents.splitlines(True))
+
+
+def _find_packages(*_args, **_kwargs):
+    return []
+
+
+def _list(value=()):
+    return list(value)
+
+
+def _str(*args):
+    for arg in args:
+        _check_data(arg, "String conversion")
+    return str(*args)
+
+
+SETUP_FUNCTIONS = frozenset(("setuptools.setup", "distutils.core.setup"))
+
+MUTABLE_TYPES = (list, dict, set)
+
+SEQUENCE_TYPES = six.string_types + (list, tuple)
+
+
+class SetupEvaluator(object):
+    """Evaluates the top level of a setup.py, keeping track of the variables
+    whose values are known. Anything that could change a variable in a way that
+    isn't understood makes it unknown instead"""
+
+    def __init__(self, filename, open_file, keys=SETUP_KWARGS):
+        # type: (str, Callable[..., Any], Iterable[str]) -> None
+        """
+        Args:
+            filename: The absolute path of the setup.py, used for __file__. Relative
+                paths are resolved against its directory, as setup.py is run there
+            open_file: Function used to open files the setup.py reads. It is only
+                passed absolute paths
+            keys: The setup() arguments to evaluate
+        """
+        self.open_file = open_file
+        self.cwd = os.path.dirname(filename)
+        self.keys = frozenset(keys)
+        self.names = {
+            "__file__": filename,
+            "__name__": "__main__",
+            "True": True,
+            "False": False,
+            "None": None,
+        }  # type: Dict[str, Any]
+        self.functions = {
+            "open": self._open,
+            "io.open": self._open,
+            "codecs.open": self._open,
+            "os.path.abspath": self._abspath,
+            "os.path.basename": os.path.basename,
+            "os.path.dirname": os.path.dirname,
+            "os.path.join": os.path.join,
+            "os.path.normpath": os.path.normpath,
+            # The fake paths of an archive can't be resolved
+            "os.path.realpath": self._abspath,
+            "setuptools.find_packages": _find_packages,
+            "setuptools.find_namespace_packages": _find_packages,
+            "dict": dict,
+            "list": _list,
+            "set": set,
+            "sorted": sorted,
+            "str": _str,
+            "tuple": tuple,
+        }  # type: Dict[str, Callable[..., Any]]
+        # Builtins are variables like any other, and may be shadowed
+        self.names.update(
+            (name, _Function(name)) for name in self.functions if "." not in name
+        )
+        self.setup_kwargs = None  # type: Optional[Dict[str, Any]]
+
+    def evaluate(self, contents):
+        # type: (str) -> Dict[str, Any]
+        """Run the top level of a setup.py and evaluate the arguments of its single
+        setup() call
+
+        Raises:
+            TooDynamic: If the arguments can't be evaluated without running it
+        """
+        try:
+            with _PARSE_LOCK:
+                module = ast.parse(contents)
+        except (SyntaxError, ValueError) as ex:
+            raise TooDynamic("Unable to parse: {}".format(ex))
+
+        self._run_body(module.body)
+        if self.setup_kwargs is None:
+            raise TooDynamic("No setup() call at the top level")
+        return self.setup_kwargs
+
+    def _evaluate_setup(self, call):
+        # type: (ast.Call) -> Dict[str, Any]
+        if call.args:
+            raise TooDynamic("Positional arguments to setup()")
+        splats = [keyword.value for keyword in call.keywords if keyword.arg is None]
+        # Python 2.7-3.4 kept ** arguments on the call itself
+        if getattr(call, "kwargs", None) is not None:
+            splats.append(call.kwargs)  # type: ignore
+
+        kwarg_nodes = {}  # type: Dict[str, Any]
+        for splat in splats:
+            value = self._eval(splat)
+            if not isinstance(value, dict):
+                raise TooDynamic("setup() called with ** of a non-dict")
+            kwarg_nodes.update((key, _Value(item)) for key, item in value.items())
+        kwarg_nodes.update(
+            (keyword.arg, keyword.value)
+            for keyword in call.keywords
+            if keyword.arg is not None
+        )
+
+        kwargs = {}
+        for key, node in kwarg_nodes.items():
+            if key in DYNAMIC_KWARGS:
+                raise TooDynamic("setup() uses {}".format(key))
+            if key in self.keys:
+                kwargs[key] = (
+                    node.value if isinstance(node, _Value) else self._eval(node)
+                )
+                if _contains_placeholder(kwargs[key]):
+                    raise TooDynamic("setup() argument {} is not data".format(key))
+        # Code after setup() must not change what it was called with
+        return copy.deepcopy(kwargs)
+
+    def _run_body(self, body):
+        for stmt in body:
+            handler = getattr(self, "_run_" + type(stmt).__name__, None)
+            try:
+                if handler is None:
+                    raise TooDynamic("Unsupported statement")
+                handler(stmt)
+            except _SetupTooDynamic:
+                raise
+            except TooDynamic:
+                self._forget(stmt)
+
+    def _run_Pass(self, stmt):  # pylint: disable=invalid-name
+        pass
+
+    def _run_Import(self, stmt):  # pylint: disable=invalid-name
+        for alias in stmt.names:
+            if alias.asname:
+                self.names[alias.asname] = _Module(alias.name)
+            else:
+                top_level = alias.name.split(".")[0]
+                self.names[top_level] = _Module(top_level)
+
+    def _run_ImportFrom(self, stmt):  # pylint: disable=invalid-name
+        if stmt.level or not stmt.module:
+            raise TooDynamic("Relative import")
+        for alias in stmt.names:
+            if alias.name == "*":
+                raise TooDynamic("Star import")
+            bound_name = alias.asname or alias.name
+            qualified_name = stmt.module + "." + alias.name
+            if qualified_name == "os.path":
+                self.names[bound_name] = _Module(qualified_name)
+            else:
+                self.names[bound_name] = _Function(qualified_name)
+
+    def _run_Assign(self, stmt):  # pylint: disable=invalid-name
+        value = self._eval(stmt.value)
+        for target in stmt.targets:
+            self._assign(target, value)
+
+    def _run_AnnAssign(self, stmt):  # pylint: disable=invalid-name
+        if stmt.value is None:
+            return
+        self._assign(stmt.target, self._eval(stmt.value))
+
+    def _run_AugAssign(self, stmt):  # pylint: disable=invalid-name
+        if not isinstance(stmt.target, ast.Name):
+            raise TooDynamic("Augmented assignment to {}".format(stmt.target))
+        current = self._eval(ast.Name(id=stmt.target.id, ctx=ast.Load()))
+        value = self._binop(stmt.op, current, self._eval(stmt.value))
+        self.names[stmt.target.id] = value
+
+    def _run_Expr(self, stmt):  # pylint: disable=invalid-name
+        value = stmt.value
+        if not isinstance(value, ast.Call):
+            # Docstrings
+            self._eval(value)
+            return
+        if self._is_setup(value.func):
+            if self.setup_kwargs is not None:
+                raise _SetupTooDynamic("setup() is called more than once")
+            try:
+                self.setup_kwargs = self._evaluate_setup(value)
+            except TooDynamic as ex:
+                raise _SetupTooDynamic(str(ex))
+            return
+        if (
+            isinstance(value.func, ast.Attribute)
+            and isinstance(value.func.value, ast.Name)
+            and value.func.attr in LIST_METHODS
+            and not value.keywords
+        ):
+            target = self._eval(value.func.value)
+            if isinstance(target, list):
+                args = [self._eval(arg) for arg in value.args]
+                try:
+                    getattr(target, value.func.attr)(*args)
+                except (TypeError, ValueError):
+                    raise TooDynamic("Invalid list method call")
+                return
+        raise TooDynamic("Call with unknown side effects")
+
+    def _run_If(self, stmt):  # pylint: disable=invalid-name
+        # Only the if __name__ == "__main__" guard is followed
+        test = stmt.test
+        if (
+            isinstance(test, ast.Compare)
+            and len(test.ops) == 1
+            and isinstance(test.ops[0], ast.Eq)
+            and "__name__" in (_name_of(test.left), _name_of(test.comparators[0]))
+            and self._eval(test)
+        ):
+            self._run_body(stmt.body)
+            return
+        raise TooDynamic("Conditional code")
+
+    def _run_With(self, stmt):  # pylint: disable=invalid-name
+        items = getattr(stmt, "items", None)
+        if items is None:
+            # Python 2
+            items = [stmt]
+        for item in items:
+            value = self._eval(item.context_expr)
+            if not isinstance(value, _File):
+                raise TooDynamic("Context manager that isn't a file")
+            if item.optional_vars is not None:
+                self._assign(item.optional_vars, value)
+        self._run_body(stmt.body)
+
+    def _forget(self, stmt):
+        """Make every variable that the statement might change unknown"""
+        for node in ast.walk(stmt):
+            changed = None
+            if isinstance(node, ast.Call):
+                if self._is_setup(node.func):
+                    raise _SetupTooDynamic("setup() is called conditionally")
+                if _name_of(node.func) in SCOPE_FUNCTIONS:
+                    self.names.clear()
+                    return
+                # Any mutable value passed to a call, or whose method is called,
+                # may be changed by it
+                passed = list(node.args) + [keyword.value for keyword in node.keywords]
+                if isinstance(node.func, ast.Attribute):
+                    passed.append(node.func.value)
+                for arg in passed:
+                    self._forget_value(_base_name(arg))
+            elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                changed = node.id
+            elif isinstance(node, (ast.Subscript, ast.Attribute)) and not isinstance(
+                node.ctx, ast.Load
+            ):
+                self._forget_value(_base_name(node))
+            elif type(node).__name__ in ("FunctionDef", "AsyncFunctionDef", "ClassDef"):
+                changed = node.name
+            elif type(node).__name__ == "Exec":
+                # Python 2's exec statement
+                self.names.clear()
+                return
+            elif type(node).__name__ in ("Global", "Nonlocal"):
+                for name in node.names:
+                    self._forget_value(name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    self.names.pop((alias.asname or alias.name).split(".")[0], None)
+            if changed is not None:
+                self._forget_value(changed)
+
+    def _forget_value(self, name):
+        # type: (Optional[str]) -> None
+        """Make a variable unknown, along with every other variable that shares
+        its value if it is mutable"""
+        if name is None or name not in self.names:
+            return
+        value = self.names.pop(name)
+        if isinstance(value, MUTABLE_TYPES):
+            for other_name, other_value in list(self.names.items()):
+                if _contains(other_value, value) or _contains(value, other_value):
+                    del self.names[other_name]
+
+    def _is_setup(self, func):
+        try:
+            value = self._eval(func)
+        except TooDynamic:
+            return _name_of(func) == "setup"
+        return isinstance(value, _Function) and value.name in SETUP_FUNCTIONS
+
+    def _assign(self, target, value):
+        if isinstance(target, ast.Name):
+            self.names[target.id] = value
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            values = list(value) if isinstance(value, (list, tuple)) else None
+            if values is None or len(values) != len(target.elts):
+                raise TooDynamic("Unpacking of an unknown value")
+            for element, element_value in zip(target.elts, values):
+                self._assign(element, element_value)
+        elif isinstance(target, ast.Subscript):
+            container = self._eval(target.value)
+            key = self._eval(target.slice)
+            if not isinstance(container, (dict, list)):
+                raise TooDynamic("Item assignment to an unknown value")
+            try:
+                container[key] = value
+            except (IndexError, TypeError):
+                raise TooDynamic("Invalid item assignment")
+        else:
+            raise TooDynamic("Assignment to {}".format(type(target).__name__))
+
+    def _abspath(self, path):
+        # type: (str) -> str
+        return os.path.normpath(os.path.join(self.cwd, path))
+
+    def _open(self, filename, *_args, **_kwargs):
+        if not isinstance(filename, six.string_types):
+            raise TooDynamic("Opening {!r}".format(filename))
+        try:
+            with self.open_file(self._abspath(filename), encoding="utf-8") as handle:
+                return _File(handle.read())
+        except (EnvironmentError, ValueError):
+            raise TooDynamic("Unable to read {}".format(filename))
+
+    def _eval(self, node):
+        handler = getattr(self, "_eval_" + type(node).__name__, None)
+        if handler is None:
+            raise TooDynamic("Unsupported expression {}".format(type(node).__name__))
+        return handler(node)
+
+    def _eval_Constant(self, node):  # pylint: disable=invalid-name
+        return node.value
+
+    def _eval_Str(self, node):  # pylint: disable=invalid-name
+        return node.s
+
+    _eval_Bytes = _eval_Str
+
+    def _eval_Num(self, node):  # pylint: disable=invalid-name
+        return node.n
+
+    def _eval_NameConstant(self, node):  # pylint: disable=invalid-name
+        return node.value
+
+    def _eval_Name(self, node):  # pylint: disable=invalid-name
+        try:
+            return self.names[node.id]
+        except KeyError:
+            raise TooDynamic("Unknown name {}".format(node.id))
+
+    def _eval_List(self, node):  # pylint: disable=invalid-name
+        return [self._eval(element) for element in node.elts]
+
+    def _eval_Tuple(self, node):  # pylint: disable=invalid-name
+        return tuple(self._eval(element) for element in node.elts)
+
+    def _eval_Set(self, node):  # pylint: disable=invalid-name
+        return {self._eval(element) for element in node.elts}
+
+    def _eval_Dict(self, node):  # pylint: disable=invalid-name
+        result = {}
+        for key, value in zip(node.keys, node.values):
+            if key is None:
+                splat = self._eval(value)
+                if not isinstance(splat, dict):
+                    raise TooDynamic("** of a non-dict")
+                result.update(splat)
+            else:
+                result[self._eval(key)] = self._eval(value)
+        return result
+
+    def _eval_JoinedStr(self, node):  # pylint: disable=invalid-name
+        parts = []
+        for value in node.values:
+            if type(value).__name__ == "FormattedValue":
+                if value.conversion not in (-1, None) or value.format_spec is not None:
+                    raise TooDynamic("Formatted f-string value")
+                parts.append(
+                    str(_check_data(self._eval(value.value), "Formatting"))
+                )
+            else:
+                parts.append(self._eval(value))
+        return "".join(parts)
+
+    def _eval_BinOp(self, node):  # pylint: disable=invalid-name
+        return self._binop(node.op, self._eval(node.left), self._eval(node.right))
+
+    @staticmethod
+    def _binop(operator, left, right):
+        _check_data(left, "Operation")
+        _check_data(right, "Operation")
+        if isinstance(operator, ast.Add) and type(left) is type(right):
+            if isinstance(left, six.string_types + (list, tuple)):
+                return left + right
+        if isinstance(operator, ast.Mod) and isinstance(left, six.string_types):
+            if isinstance(right, six.string_types + (tuple, dict)):
+                return left % right
+        raise TooDynamic("Unsupported operation")
+
+    def _eval_BoolOp(self, node):  # pylint: disable=invalid-name
+        result = None
+        for value in node.values:
+            result = self._eval(value)
+            if isinstance(node.op, ast.And) and not _truth(result):
+                return result
+            if isinstance(node.op, ast.Or) and _truth(result):
+                return result
+        return result
+
+    def _eval_UnaryOp(self, node):  # pylint: disable=invalid-name
+        if isinstance(node.op, ast.Not):
+            return not _truth(self._eval(node.operand))
+        raise TooDynamic("Unsupported unary operation")
+
+    def _eval_Compare(self, node):  # pylint: disable=invalid-name
+        left = _check_data(self._eval(node.left), "Comparison")
+        for operator, comparator in zip(node.ops, node.comparators):
+            right = _check_data(self._eval(comparator), "Comparison")
+            if isinstance(operator, ast.Eq):
+                result = left == right
+            elif isinstance(operator, ast.NotEq):
+                result = left != right
+            elif isinstance(operator, ast.In) and isinstance(right, SEQUENCE_TYPES):
+                result = left in right
+            elif isinstance(operator, ast.NotIn) and isinstance(right, SEQUENCE_TYPES):
+                result = left not in right
+            else:
+                raise TooDynamic("Unsupported comparison")
+            if not result:
+                return False
+            left = right
+        return True
+
+    def _eval_IfExp(self, node):  # pylint: disable=invalid-name
+        if _truth(self._eval(node.test)):
+            return self._eval(node.body)
+        return self._eval(node.orelse)
+
+    def _eval_Subscript(self, node):  # pylint: disable=invalid-name
+        container = self._eval(node.value)
+        if not isinstance(container, SEQUENCE_TYPES + (dict,)):
+            raise TooDynamic("Subscript of an unknown value")
+        try:
+            return container[self._eval(node.slice)]
+        except (IndexError, KeyError, TypeError):
+            raise TooDynamic("Invalid subscript")
+
+    def _eval_Index(self, node):  # pylint: disable=invalid-name
+        return self._eval(node.value)
+
+    def _eval_Slice(self, node):  # pylint: disable=invalid-name
+        return slice(
+            *[
+                self._eval(part) if part is not None else None
+                for part in (node.lower, node.upper, node.step)
+            ]
+        )
+
+    def _eval_Attribute(self, node):  # pylint: disable=invalid-name
+        value = self._eval(node.value)
+        if isinstance(value, _Module):
+            qualified_name = value.name + "." + node.attr
+            if qualified_name == "os.path":
+                return _Module(qualified_name)
+            return _Function(qualified_name)
+        raise TooDynamic("Attribute of a value")
+
+    def _eval_Call(self, node):  # pylint: disable=invalid-name
+        args = [self._eval(arg) for arg in node.args]
+        kwargs = {keyword.arg: self._eval(keyword.value) for keyword in node.keywords}
+        if None in kwargs:
+            raise TooDynamic("Call with ** arguments")
+
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            receiver = self._eval(func.value)
+            if isinstance(receiver, six.string_types) and func.attr in STR_METHODS:
+                _check_data(args, "Argument")
+                _check_data(kwargs, "Argument")
+                try:
+                    return getattr(receiver, func.attr)(*args, **kwargs)
+                except (IndexError, KeyError, TypeError, ValueError):
+                    raise TooDynamic("Invalid str method call")
+            if isinstance(receiver, _File) and not args and not kwargs:
+                if func.attr == "read":
+                    return receiver.contents
+                if func.attr == "readlines":
+                    return list(receiver)
+            if not isinstance(receiver, _Module):
+                raise TooDynamic("Method call on a value")
+
+        value = self._eval(func)
+        if isinstance(value, _Function):
+            function = self.functions.get(value.name)
+        else:
+            function = None
+        if function is None:
+            raise TooDynamic("Call of an unknown function")
+        try:
+            return function(*args, **kwargs)
+        except (TypeError, ValueError):
+            raise TooDynamic("Invalid call")
+
+    def _eval_ListComp(self, node):  # pylint: disable=invalid-name
+        return list(self._comprehension(node))
+
+    _eval_GeneratorExp = _eval_ListComp
+
+    def _comprehension(self, node):
+        if len(node.generators) != 1:
+            raise TooDynamic("Nested comprehension")
+        generator = node.generators[0]
+        if not isinstance(generator.target, ast.Name):
+            raise TooDynamic("Comprehension with unpacking")
+        iterable = self._eval(generator.iter)
+        if not isinstance(iterable, SEQUENCE_TYPES + (_File,)):
+            raise TooDynamic("Iteration over an unknown value")
+
+        saved = self.names.copy()
+        try:
+            for iterations, item in enumerate(iterable):
+                if iterations > MAX_ITERATIONS:
+                    raise TooDynamic("Too many iterations")
+                self.names[generator.target.id] = item
+                if all(_truth(self._eval(condition)) for condition in generator.ifs):
+                    yield self._eval(node.elt)
+        finally:
+            self.names = saved
+
+
+def _name_of(node):
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _base_name(node):
+    """The variable an expression like a.b[0] refers to"""
+    while isinstance(node, (ast.Subscript, ast.Attribute)):
+        node = node.value
+    return _name_of(node)
+
+
+def _contains(container, value):
+    """Whether a value is, or is held anywhere within, a container"""
+    if container is value:
+        return True
+    if isinstance(container, dict):
+        container = list(container.values())
+    if isinstance(container, (list, tuple, set)):
+        return any(_contains(item, value) for item in container)
+    return False
+
+
+def _contains_placeholder(value):
+    """Whether a value holds a stand-in for a module, function or file rather
+    than plain data"""
+    if isinstance(value, (_Module, _Function, _File)):
+        return True
+    if isinstance(value, dict):
+        value = list(value.keys()) + list(value.values())
+    if isinstance(value, (list, tuple, set)):
+        return any(_contains_placeholder(item) for item in value)
+    return False
+
+
+def _check_data(value, what):
+    """Make sure a value can be compared or converted to a string. The stand-ins
+    for modules, functions and files, like sys.platform, have no meaningful value
+
+    Returns:
+        The value
+    """
+    if _contains_placeholder(value):
+        raise TooDynamic("{} of a module, function or file".format(what))
+    return value
+
+
+def _truth(value):
+    # type: (Any) -> bool
+    if isinstance(value, (_Module, _Function, _File)):
+        raise TooDynamic("Truth test of a module, function or file")
+    return bool(value)
+
+
+def evaluate_setup_kwargs(contents, filename, open_file, keys=SETUP_KWARGS):
+    # type: (str, str, Callable[..., Any], Iterable[str]) -> Optional[Dict[str, Any]]
+    """Evaluate the metadata arguments of the setup() call in a setup.py, without
+    running it
+
+    Args:
+        contents: The setup.py source
+        filename: The absolute path of the setup.py, see SetupEvaluator
+        open_file: Function used to open files the setup.py reads, by absolute path
+        keys: The setup() arguments to evaluate
+
+    Returns:
+        The evaluated setup() keyword arguments that describe the metadata, or
+        None if the setup.py is too dynamic to evaluate
+    """
+    try:
+        return SetupEvaluator(filename, open_file, keys=keys).evaluate(contents)
+    except TooDynamic as ex:
+        LOG.debug("Unable to evaluate %s statically: %s", filename, ex)
+    except RuntimeError:
+        # Python 3's RecursionError, from deeply nested expressions
+        LOG.debug("Unable to evaluate %s statically", filename, exc_info=True)
+    return None
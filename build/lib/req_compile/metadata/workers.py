@@ -0,0 +1,150 @@
+"""Pool of worker processes, to isolate jobs from the compiling process"""
+import logging
+import multiprocessing
+import threading
+from typing import Any, Callable, List
+
+LOG = logging.getLogger("req_compile.metadata.workers")
+
+# Workers are replaced after this many jobs, to bound whatever state the jobs
+# leave behind in them
+MAX_JOBS_PER_WORKER = 50
+
+
+class WorkerError(Exception):
+    """A job raised an exception, timed out or brought down its worker process"""
+
+
+def _worker_main(connection):
+    """Run jobs received from the connection until it is closed"""
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+
+        func, args = job
+        try:
+            reply = (True, func(*args))
+        except BaseException as ex:  # pylint: disable=broad-except
+            # The exception itself may not be picklable
+            reply = (False, "{}: {}".format(type(ex).__name__, ex))
+        try:
+            connection.send(reply)
+        except Exception as ex:  # pylint: disable=broad-except
+            connection.send((False, "Unable to return result: {}".format(ex)))
+
+
+class _Worker(object):
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection,))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        self.jobs = 0
+        # Set when the worker can't be trusted to run another job
+        self.broken = False
+
+    def run(self, func, args, timeout):
+        self.jobs += 1
+        # Until a reply arrives, the worker may still be busy with this job
+        self.broken = True
+        try:
+            self.connection.send((func, args))
+        except EnvironmentError as ex:
+            raise WorkerError("Worker process is unavailable: {}".format(ex))
+        if not self.connection.poll(timeout):
+            raise WorkerError("Timed out after {} seconds".format(timeout))
+        try:
+            success, value = self.connection.recv()
+        except EOFError:
+            raise WorkerError(
+                "Worker process exited with code {}".format(self.process.exitcode)
+            )
+        self.broken = False
+        if not success:
+            raise WorkerError(value)
+        return value
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (EnvironmentError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.connection.close()
+
+
+class WorkerPool(object):
+    """Runs jobs in up to a number of worker processes, started as they are needed
+    and reused between jobs. A worker that times out or dies is replaced
+
+    Jobs are module level functions, and their arguments and results must be
+    picklable
+    """
+
+    def __init__(self, workers, timeout, max_jobs_per_worker=MAX_JOBS_PER_WORKER):
+        # type: (int, float, int) -> None
+        """
+        Args:
+            workers: Maximum number of jobs to run at the same time
+            timeout: Seconds a job may run before its worker is killed
+            max_jobs_per_worker: Number of jobs after which a worker is replaced
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        # Forking a process that is running other threads is unsafe
+        if hasattr(multiprocessing, "get_context"):
+            self._context = multiprocessing.get_context("spawn")
+        else:
+            self._context = multiprocessing
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self._idle = []  # type: List[_Worker]
+
+    def __repr__(self):
+        return "WorkerPool({}, {})".format(self.workers, self.timeout)
+
+    def run(self, func, *args):
+        # type: (Callable[..., Any], Any) -> Any
+        """Run func(*args) in a worker process and return its result
+
+        Raises:
+            WorkerError: If the job raised an exception, timed out or its worker
+                process died
+        """
+        with self._slots:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                worker = _Worker(self._context)
+
+            try:
+                return worker.run(func, args, self.timeout)
+            finally:
+                if worker.broken:
+                    LOG.debug("Replacing worker process %s", worker.process.pid)
+                    worker.kill()
+                elif worker.jobs >= self.max_jobs_per_worker:
+                    worker.stop()
+                else:
+                    with self._lock:
+                        self._idle.append(worker)
+
+    def close(self):
+        # type: () -> None
+        """Stop the idle worker processes"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
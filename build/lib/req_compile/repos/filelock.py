@@ -0,0 +1,86 @@
+"""Exclusive locks on files, shared by threads and processes"""
+import contextlib
+import errno
+import threading
+from typing import Any, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+try:
+    import msvcrt
+except ImportError:  # Not Windows
+    msvcrt = None  # type: ignore
+
+_THREAD_LOCKS = {}  # type: Dict[str, threading.Lock]
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+class FileLocked(Exception):
+    """A lock that was not waited for is held by another thread or process"""
+
+
+def _thread_lock(path):
+    # type: (str) -> threading.Lock
+    with _THREAD_LOCKS_LOCK:
+        lock = _THREAD_LOCKS.get(path)
+        if lock is None:
+            lock = _THREAD_LOCKS[path] = threading.Lock()
+        return lock
+
+
+def _lock_handle(handle, blocking):
+    # type: (Any, bool) -> None
+    if fcntl is not None:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle.fileno(), flags)
+        except (IOError, OSError) as ex:
+            if blocking or ex.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            raise FileLocked(handle.name)
+    elif msvcrt is not None:
+        handle.seek(0)
+        while True:
+            try:
+                msvcrt.locking(
+                    handle.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1
+                )
+                break
+            except (IOError, OSError):
+                if not blocking:
+                    raise FileLocked(handle.name)
+                # LK_LOCK gives up after 10 seconds
+
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    # type: (str, bool) -> Iterator[None]
+    """Hold an exclusive lock on a file, against other threads and processes. The
+    lock file is created if needed and left in place
+
+    Args:
+        path: The lock file
+        blocking: Whether to wait for the lock
+
+    Raises:
+        FileLocked: If blocking is False and the lock is held elsewhere
+    """
+    thread_lock = _thread_lock(path)
+    if not thread_lock.acquire(blocking):
+        raise FileLocked(path)
+    try:
+        with open(path, "a+b") as handle:
+            _lock_handle(handle, blocking)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        thread_lock.release()
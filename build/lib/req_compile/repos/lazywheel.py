@@ -0,0 +1,159 @@
+"""Read metadata from remote wheels without downloading them, using HTTP range requests"""
+import logging
+import zipfile
+from contextlib import closing
+from typing import Dict, Optional
+
+import requests
+
+from req_compile.containers import DistInfo
+from req_compile.metadata.dist_info import _fetch_from_wheel_zip
+
+LOG = logging.getLogger("req_compile.repository.lazywheel")
+
+# Ranges are requested in aligned chunks of this size. It is large enough that the
+# end of central directory record and most central directories need a single request
+CHUNK_SIZE = 16 * 1024
+
+
+class RangeRequestsUnsupported(IOError):
+    """The server cannot serve partial content for the file"""
+
+
+class HTTPRangeFile(object):
+    """A read-only, seekable file object over a remote file. Only the ranges that are
+    actually read are fetched from the server"""
+
+    def __init__(self, url, session, chunk_size=CHUNK_SIZE):
+        # type: (str, requests.Session, int) -> None
+        self.url = url
+        self.session = session
+        self.chunk_size = chunk_size
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._chunks = {}  # type: Dict[int, bytes]
+
+        response = session.head(url, allow_redirects=True)
+        response.raise_for_status()
+        if response.headers.get("Accept-Ranges", "none").lower() != "bytes":
+            raise RangeRequestsUnsupported(
+                "{} does not accept range requests".format(url)
+            )
+        try:
+            self.length = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            raise RangeRequestsUnsupported("{} has no content length".format(url))
+
+    def seekable(self):
+        # type: () -> bool
+        return True
+
+    def tell(self):
+        # type: () -> int
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        # type: (int, int) -> int
+        if whence == 0:
+            new_pos = offset
+        elif whence == 1:
+            new_pos = self._pos + offset
+        elif whence == 2:
+            new_pos = self.length + offset
+        else:
+            raise ValueError("Invalid whence {}".format(whence))
+        if new_pos < 0:
+            raise ValueError("Negative seek position {}".format(new_pos))
+        self._pos = new_pos
+        return self._pos
+
+    def read(self, size=-1):
+        # type: (int) -> bytes
+        end = self.length if size is None or size < 0 else self._pos + size
+        end = min(end, self.length)
+        if end <= self._pos:
+            return b""
+
+        first_chunk = self._pos // self.chunk_size
+        last_chunk = (end - 1) // self.chunk_size
+        self._fetch_chunks(first_chunk, last_chunk)
+
+        data = b"".join(
+            self._chunks[chunk] for chunk in range(first_chunk, last_chunk + 1)
+        )
+        offset = self._pos - first_chunk * self.chunk_size
+        data = data[offset : offset + end - self._pos]
+        self._pos = end
+        return data
+
+    def _fetch_chunks(self, first_chunk, last_chunk):
+        # type: (int, int) -> None
+        """Fetch any missing chunks in the inclusive range, merging consecutive
+        missing chunks into a single request"""
+        chunk = first_chunk
+        while chunk <= last_chunk:
+            if chunk in self._chunks:
+                chunk += 1
+                continue
+            run_end = chunk
+            while run_end + 1 <= last_chunk and run_end + 1 not in self._chunks:
+                run_end += 1
+            self._fetch_range(chunk, run_end)
+            chunk = run_end + 1
+
+    def _fetch_range(self, first_chunk, last_chunk):
+        # type: (int, int) -> None
+        start = first_chunk * self.chunk_size
+        end = min((last_chunk + 1) * self.chunk_size, self.length) - 1
+        LOG.debug("Fetching bytes %d-%d of %s", start, end, self.url)
+        response = self.session.get(
+            self.url, headers={"Range": "bytes={}-{}".format(start, end)}
+        )
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeRequestsUnsupported(
+                "{} ignored the range request".format(self.url)
+            )
+        content = response.content
+        if len(content) != end - start + 1:
+            raise RangeRequestsUnsupported(
+                "{} returned an unexpected range".format(self.url)
+            )
+        self.bytes_fetched += len(content)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = (chunk - first_chunk) * self.chunk_size
+            self._chunks[chunk] = content[offset : offset + self.chunk_size]
+
+    def close(self):
+        # type: () -> None
+        self._chunks = {}
+
+
+def fetch_wheel_metadata(url, wheel_filename, session):
+    # type: (str, str, requests.Session) -> Optional[DistInfo]
+    """Read the metadata of a remote wheel by fetching only its central directory
+    and dist-info/METADATA entry
+
+    Args:
+        url: URL of the wheel
+        wheel_filename: Filename of the wheel
+        session: Session to make the requests with
+
+    Raises:
+        RangeRequestsUnsupported if the server cannot serve parts of the file
+
+    Returns:
+        The metadata, or None if it was not found in the wheel
+    """
+    remote_file = HTTPRangeFile(url, session)
+    with closing(remote_file):
+        zfile = zipfile.ZipFile(remote_file, "r")
+        with closing(zfile):
+            result = _fetch_from_wheel_zip(wheel_filename, zfile)
+        LOG.info(
+            "Read metadata of %s with %d of %d bytes",
+            wheel_filename,
+            remote_file.bytes_fetched,
+            remote_file.length,
+        )
+        return result
@@ -0,0 +1,153 @@
+"""Persistent cache of parsed simple-index project pages"""
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from req_compile.repos.repository import ABI_TAGS, PLATFORM_TAGS, Candidate
+
+LOG = logging.getLogger("req_compile.repository.pagecache")
+
+# Bump whenever the pickled layout of an entry (or of Candidate) changes so
+# stale entries are discarded instead of unpickled into the wrong shape
+CACHE_FORMAT = 5
+
+# Links that can't be used by the running interpreter are dropped while parsing a
+# page, so an entry is only valid for the kind of interpreter that wrote it
+ENVIRONMENT = (tuple(sys.version_info[:3]), ABI_TAGS, PLATFORM_TAGS)
+
+
+def atomic_write(filename, data):
+    # type: (str, bytes) -> None
+    """Write data to a file by writing a temporary file in the same directory and
+    renaming it into place. Readers will see either the old or the new contents"""
+    directory = os.path.dirname(filename)
+    handle, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(data)
+        getattr(os, "replace", os.rename)(temp_name, filename)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except EnvironmentError:
+            pass
+        raise
+
+
+class PageCacheEntry(object):
+    """A cached, already parsed project page"""
+
+    def __init__(self, url, candidates, etag=None, last_modified=None, fetched=None):
+        # type: (str, List[Candidate], Optional[str], Optional[str], Optional[float]) -> None
+        self.url = url
+        self.candidates = candidates
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.time() if fetched is None else fetched
+
+    def is_fresh(self, max_age):
+        # type: (float) -> bool
+        """Whether this entry may be used without asking the server"""
+        return max_age > 0 and (time.time() - self.fetched) < max_age
+
+    def validation_headers(self):
+        # type: () -> Dict[str, str]
+        """Headers to send to make the request conditional on this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache(object):
+    """An on-disk cache of project pages, keyed by the page URL. Entries store the
+    parsed candidates along with the validators returned by the server (ETag and
+    Last-Modified) so stale entries can be cheaply revalidated with a conditional
+    request"""
+
+    def __init__(self, cache_dir, max_age=0):
+        # type: (str, float) -> None
+        """
+        Args:
+            cache_dir: Directory to store the cache entries in. Created if needed
+            max_age: Number of seconds an entry is used without revalidating it with
+                the server. 0 will always revalidate
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_age = max_age
+        if not os.path.exists(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # Another process may have created it first
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+    def __repr__(self):
+        return "PageCache({}, max_age={})".format(self.cache_dir, self.max_age)
+
+    def _entry_path(self, url):
+        # type: (str) -> str
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".pickle")
+
+    def get(self, url):
+        # type: (str) -> Optional[PageCacheEntry]
+        """Load the entry for a URL, if any. Corrupt or outdated entries are treated
+        as missing"""
+        try:
+            with open(self._entry_path(url), "rb") as handle:
+                data = pickle.load(handle)  # type: Dict[str, Any]
+        except EnvironmentError:
+            return None
+        except Exception:  # pylint: disable=broad-except
+            LOG.debug("Discarding unreadable cache entry for %s", url, exc_info=True)
+            return None
+
+        if (
+            data.get("format") != CACHE_FORMAT
+            or data.get("url") != url
+            or data.get("environment") != ENVIRONMENT
+        ):
+            return None
+
+        return PageCacheEntry(
+            url,
+            data["candidates"],
+            etag=data["etag"],
+            last_modified=data["last_modified"],
+            fetched=data["fetched"],
+        )
+
+    def put(self, entry):
+        # type: (PageCacheEntry) -> None
+        """Store an entry, replacing any previous entry for the same URL"""
+        data = {
+            "format": CACHE_FORMAT,
+            "environment": ENVIRONMENT,
+            "url": entry.url,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "fetched": entry.fetched,
+            "candidates": entry.candidates,
+        }
+        try:
+            atomic_write(
+                self._entry_path(entry.url),
+                pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+        except EnvironmentError:
+            LOG.warning("Unable to write cache entry for %s", entry.url, exc_info=True)
+
+    def refresh(self, entry):
+        # type: (PageCacheEntry) -> None
+        """Mark an entry as just validated by the server"""
+        entry.fetched = time.time()
+        self.put(entry)
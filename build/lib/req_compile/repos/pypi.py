@@ -0,0 +1,616 @@
+"""Repository to handle pulling packages from online package indexes"""
+import logging
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from hashlib import sha256
+from typing import Optional, Sequence, Tuple
+
+import pkg_resources
+import requests
+from six.moves import html_parser, urllib
+
+from req_compile.containers import RequirementContainer, DistInfo
+from req_compile.errors import MetadataError
+from req_compile.metadata import extract_metadata
+from req_compile.metadata.dist_info import _parse_flat_metadata
+from req_compile.repos.artifactcache import (
+    PARTIAL_PREFIX,
+    PARTIAL_SUFFIX,
+    get_artifact_cache,
+)
+from req_compile.repos.hashmanifest import get_manifest, hash_file
+from req_compile.repos.lazywheel import RangeRequestsUnsupported, fetch_wheel_metadata
+from req_compile.repos.metadatacache import MetadataCache, file_key, link_key
+from req_compile.repos.pagecache import PageCache, PageCacheEntry
+from req_compile.repos.repository import (
+    Candidate,
+    DistributionType,
+    Repository,
+    process_distribution,
+)
+
+try:
+    from functools32 import lru_cache  # type: ignore
+except ImportError:
+    from functools import lru_cache
+
+LOG = logging.getLogger("req_compile.repository.pypi")
+
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+SYS_PY_VERSION = pkg_resources.parse_version(sys.version.split(" ")[0].replace("+", ""))
+SYS_PY_MAJOR = pkg_resources.parse_version("{}".format(sys.version_info.major))
+SYS_PY_MAJOR_MINOR = pkg_resources.parse_version(
+    "{}.{}".format(sys.version_info.major, sys.version_info.minor)
+)
+
+PEP691_JSON_TYPE = "application/vnd.pypi.simple.v1+json"
+
+# Prefer the JSON simple API, but accept HTML from indexes that don't support it
+SIMPLE_ACCEPT = ", ".join(
+    (
+        PEP691_JSON_TYPE,
+        "application/vnd.pypi.simple.v1+html;q=0.2",
+        "text/html;q=0.01",
+    )
+)
+
+OPS = {
+    "<": lambda x, y: x < y,
+    ">": lambda x, y: x > y,
+    "==": lambda x, y: x == y,
+    "!=": lambda x, y: x != y,
+    ">=": lambda x, y: x >= y,
+    "<=": lambda x, y: x <= y,
+}
+
+
+def check_python_compatibility(requires_python):
+    if requires_python is None:
+        return True
+    try:
+        return all(
+            _check_py_constraint(part)
+            for part in requires_python.split(",")
+            if part.strip()
+        )
+    except ValueError:
+        raise ValueError(
+            "Unable to parse requires python expression: {}".format(requires_python)
+        )
+
+
+def _check_py_constraint(version_constraint):
+    ref_version = SYS_PY_VERSION
+
+    version_part = re.split("[!=<>~]", version_constraint)[-1].strip()
+    operator = version_constraint.replace(version_part, "").strip()
+    if version_part and not operator:
+        operator = "=="
+
+    dotted_parts = len(version_part.split("."))
+    if version_part.endswith(".*"):
+        version_part = version_part.replace(".*", "")
+        if dotted_parts == 3:
+            ref_version = SYS_PY_MAJOR_MINOR
+        elif dotted_parts == 2:
+            ref_version = SYS_PY_MAJOR
+    else:
+        if dotted_parts == 2:
+            ref_version = SYS_PY_MAJOR_MINOR
+        elif dotted_parts == 1:
+            ref_version = SYS_PY_MAJOR_MINOR
+            version_part += ".0"
+
+    version = pkg_resources.parse_version(version_part)
+    if operator == "~=":
+        # Convert ~= to the >=, < equivalent check
+        # See: https://packaging.python.org/guides/distributing-packages-using-setuptools/#python-requires
+        major_num = int(str(version_part).split(".")[0])
+        equivalent_check = ">={},<{}".format(version_part, major_num + 1)
+        return check_python_compatibility(equivalent_check)
+    try:
+        return OPS[operator](ref_version, version)
+    except KeyError:
+        raise ValueError("Unable to parse constraint {}".format(version_constraint))
+
+
+def _check_link_python_compatibility(requires_python, link):
+    """Check a requires-python expression attached to a link. Unparseable expressions
+    are logged and treated as compatible"""
+    try:
+        return check_python_compatibility(requires_python)
+    except ValueError:
+        LOG.error(
+            'Failed to parse requires expression "%s" for requirement %s',
+            requires_python,
+            link,
+        )
+        return True
+
+
+def _parse_core_metadata_attr(value):
+    """Parse a PEP 658 data-core-metadata attribute into a mapping of hash name to
+    hash value. Returns None if the index doesn't serve the metadata file"""
+    if value is None or value.lower() == "false":
+        return None
+    hash_name, sep, hash_value = value.partition("=")
+    if not sep:
+        return {}
+    return {hash_name: hash_value}
+
+
+class LinksHTMLParser(html_parser.HTMLParser):
+    def __init__(self, url):
+        html_parser.HTMLParser.__init__(self)
+        self.url = url
+        self.dists = []
+        self.active_link = None
+        self.active_skip = False
+        self.active_yanked = False
+        self.active_core_metadata = None
+
+    def handle_starttag(self, tag, attrs):
+        self.active_link = None
+        if tag == "a":
+            self.active_skip = False
+            self.active_yanked = False
+            self.active_core_metadata = None
+            requires_python = None
+            for attr in attrs:
+                if attr[0] == "href":
+                    self.active_link = self.url, attr[1]
+                elif (
+                    attr[0] == "metadata-requires-python"
+                    or attr[0] == "data-requires-python"
+                ):
+                    requires_python = attr[1]
+                elif attr[0] == "data-yanked":
+                    self.active_yanked = True
+                elif attr[0] == "data-core-metadata" or (
+                    # Name used before PEP 714, still served by some indexes
+                    attr[0] == "data-dist-info-metadata"
+                    and self.active_core_metadata is None
+                ):
+                    self.active_core_metadata = _parse_core_metadata_attr(attr[1])
+
+            if requires_python:
+                self.active_skip = not _check_link_python_compatibility(
+                    requires_python, self.active_link
+                )
+
+    def handle_data(self, data):
+        if self.active_link is None or self.active_skip:
+            return
+        candidate = process_distribution(
+            self.active_link, data, check_compatibility=True
+        )
+        if candidate is not None:
+            candidate.yanked = self.active_yanked
+            candidate.core_metadata = self.active_core_metadata
+            self.dists.append(candidate)
+
+    def error(self, message):
+        raise RuntimeError(message)
+
+
+def _parse_json_page(url, page):
+    """Build candidates from a PEP 691 JSON project page
+
+    Args:
+        url (str): URL the page was fetched from. File URLs are relative to it
+        page (dict): The decoded JSON page
+
+    Returns:
+        (list[Candidate])
+    """
+    dists = []
+    for file_info in page.get("files", []):
+        requires_python = file_info.get("requires-python")
+        link = url, file_info["url"]
+        if requires_python and not _check_link_python_compatibility(
+            requires_python, link
+        ):
+            continue
+
+        # Carry the hash in the same fragment form the HTML API uses, so downloads
+        # are verified identically regardless of which API produced the candidate
+        sha = file_info.get("hashes", {}).get("sha256")
+        if sha and "#" not in file_info["url"]:
+            link = url, "{}#sha256={}".format(file_info["url"], sha)
+
+        candidate = process_distribution(
+            link, file_info["filename"], check_compatibility=True
+        )
+        if candidate is not None:
+            candidate.yanked = bool(file_info.get("yanked", False))
+            core_metadata = file_info.get(
+                "core-metadata", file_info.get("dist-info-metadata", False)
+            )
+            if core_metadata:
+                candidate.core_metadata = (
+                    core_metadata if isinstance(core_metadata, dict) else {}
+                )
+            dists.append(candidate)
+    return dists
+
+
+def _parse_page(response):
+    """Parse a project page response in whichever format the server chose to send"""
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.split(";")[0].strip() == PEP691_JSON_TYPE:
+        return _parse_json_page(response.url, response.json())
+
+    parser = LinksHTMLParser(response.url)
+    parser.feed(response.content.decode("utf-8"))
+    return parser.dists
+
+
+def normalize(name):
+    """Normalize per PEP-0503"""
+    return re.sub(r"(\s|[-_.])+", "-", name).lower()
+
+
+@lru_cache(maxsize=None)
+def _scan_page_links(index_url, project_name, session, retries, page_cache=None):
+    """
+
+    Args:
+        index_url:
+        project_name:
+        session (requests.Session): Session
+        retries (int): Number of times to retry on server errors
+        page_cache (PageCache, optional): Persistent cache of parsed pages
+
+    Returns:
+        (list[Candidate])
+    """
+
+    url = "{index_url}/{project_name}".format(
+        index_url=index_url, project_name=normalize(project_name)
+    )
+
+    entry = None
+    headers = {"Accept": SIMPLE_ACCEPT}
+    if page_cache is not None:
+        entry = page_cache.get(url)
+        if entry is not None:
+            if entry.is_fresh(page_cache.max_age):
+                LOG.info("Using cached versions for %s from %s", project_name, url)
+                return entry.candidates
+            headers.update(entry.validation_headers())
+
+    LOG.info("Fetching versions for %s from %s", project_name, url)
+    if session is None:
+        session = requests
+    response = session.get(url + "/", headers=headers)
+
+    if retries and 500 <= response.status_code < 600:
+        return _scan_page_links(
+            index_url, project_name, session, retries - 1, page_cache
+        )
+
+    if response.status_code == 304 and entry is not None:
+        LOG.debug("Cached page for %s is still valid", project_name)
+        entry.etag = response.headers.get("ETag", entry.etag)
+        entry.last_modified = response.headers.get(
+            "Last-Modified", entry.last_modified
+        )
+        page_cache.refresh(entry)
+        return entry.candidates
+
+    # Raise for any error status that's not 404
+    if response.status_code != 404:
+        response.raise_for_status()
+
+    dists = _parse_page(response)
+
+    if page_cache is not None and response.status_code == 200:
+        page_cache.put(
+            PageCacheEntry(
+                url,
+                dists,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        )
+
+    return dists
+
+
+class HashMismatchError(ValueError):
+    """A downloaded file does not have the sha256 the index listed for it"""
+
+
+def _do_download(logger, filename, link, session, wheeldir):
+    """Download a file into the wheel directory, or reuse it if it is already
+    there with the expected hash
+
+    Raises:
+        HashMismatchError: If the downloaded file does not match the hash in its
+            link. Nothing is kept
+    """
+    url, link = link
+    split_link = link.split("#sha256=")
+    if len(split_link) > 1:
+        sha = split_link[1]
+    else:
+        sha = None
+
+    output_file = os.path.join(wheeldir, filename)
+
+    cache = get_artifact_cache(wheeldir)
+    # Processes sharing the wheel-dir wait on each other instead of downloading
+    # the same file twice
+    with cache.lock(filename):
+        if sha is not None and os.path.exists(output_file):
+            manifest = get_manifest(wheeldir)
+            file_hash = manifest.verified_hash(output_file)
+            if file_hash is None:
+                file_hash = hash_file(output_file)
+                if file_hash == sha:
+                    manifest.record(output_file, file_hash)
+            if file_hash == sha:
+                logger.info("Reusing %s", output_file)
+                cache.record_hit(output_file)
+                return output_file, True
+            logger.debug("No hash match for downloaded file, removing")
+            os.remove(output_file)
+        else:
+            logger.debug("No file in wheel-dir")
+
+        full_link = urllib.parse.urljoin(url, link)
+        logger.info("Downloading %s -> %s", full_link, output_file)
+        if session is None:
+            session = requests
+        response = session.get(full_link, stream=True)
+        response.raise_for_status()
+
+        # Write to a temporary file and move it into place once complete, so a
+        # partial download is never mistaken for the real file
+        handle, temp_file = tempfile.mkstemp(
+            dir=wheeldir, prefix=PARTIAL_PREFIX, suffix=PARTIAL_SUFFIX
+        )
+        try:
+            # Hash while writing, rather than reading the file back afterwards
+            hasher = sha256()
+            with os.fdopen(handle, "wb") as output:
+                for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                    hasher.update(block)
+                    output.write(block)
+            if sha is not None and hasher.hexdigest() != sha:
+                raise HashMismatchError(
+                    "Hash of {} does not match the index".format(full_link)
+                )
+            getattr(os, "replace", os.rename)(temp_file, output_file)
+        except BaseException:
+            try:
+                os.remove(temp_file)
+            except EnvironmentError:
+                pass
+            raise
+        cache.record_miss(output_file)
+
+        if sha is not None:
+            get_manifest(wheeldir).record(output_file, sha)
+    return output_file, False
+
+
+class PyPIRepository(Repository):
+    def __init__(
+        self,
+        index_url,
+        wheeldir,
+        allow_prerelease=False,
+        retries=3,
+        page_cache=None,
+        lazy_wheels=False,
+        metadata_cache=None,
+    ):
+        # type: (str, str, bool, int, Optional[PageCache], bool, Optional[MetadataCache]) -> None
+        """
+        A repository that conforms to the PEP standard for webpage index of python distributions
+
+        Args:
+            index_url (str): URL of the base index
+            wheeldir (str): Directory to download wheels and source dists to, if required
+            allow_prerelease (bool, optional): Whether or not to consider prereleases
+            retries (int): Number of times to retry. A value of 0 will never retry
+            page_cache (PageCache, optional): Persistent cache of parsed project pages
+            lazy_wheels (bool): Read wheel metadata using HTTP range requests instead
+                of downloading the wheel, when the index supports it
+            metadata_cache (MetadataCache, optional): Persistent cache of metadata
+                extracted from distributions. Distributions with a known hash are
+                not downloaded again
+        """
+        super(PyPIRepository, self).__init__("pypi", allow_prerelease)
+
+        if index_url.endswith("/"):
+            index_url = index_url[:-1]
+        self.index_url = index_url
+        if wheeldir is not None:
+            self.wheeldir = os.path.abspath(wheeldir)
+        else:
+            self.wheeldir = None
+        self.allow_prerelease = allow_prerelease
+        self.retries = retries
+        self.page_cache = page_cache
+        self.lazy_wheels = lazy_wheels
+        self.metadata_cache = metadata_cache
+
+        self.session = requests.Session()
+
+    def __repr__(self):
+        return "--index-url {}".format(self.index_url)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PyPIRepository)
+            and super(PyPIRepository, self).__eq__(other)
+            and self.index_url == other.index_url
+        )
+
+    def __hash__(self):
+        return hash("pypi") ^ hash(self.index_url)
+
+    def get_candidates(self, req):
+        # type: (pkg_resources.Requirement) -> Sequence[Candidate]
+        if req is None:
+            return []
+        return _scan_page_links(
+            self.index_url,
+            req.project_name,
+            self.session,
+            self.retries,
+            self.page_cache,
+        )
+
+    def _resolve_from_core_metadata(self, candidate):
+        # type: (Candidate) -> Optional[Tuple[RequirementContainer, bool]]
+        """Resolve a candidate using the standalone metadata file served by the
+        index (PEP 658), avoiding a download of the full distribution
+
+        Returns:
+            The metadata and whether it was cached, or None if the metadata file
+            could not be used
+        """
+        if os.path.exists(os.path.join(self.wheeldir, candidate.filename)):
+            # The distribution itself is already available locally
+            return None
+
+        url, link = candidate.link
+        metadata_link = link.split("#")[0] + ".metadata"
+        sha = candidate.core_metadata.get("sha256")
+        if sha:
+            metadata_link += "#sha256=" + sha
+
+        filename = None
+        try:
+            filename, cached = _do_download(
+                self.logger,
+                candidate.filename + ".metadata",
+                (url, metadata_link),
+                self.session,
+                self.wheeldir,
+            )
+            with open(filename, "rb") as handle:
+                result = _parse_flat_metadata(handle.read().decode("utf-8", "ignore"))
+        except (requests.RequestException, EnvironmentError, ValueError) as ex:
+            self.logger.info(
+                "Could not use metadata file for %s - %s", candidate.filename, ex
+            )
+            return None
+
+        if result.name is None or result.version is None:
+            self.logger.warning(
+                "Metadata file for %s is incomplete, downloading the distribution",
+                candidate.filename,
+            )
+            os.remove(filename)
+            return None
+
+        result.origin = self
+        return result, cached
+
+    def _resolve_from_lazy_wheel(self, candidate):
+        # type: (Candidate) -> Optional[RequirementContainer]
+        """Resolve a wheel candidate by reading only its metadata from the index
+        with HTTP range requests
+
+        Returns:
+            The metadata, or None if the wheel could not be read this way
+        """
+        if os.path.exists(os.path.join(self.wheeldir, candidate.filename)):
+            return None
+
+        url, link = candidate.link
+        full_link = urllib.parse.urljoin(url, link.split("#")[0])
+        try:
+            result = fetch_wheel_metadata(full_link, candidate.filename, self.session)
+        except RangeRequestsUnsupported as ex:
+            self.logger.info("Cannot lazily read %s - %s", candidate.filename, ex)
+            return None
+        except (
+            requests.RequestException,
+            zipfile.BadZipfile,
+            EnvironmentError,
+            ValueError,
+        ) as ex:
+            self.logger.warning(
+                "Failed to lazily read %s - %s", candidate.filename, ex
+            )
+            return None
+
+        if result is None or result.name is None or result.version is None:
+            return None
+        result.origin = self
+        return result
+
+    def _cached_metadata(self, key):
+        # type: (Optional[str]) -> Optional[RequirementContainer]
+        if self.metadata_cache is None:
+            return None
+        result = self.metadata_cache.get(key)
+        if result is not None:
+            result.origin = self
+        return result
+
+    def resolve_candidate(self, candidate):
+        # type: (Candidate) -> Tuple[Optional[RequirementContainer], bool]
+        # The hash from the index identifies the distribution, so there's no need
+        # to download it again if its metadata was seen before
+        key = link_key(candidate.link[1]) if candidate.link else None
+        result = self._cached_metadata(key)
+        if result is not None:
+            return result, True
+
+        result, cached = self._resolve_candidate(candidate)
+        if self.metadata_cache is not None:
+            self.metadata_cache.put(key, result)
+        return result, cached
+
+    def _resolve_candidate(self, candidate):
+        # type: (Candidate) -> Tuple[Optional[RequirementContainer], bool]
+        if candidate.core_metadata is not None:
+            metadata_result = self._resolve_from_core_metadata(candidate)
+            if metadata_result is not None:
+                return metadata_result
+
+        if self.lazy_wheels and candidate.type == DistributionType.WHEEL:
+            lazy_result = self._resolve_from_lazy_wheel(candidate)
+            if lazy_result is not None:
+                return lazy_result, False
+
+        filename, cached = None, True
+        try:
+            filename, cached = _do_download(
+                self.logger,
+                candidate.filename,
+                candidate.link,
+                self.session,
+                self.wheeldir,
+            )
+            key = file_key(filename)
+            result = self._cached_metadata(key)
+            if result is None:
+                result = extract_metadata(filename, origin=self)
+                if self.metadata_cache is not None:
+                    self.metadata_cache.put(key, result)
+            return result, cached
+        except HashMismatchError as ex:
+            raise MetadataError(candidate.name, candidate.version, ex)
+        except MetadataError:
+            if not cached and filename is not None:
+                try:
+                    os.remove(filename)
+                except EnvironmentError:
+                    pass
+            raise
+
+    def close(self):
+        # type: () -> None
+        self.session.close()
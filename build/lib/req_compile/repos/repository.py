@@ -0,0 +1,856 @@
+from __future__ import print_function
+
+import bisect
+import enum
+import logging
+import os
+import platform
+import struct
+import sys
+import sysconfig
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+import packaging.version
+import pkg_resources
+import six
+
+try:
+    import packaging.tags as packaging_tags
+except ImportError:  # packaging < 20
+    packaging_tags = None  # type: ignore
+
+import req_compile.errors
+import req_compile.utils
+from req_compile.containers import DistInfo, RequirementContainer
+from req_compile.errors import NoCandidateException
+from req_compile.filename import parse_source_filename
+from req_compile.utils import have_compatible_glibc, normalize_project_name, parse_version
+from req_compile.versions import VersionSet
+
+INTERPRETER_TAGS = {
+    "CPython": "cp",
+    "IronPython": "ip",
+    "PyPy": "pp",
+    "Jython": "jy",
+}
+
+INTERPRETER_TAG = INTERPRETER_TAGS.get(platform.python_implementation(), "cp")
+PY_VERSION_NUM = str(sys.version_info.major) + str(sys.version_info.minor)
+
+SortKey = Tuple[packaging.version.Version, str, int, Tuple[int, int, int, int, int]]
+
+
+def is_manylinux2010_compatible():
+    # type: () -> bool
+    # Check for presence of _manylinux module
+    try:
+        import _manylinux  # type: ignore  # pylint: disable=bad-option-value,import-outside-toplevel
+
+        return bool(_manylinux.manylinux2010_compatible)
+    except (ImportError, AttributeError):
+        # Fall through to heuristic check below
+        pass
+
+    # Check glibc version. CentOS 6 uses glibc 2.12.
+    # PEP 513 contains an implementation of this function.
+    return have_compatible_glibc(2, 12)
+
+
+def is_manylinux2014_compatible():
+    # type: () -> bool
+    # Only Linux, and only supported architectures
+    if platform.machine() not in (
+        "x86_64",
+        "i686",
+        "aarch64",
+        "armv7l",
+        "ppc64",
+        "ppc64le",
+        "s390x",
+    ):
+        return False
+
+    # Check for presence of _manylinux module
+    try:
+        import _manylinux  # pylint: disable=bad-option-value,import-outside-toplevel
+
+        return bool(_manylinux.manylinux2014_compatible)
+    except (ImportError, AttributeError):
+        # Fall through to heuristic check below
+        pass
+
+    # Check glibc version. CentOS 7 uses glibc 2.17.
+    # PEP 513 contains an implementation of this function.
+    return have_compatible_glibc(2, 17)
+
+
+def _get_platform_tags():
+    # type: () -> Sequence[str]
+    is_32 = struct.calcsize("P") == 4
+    if sys.platform == "win32":
+        if is_32:
+            tag = ("win32",)
+        else:
+            tag = ("win_amd64",)
+    elif sys.platform.startswith("linux"):
+        if is_32:
+            arch_tag = platform.machine()
+        else:
+            arch_tag = "x86_64"
+
+        tag = (
+            ("linux_" + arch_tag),
+            ("manylinux1_" + arch_tag),
+        )
+        if is_manylinux2010_compatible():
+            tag += ("manylinux2010_" + arch_tag,)
+        if is_manylinux2014_compatible():
+            tag += ("manylinux2014_" + arch_tag,)
+    else:
+        raise ValueError("Unsupported platform: {}".format(sys.platform))
+    return ("any",) + tag
+
+
+def _get_abi_tag():
+    # type: () -> str
+    """Build a best effort ABI tag"""
+    py_version = (sys.version_info.major, sys.version_info.minor)
+    tag = INTERPRETER_TAG + PY_VERSION_NUM
+    if py_version < (3, 8):
+        pymalloc = sysconfig.get_config_var("WITH_PYMALLOC")
+        if pymalloc or pymalloc is None:
+            tag += "m"
+        if py_version < (3, 3):
+            unicode_size = sysconfig.get_config_var("Py_UNICODE_SIZE")
+            if unicode_size == 4 or (
+                unicode_size is None and sys.maxunicode == 0x10FFFF
+            ):
+                tag += "u"
+    return tag
+
+
+def _legacy_supported_tags():
+    # type: () -> Tuple[Tuple[str, str, str], ...]
+    """Approximate the wheel tags of this interpreter, for versions of packaging
+    without the tags module"""
+    platforms = tuple(reversed(_get_platform_tags()))
+    interpreter = INTERPRETER_TAG + PY_VERSION_NUM
+    abis = (_get_abi_tag(), "abi" + str(sys.version_info.major), "none")
+    generic = ("py" + PY_VERSION_NUM, "py" + str(sys.version_info.major))
+    return tuple(
+        (interpreter, abi, plat) for abi in abis for plat in platforms
+    ) + tuple((py_tag, "none", plat) for py_tag in generic for plat in platforms)
+
+
+def _get_supported_tags():
+    # type: () -> Tuple[Tuple[str, str, str], ...]
+    """All (interpreter, abi, platform) wheel tags this interpreter can install,
+    from most to least preferred (PEP 425)"""
+    if packaging_tags is None:
+        return _legacy_supported_tags()
+    return tuple(
+        (tag.interpreter, tag.abi, tag.platform) for tag in packaging_tags.sys_tags()
+    )
+
+
+def _unique(values):
+    # type: (Iterable[str]) -> Tuple[str, ...]
+    seen = set()  # type: Set[str]
+    result = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            result.append(value)
+    return tuple(result)
+
+
+SUPPORTED_TAGS = _get_supported_tags()
+
+# Each component of the supported tags, from least to most preferred
+PLATFORM_TAGS = _unique(plat for _, _, plat in reversed(SUPPORTED_TAGS))
+ABI_TAGS = _unique(abi for _, abi, _ in reversed(SUPPORTED_TAGS) if abi != "none")
+
+# Position of each tag in the preference order, for constant time checks and
+# scoring. Higher is better
+_TAG_PRIORITY = {tag: score for score, tag in enumerate(reversed(SUPPORTED_TAGS))}
+_PLATFORM_SCORES = {tag: score for score, tag in enumerate(PLATFORM_TAGS)}
+_ABI_SCORES = {tag: score for score, tag in enumerate(ABI_TAGS)}
+
+
+def _wheel_tag_priority(py_tags, abi, platforms):
+    # type: (Iterable[str], str, str) -> Optional[int]
+    """Find the priority of the best supported tag in a wheel's compressed tag set
+
+    Args:
+        py_tags: The python tags of the wheel
+        abi: The ABI tag of the wheel, possibly compressed
+        platforms: The platform tag of the wheel, possibly compressed
+
+    Returns:
+        The priority, or None if this interpreter supports none of the tags
+    """
+    best = None
+    for py_tag in py_tags:
+        for abi_tag in abi.lower().split("."):
+            for plat in platforms.lower().split("."):
+                priority = _TAG_PRIORITY.get((py_tag.lower(), abi_tag, plat))
+                if priority is not None and (best is None or priority > best):
+                    best = priority
+    return best
+
+
+class RepositoryInitializationError(ValueError):
+    """Failure to initialize a repository"""
+
+    def __init__(self, repo_type, message):
+        super(RepositoryInitializationError, self).__init__(message)
+        self.type = repo_type
+
+
+class DistributionType(enum.IntEnum):
+    SOURCE = 2
+    WHEEL = 1
+    SDIST = 0
+
+
+class PythonVersionRequirement(object):
+    def check_compatibility(self):
+        raise NotImplementedError
+
+
+def _all_py_tags_in_major(up_to):
+    up_to = int(up_to)
+    while (up_to % 10) > 0:
+        yield INTERPRETER_TAG + str(up_to)
+        yield "py" + str(up_to)
+        up_to -= 1
+    yield "py" + str(up_to)
+
+
+class WheelVersionTags(PythonVersionRequirement):
+    WHEEL_VERSION_TAGS = (
+        INTERPRETER_TAG + PY_VERSION_NUM,
+        "py2" if six.PY2 else "py3",
+    ) + tuple(_all_py_tags_in_major(PY_VERSION_NUM))
+
+    def __init__(self, py_version):
+        # type: (Iterable[str]) -> None
+        self.py_version = py_version
+
+    def check_compatibility(self):
+        # type: () -> bool
+        if not self.py_version:
+            return True
+        return any(
+            version in WheelVersionTags.WHEEL_VERSION_TAGS
+            for version in self.py_version
+        )
+
+    def __str__(self):
+        # type: () -> str
+        if not self.py_version:
+            return "any"
+
+        return ".".join(sorted(self.py_version))
+
+    def __eq__(self, other):
+        return self.py_version == other.py_version
+
+    @property
+    def tag_score(self):
+        # type: () -> int
+        """Calculate a score based on the quality of the version tags
+        on the wheel"""
+        result = 0
+
+        best_score = sys.maxsize
+        for version in self.py_version:
+            try:
+                score = WheelVersionTags.WHEEL_VERSION_TAGS.index(version)
+                best_score = min(score, best_score)
+            except ValueError:
+                pass
+        result += len(WheelVersionTags.WHEEL_VERSION_TAGS) - best_score
+        return result
+
+
+class Candidate(object):  # pylint: disable=too-many-instance-attributes
+    """A candidate representing come kind of distribution to resolve"""
+
+    # Project pages can list thousands of files, so avoid a dict per candidate
+    __slots__ = (
+        "name",
+        "filename",
+        "version",
+        "py_version",
+        "abi",
+        "platform",
+        "link",
+        "type",
+        "tag_priority",
+        "_sortkey",
+        "_extra_sort_info",
+        "preparsed",
+        "yanked",
+        "core_metadata",
+    )
+
+    def __init__(
+        self,
+        name,  # type: str
+        filename,  # type: str
+        version,  # type: packaging.version.Version
+        py_version,  # type: Optional[WheelVersionTags]
+        abi,  # type: Optional[str]
+        plat,  # type: str
+        link,  # type: Optional[str]
+        candidate_type=DistributionType.SDIST,  # type: DistributionType
+        extra_sort_info="",  # type: str
+    ):
+        # type: (...) -> None
+        """
+        Args:
+            name: Name of the candidate
+            filename: The filename of the source of the candidate
+            version:
+            py_version (RequiresPython): Python version
+            abi (str, None)
+            plat (str): Platform tag, which may be a compressed tag set (PEP 425)
+            link:
+            candidate_type:
+        """
+        self.name = name
+        self.filename = filename
+        self.version = version or parse_version("0.0.0")  # type: packaging.version.Version
+        self.py_version = py_version
+        self.abi = abi
+        self.platform = plat
+        self.link = link
+        self.type = candidate_type
+
+        # Priority of the best tag of a wheel that this interpreter supports. None
+        # if it supports none of them, or if the tags aren't known
+        self.tag_priority = None  # type: Optional[int]
+        if isinstance(py_version, WheelVersionTags) and py_version.py_version:
+            self.tag_priority = _wheel_tag_priority(
+                py_version.py_version, abi or "none", plat
+            )
+
+        # Sort based on tags to make sure the most specific distributions
+        # are matched first
+        self._sortkey = None  # type: Optional[SortKey]
+        self._extra_sort_info = extra_sort_info
+
+        self.preparsed = None  # type: Optional[RequirementContainer]
+
+        # Whether the index marked this file as yanked (PEP 592)
+        self.yanked = False
+
+        # Hashes of the standalone metadata file the index serves for this
+        # file (PEP 658/714), or None if it doesn't serve one
+        self.core_metadata = None  # type: Optional[Dict[str, str]]
+
+    @property
+    def sortkey(self):
+        # type: () -> SortKey
+        if self._sortkey is None:
+            self._sortkey = (
+                self.version,
+                self._extra_sort_info,
+                self.type.value,
+                self.tag_score,
+            )
+        return self._sortkey
+
+    @property
+    def tag_score(self):
+        # type: () -> Tuple[int, int, int, int, int]
+        tag_priority = self.tag_priority if self.tag_priority is not None else -1
+        py_version_score = (
+            self.py_version.tag_score if self.py_version is not None else 0
+        )
+        abi_score = _ABI_SCORES.get(self.abi, 0) if self.abi is not None else 0
+        plat_score = max(
+            _PLATFORM_SCORES.get(plat, 0)
+            for plat in self.platform.lower().split(".")
+        )
+        # Spaces in source dist filenames penalize them in the search order
+        extra_score = (
+            0
+            if isinstance(self.filename, six.string_types) and " " in self.filename
+            else 1
+        )
+        return tag_priority, py_version_score, plat_score, abi_score, extra_score
+
+    def __eq__(self, other):
+        # type: (Any) -> bool
+        return (
+            self.name == other.name
+            and self.filename == other.filename
+            and self.version == other.version
+            and self.py_version == other.py_version
+            and self.abi == other.abi
+            and self.platform == other.platform
+            and self.link == other.link
+            and self.type == other.type
+        )
+
+    def __repr__(self):
+        # type: () -> str
+        return "Candidate(name={}, filename={}, version={}, py_version={}, abi={}, platform={}, link={})".format(
+            self.name,
+            self.filename,
+            self.version,
+            self.py_version,
+            self.abi,
+            self.platform,
+            self.link,
+        )
+
+    def __str__(self):
+        # type: () -> str
+        py_version_str = str(self.py_version) + "-"
+        return "{} {}-{}-{}{}-{}".format(
+            self.type.name,
+            self.name,
+            self.version,
+            py_version_str,
+            self.abi,
+            self.platform,
+        )
+
+
+def process_distribution(source, filename, check_compatibility=False):
+    # type: (Any, str, bool) -> Optional[Candidate]
+    """Build a candidate from a distribution filename
+
+    Args:
+        source: Where the distribution came from, stored as the candidate's link
+        filename: Filename of the distribution
+        check_compatibility: Skip wheels whose ABI or platform tags can't be used by
+            this interpreter, without building a candidate for them
+
+    Returns:
+        The candidate, or None if the file is not a usable distribution
+    """
+    candidate = None
+    if filename.endswith(".egg"):
+        return None
+    if ".whl" in filename:
+        if check_compatibility and not _wheel_filename_compatible(filename):
+            return None
+        candidate = _wheel_candidate(source, filename)
+    elif (
+        ".tar.gz" in filename
+        or ".tgz" in filename
+        or ".zip" in filename
+        or ".tar.bz2" in filename
+    ):
+        # Best effort skip of dumb binary distributions
+        if ".linux-" in filename or ".win-" in filename or ".macosx-" in filename:
+            return None
+        candidate = _tar_gz_candidate(source, filename)
+    return candidate
+
+
+def _wheel_filename_compatible(filename):
+    # type: (str) -> bool
+    """Check whether this interpreter supports any of the tags of a wheel filename.
+    Filenames that can't be split into tags are left for _wheel_candidate to report"""
+    data_parts = os.path.basename(filename).split("-")
+    if len(data_parts) < 5:
+        return True
+    return (
+        _wheel_tag_priority(
+            data_parts[-3].split("."),
+            data_parts[-2],
+            data_parts[-1].rsplit(".whl", 1)[0],
+        )
+        is not None
+    )
+
+
+def _wheel_candidate(source, filename):
+    # type: (str, str) -> Optional[Candidate]
+    filename = os.path.basename(filename)
+    data_parts = filename.split("-")
+    if len(data_parts) < 5:
+        logging.getLogger("req_compile.repository").debug(
+            "Unable to use %s, improper filename", filename
+        )
+        return None
+
+    has_build_tag = len(data_parts) == 6
+    build_tag = ""
+    if has_build_tag:
+        build_tag = data_parts.pop(2)
+    name = data_parts[0]
+    abi = data_parts[3]
+    #  Convert old-style post-versions to new style so it will sort correctly
+    version = parse_version(data_parts[1].replace("_", "-"))
+    plat = data_parts[4].rsplit(".whl", 1)[0]
+
+    requires_python = WheelVersionTags(tuple(data_parts[2].split(".")))
+
+    return Candidate(
+        name,
+        filename,
+        version,
+        requires_python,
+        abi if abi != "none" else None,
+        plat,
+        source,
+        candidate_type=DistributionType.WHEEL,
+        extra_sort_info=build_tag,
+    )
+
+
+def _tar_gz_candidate(source, filename):
+    # type: (str, str) -> Candidate
+    name, version = parse_source_filename(os.path.basename(filename))
+    return Candidate(
+        name,
+        filename,
+        version,
+        None,
+        None,
+        "any",
+        source,
+        candidate_type=DistributionType.SDIST,
+    )
+
+
+def _check_platform_compatibility(py_platform):
+    # type: (str) -> bool
+    return any(
+        plat == "any" or plat in _PLATFORM_SCORES
+        for plat in py_platform.lower().split(".")
+    )
+
+
+def _check_abi_compatibility(abi):
+    # type: (str) -> bool
+    return abi in _ABI_SCORES
+
+
+class BaseRepository(object):
+    def get_candidate(self, req, max_downgrade=None):
+        # type: (pkg_resources.Requirement, int) -> Tuple[RequirementContainer, bool]
+        """Fetch the best matching candidate for the given requirement
+
+        Args:
+            req: Requirement to find a match for
+            max_downgrade: Maximum number of different versions to try if
+                metadata parsing fails
+
+        Returns:
+            Tuple of the best matching candidate and whether or not the result came from a cache
+        """
+        raise NotImplementedError()
+
+    def prefetch(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Hint that a candidate for the requirement will soon be requested. Repositories
+        that can fetch in the background may start doing so. The default does nothing
+
+        Args:
+            req: Requirement that will be looked up
+        """
+
+
+class CantUseReason(enum.Enum):
+    U_CAN_USE = 0
+    WRONG_PYTHON_VERSION = 2
+    WRONG_PLATFORM = 3
+    IS_PRERELEASE = 4
+    VERSION_NO_SATISFY = 5
+    BAD_METADATA = 6
+    NAME_DOESNT_MATCH = 7
+    WRONG_ABI = 8
+    IS_YANKED = 9
+
+
+def sort_candidates(candidates):
+    # type: (Iterable[Candidate]) -> Sequence[Candidate]
+    """Sort candidates for highest compatibility and version
+
+    Args:
+        candidates: Candidates to sort
+
+    Returns:
+        The sorted list, starting with the best matching candidate
+    """
+    return sorted(candidates, key=lambda x: x.sortkey, reverse=True)
+
+
+def _check_compatibility(candidate):
+    # type: (Candidate) -> Optional[CantUseReason]
+    """Check whether a candidate can be installed into this interpreter at all"""
+    if candidate.tag_priority is not None:
+        return None
+
+    if (
+        candidate.py_version is not None
+        and not candidate.py_version.check_compatibility()
+    ):
+        return CantUseReason.WRONG_PYTHON_VERSION
+
+    if candidate.abi is not None and not _check_abi_compatibility(candidate.abi):
+        return CantUseReason.WRONG_ABI
+
+    if not _check_platform_compatibility(candidate.platform):
+        return CantUseReason.WRONG_PLATFORM
+
+    if isinstance(candidate.py_version, WheelVersionTags) and (
+        candidate.py_version.py_version
+    ):
+        # Each tag is fine on its own, but this interpreter doesn't support any
+        # of their combinations (e.g. cp39-none-any)
+        return CantUseReason.WRONG_PYTHON_VERSION
+
+    return None
+
+
+def check_usability(req, candidate, has_equality=None, allow_prereleases=False):
+    # type: (pkg_resources.Requirement, Candidate, bool, bool) -> Optional[CantUseReason]
+    reason = _check_compatibility(candidate)
+    if reason is not None:
+        return reason
+    return _check_version(req, candidate, has_equality, allow_prereleases)
+
+
+def _check_version(req, candidate, has_equality, allow_prereleases):
+    # type: (pkg_resources.Requirement, Candidate, Optional[bool], bool) -> Optional[CantUseReason]
+    if not has_equality and not allow_prereleases and candidate.version.is_prerelease:
+        return CantUseReason.IS_PRERELEASE
+
+    # Yanked files are only considered when explicitly pinned, per PEP 592
+    if candidate.yanked and not has_equality:
+        return CantUseReason.IS_YANKED
+
+    if req is not None and not req.specifier.contains(  # type: ignore[attr-defined]
+        candidate.version, prereleases=has_equality or allow_prereleases
+    ):
+        return CantUseReason.VERSION_NO_SATISFY
+
+    return None
+
+
+def filter_candidates(req, candidates, allow_prereleases=False):
+    # type: (pkg_resources.Requirement, Iterable[Candidate], bool) -> Iterable[Candidate]
+    has_equality = (
+        req_compile.utils.is_pinned_requirement(req) if req is not None else False
+    )
+
+    for candidate in candidates:
+        if (
+            check_usability(
+                req,
+                candidate,
+                has_equality=has_equality,
+                allow_prereleases=allow_prereleases,
+            )
+            is None
+        ):
+            yield candidate
+
+
+def _is_all_prereleases(candidates):
+    # type: (Iterable[Candidate]) -> bool
+    all_prereleases = True
+    for candidate in candidates:
+        all_prereleases = all_prereleases and candidate.version.is_prerelease
+    return all_prereleases
+
+
+class CandidateIndex(object):
+    """The candidates of a single project, sorted once from best to worst and with
+    the ones that can't be installed into this interpreter removed. Lookups narrow
+    the candidates down to the allowed versions with a binary search before
+    checking each remaining candidate against the requirement"""
+
+    def __init__(self, candidates):
+        # type: (Iterable[Candidate]) -> None
+        self.source = candidates
+        candidates = list(candidates)
+        self._members = candidates
+        self.all_prereleases = _is_all_prereleases(candidates)
+        self.unversioned = [
+            candidate for candidate in candidates if candidate.version is None
+        ]
+        self.candidates = sort_candidates(
+            candidate
+            for candidate in candidates
+            if candidate.version is not None
+            and _check_compatibility(candidate) is None
+        )
+        # Ascending, for bisect. Local version labels are ignored by the bounds
+        self._versions = [
+            parse_version(candidate.version.public)
+            for candidate in reversed(self.candidates)
+        ]
+
+    def built_from(self, candidates):
+        # type: (Iterable[Candidate]) -> bool
+        """Whether the index holds exactly the given candidates. Iterators can only
+        be read once, so they are never considered the same"""
+        if candidates is self.source:
+            return True
+        if not isinstance(candidates, (list, tuple)) or len(candidates) != len(
+            self._members
+        ):
+            return False
+        return all(
+            candidate is member for candidate, member in zip(candidates, self._members)
+        )
+
+    def matching(self, req, allow_prereleases=False):
+        # type: (pkg_resources.Requirement, bool) -> Iterable[Candidate]
+        """Yield the candidates that satisfy the requirement, best first"""
+        has_equality = (
+            req_compile.utils.is_pinned_requirement(req) if req is not None else False
+        )
+        total = len(self.candidates)
+        # Intervals are ascending and disjoint, so walking them backwards preserves
+        # the best first order
+        for interval in reversed(VersionSet.from_requirement(req).intervals):
+            start = 0
+            if interval.lower is not None:
+                start = bisect.bisect_left(self._versions, interval.lower)
+            end = total
+            if interval.upper is not None:
+                end = bisect.bisect_right(self._versions, interval.upper)
+            for candidate in self.candidates[total - end : total - start]:
+                if (
+                    _check_version(req, candidate, has_equality, allow_prereleases)
+                    is None
+                ):
+                    yield candidate
+
+
+class Repository(BaseRepository):
+    def __init__(self, logger_name, allow_prerelease=None):
+        # type: (str, bool) -> None
+        super(Repository, self).__init__()
+        if allow_prerelease is None:
+            allow_prerelease = False
+        self.logger = logging.getLogger("req_compile.repository").getChild(logger_name)
+        self.allow_prerelease = allow_prerelease
+        self._candidate_indexes = {}  # type: Dict[str, CandidateIndex]
+
+    def __eq__(self, other):
+        return self.allow_prerelease == other.allow_prerelease
+
+    def __iter__(self):
+        return iter([self])
+
+    def get_candidates(self, req):
+        # type: (pkg_resources.Requirement) -> Iterable[Candidate]
+        """
+        Fetch all available candidates for a project_name
+        Args:
+            req (Requirement): Requirement to get candidates for
+
+        Returns:
+            (list[Candidate]) List of candidates
+        """
+        raise NotImplementedError()
+
+    def resolve_candidate(self, candidate):
+        # type: (Candidate) -> Tuple[Optional[RequirementContainer], bool]
+        raise NotImplementedError()
+
+    def close(self):
+        # type: () -> None
+        raise NotImplementedError()
+
+    def get_candidate(self, req, max_downgrade=None):
+        # type: (pkg_resources.Requirement, int) -> Tuple[RequirementContainer, bool]
+        self.logger.info("Getting candidate for %s", req)
+        candidates = self.get_candidates(req)
+        return self.do_get_candidate(req, candidates, max_downgrade=max_downgrade)
+
+    def do_get_candidate(
+        self, req, candidates, force_allow_prerelease=False, max_downgrade=None
+    ):
+        # type: (pkg_resources.Requirement, Iterable[Candidate], bool, int) -> Tuple[RequirementContainer, bool]
+        """
+        Args:
+            req: Requirement to fetch candidate for
+            candidates: Available candidates (any versions, unsorted)
+            force_allow_prerelease: Override the allow prerelease setting
+            max_downgrade: Number of different versions to try. Does not limit number of candidates
+                per version nor make any judgements about the semver
+
+        Raises:
+            NoCandidateException if no candidate could be found, or IO errors related to failing
+                to fetch the desired candidate
+
+        Returns:
+            The distribution and whether or not it was cached
+        """
+        allow_prereleases = force_allow_prerelease or self.allow_prerelease
+        index = self._candidate_index(req, candidates)
+        if candidates:
+            for candidate in index.unversioned:
+                self.logger.warning("Found candidate with no version: %s", candidate)
+            tried_versions = set()
+
+            for candidate in index.matching(req, allow_prereleases=allow_prereleases):
+                if candidate.type == DistributionType.SDIST:
+                    self.logger.warning(
+                        "Considering source distribution for %s", candidate.name
+                    )
+
+                try:
+                    dist, cached = self.resolve_candidate(candidate)
+                    if dist is not None:
+                        if normalize_project_name(
+                            candidate.name
+                        ) == normalize_project_name(req.project_name):
+                            return dist, cached
+                except req_compile.errors.MetadataError as ex:
+                    self.logger.warning(
+                        "Could not use candidate %s - %s", candidate, ex
+                    )
+
+                tried_versions.add(candidate.version)
+                if max_downgrade is not None and len(tried_versions) >= max_downgrade:
+                    break
+
+        if (
+            index.all_prereleases or req_compile.utils.has_prerelease(req)
+        ) and not allow_prereleases:
+            self.logger.debug(
+                "No non-prerelease candidates available. Now allowing prereleases"
+            )
+            return self.do_get_candidate(
+                req,
+                candidates,
+                force_allow_prerelease=True,
+                max_downgrade=max_downgrade,
+            )
+
+        raise NoCandidateException(req)
+
+    def _candidate_index(self, req, candidates):
+        # type: (pkg_resources.Requirement, Iterable[Candidate]) -> CandidateIndex
+        """Get the index of a project's candidates. Repositories may build a new
+        list for each lookup of a project, so the index is reused for as long as
+        it holds the same candidates"""
+        key = normalize_project_name(req.project_name)
+        index = self._candidate_indexes.get(key)
+        if index is None or not index.built_from(candidates):
+            index = self._candidate_indexes[key] = CandidateIndex(candidates)
+        return index
+
+    def why_cant_I_use(self, req, candidate):  # pylint: disable=invalid-name
+        # type: (pkg_resources.Requirement, Candidate) -> CantUseReason
+        reason = check_usability(
+            req,
+            candidate,
+            allow_prereleases=self.allow_prerelease,
+        )
+        if reason is None:
+            return CantUseReason.U_CAN_USE
+        return reason
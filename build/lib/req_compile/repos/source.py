@@ -0,0 +1,346 @@
+"""Definition of source repository"""
+from __future__ import print_function
+
+import collections
+import functools
+import itertools
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import req_compile.errors
+import req_compile.metadata
+import req_compile.metadata.metadata
+import req_compile.repos.repository
+from req_compile import utils
+from req_compile.containers import RequirementContainer
+from req_compile.repos.repository import Repository
+from req_compile.repos.sourceindex import SourceIndex
+from req_compile.repos.sourcewalk import PrefixTrie, list_dir, walk_parallel
+
+# Special directories that will never be considered
+from req_compile.utils import parse_version
+
+SPECIAL_DIRS = {
+    "site-packages",
+    "dist-packages",
+    ".git",
+    ".svn",
+    ".idea",
+    "__pycache__",
+    "node_modules",
+    "venv",
+    ".eggs",
+    "build",
+    "dist",
+}
+
+# Files that if included in a directory would disqualify
+# that directory from being included in the repository
+MARKER_FILES = {"__init__.py"}
+
+
+class SourceRepository(Repository):
+    def __init__(
+        self,
+        path,  # type: str
+        excluded_paths=None,  # type: Iterable[str]
+        marker_files=None,  # type: Iterable[str]
+        index_file=None,  # type: Optional[str]
+        lazy=False,  # type: bool
+    ):
+        # type: (...) -> None
+        """
+        A repository for Python projects source code on the filesystem. Directories containing a setup.py
+        or PEP517 pyproject.toml are included in the list of potential distributions
+
+        Args:
+            path (str): Base directory of the source tree
+            excluded_paths (list[str]): List of paths to exclude from the source tree. All others, except for
+                those included in `SPECIAL_DIRS`
+            marker_files (list[str]): Files or directories, that if present, indicate that a discovered
+                source directory should not be included in the repository
+            index_file (str): Database to keep a SourceIndex of the source tree in, so that later
+                scans only list changed directories and extract changed projects
+            lazy (bool): Only extract the metadata of a project when it is asked for.
+                Projects are found by the name they declare in pyproject.toml, setup.cfg
+                or a static setup.py. Projects that don't declare one are extracted
+                up front
+        """
+        super(SourceRepository, self).__init__("source", allow_prerelease=True)
+
+        if not os.path.exists(path):
+            raise ValueError(
+                "Source directory {} does not exist (cwd={})".format(path, os.getcwd())
+            )
+
+        self.path = os.path.abspath(path)
+        self.distributions = collections.defaultdict(
+            list
+        )  # type: Dict[str, List[req_compile.repos.repository.Candidate]]
+        self.marker_files = set(MARKER_FILES)
+
+        if marker_files:
+            self.marker_files |= set(marker_files)
+
+        self.index = None  # type: Optional[SourceIndex]
+        if index_file is not None:
+            self.index = SourceIndex(index_file, self.path)
+
+        self.lazy = lazy
+        # Source directories not extracted yet, by the normalized name they declare
+        self._pending = collections.defaultdict(
+            list
+        )  # type: Dict[str, List[str]]
+        self._pending_lock = threading.Lock()
+
+        self._find_later = []  # type: List[str]
+        try:
+            self._find_all_distributions(
+                [os.path.abspath(path) for path in (excluded_paths or [])]
+            )
+        finally:
+            # Lazily extracted projects are stored as they are found
+            if self.index is not None and not self._pending:
+                self.index.close()
+
+        if self.index is not None:
+            self.logger.info(
+                "Source index of %s: %d projects reused, %d changed or new",
+                self.path,
+                self.index.hits,
+                self.index.misses,
+            )
+        if self._pending:
+            self.logger.info(
+                "Deferred extracting %d projects of %s until they are needed",
+                sum(len(source_dirs) for source_dirs in self._pending.values()),
+                self.path,
+            )
+
+    def _discover(self, source_dir):
+        # type: (str) -> Tuple[str, Optional[RequirementContainer], Optional[str]]
+        """Find the metadata of a source directory in the index or extract it. In
+        lazy mode, only the name the project declares is read instead, if it has
+        one. Projects with a setup.py are deferred to be extracted serially
+
+        Returns:
+            The source directory, its metadata and its declared name. At most one of
+            the metadata and the name is returned
+        """
+        if self.index is not None:
+            cached = self.index.get(source_dir, self.index.fingerprint(source_dir))
+            if cached is not None:
+                cached.origin = self
+                return source_dir, cached, None
+
+        if self.lazy:
+            name = req_compile.metadata.guess_project_name(source_dir)
+            if name is not None:
+                return source_dir, None, name
+
+        if os.path.exists(os.path.join(source_dir, "setup.py")):
+            self._find_later.append(source_dir)
+            return source_dir, None, None
+        return source_dir, self._extract_metadata(source_dir), None
+
+    def _extract_metadata(self, source_dir):
+        # type: (str) -> Optional[RequirementContainer]
+        fingerprint = None
+        if self.index is not None:
+            fingerprint = self.index.fingerprint(source_dir)
+        try:
+            self.logger.debug("Processing %s", source_dir)
+            result = req_compile.metadata.extract_metadata(source_dir, origin=self)
+            if self.index is not None:
+                self.index.put(source_dir, fingerprint, result)
+            return result
+        except req_compile.errors.MetadataError as ex:
+            self.logger.error(
+                "Failed to parse metadata for %s - %s", source_dir, str(ex)
+            )
+            return None
+
+    def _find_all_distributions(self, excluded_paths):
+        # type: (Iterable[str]) -> None
+        """Find all source distribution possible locations"""
+        source_dirs = set(self._find_all_source_dirs(excluded_paths))
+
+        # Loading source distributions via threads can be significantly faster because
+        # it is a lot of I/O
+        pool = ThreadPool(8)
+        try:
+            for source_dir, result, name in pool.imap_unordered(
+                self._discover, source_dirs
+            ):
+                if result is not None:
+                    self._add_distribution(source_dir, result)
+                elif name is not None:
+                    self._pending[utils.normalize_project_name(name)].append(
+                        source_dir
+                    )
+        finally:
+            if pool is not None:
+                pool.close()
+
+        for source_dir in self._find_later:
+            result = self._extract_metadata(source_dir)
+            if result is not None:
+                self._add_distribution(source_dir, result)
+
+        if self.index is not None:
+            self.index.save()
+
+    def _add_distribution(self, source_dir, result):
+        # type: (str, RequirementContainer) -> None
+        if result.version is None:
+            self.logger.debug("Source dir %s did not provide a version")
+            result.version = parse_version("0")
+        candidate = req_compile.repos.repository.Candidate(
+            result.name,
+            source_dir,
+            result.version,
+            None,
+            None,
+            "any",
+            None,
+            req_compile.repos.repository.DistributionType.SOURCE,
+        )
+        candidate.preparsed = result
+        self.distributions[utils.normalize_project_name(result.name)].append(candidate)
+
+    def _extract_pending(self, project_name):
+        # type: (Optional[str]) -> None
+        """Extract the projects that declared a name, or all of them if it is None,
+        the first time they are asked for"""
+        if not self._pending:
+            return
+
+        with self._pending_lock:
+            if project_name is None:
+                pending = sorted(self._pending.items())
+                self._pending.clear()
+            else:
+                pending = [(project_name, self._pending.pop(project_name, []))]
+
+            extracted = []
+            for declared_name, source_dirs in pending:
+                for source_dir in source_dirs:
+                    result = self._extract_metadata(source_dir)
+                    extracted.append(source_dir)
+                    if result is None:
+                        continue
+                    if utils.normalize_project_name(result.name) != declared_name:
+                        self.logger.warning(
+                            "Source dir %s declared the project name %s, but its "
+                            "metadata is for %s",
+                            source_dir,
+                            declared_name,
+                            result.name,
+                        )
+                    self._add_distribution(source_dir, result)
+
+            if self.index is not None and extracted:
+                self.index.save_projects(extracted)
+
+    def _find_all_source_dirs(self, excluded_paths):
+        # type: (Iterable[str]) -> List[str]
+        exclusions = PrefixTrie(excluded_paths)
+        list_dir_func = list_dir
+        if self.index is not None:
+            list_dir_func = self.index.list_dir
+        return walk_parallel(
+            self.path,
+            functools.partial(self._visit_dir, exclusions),
+            list_dir_func=list_dir_func,
+        )
+
+    def _visit_dir(self, exclusions, root, dirs, files):
+        # type: (PrefixTrie, str, List[str], List[str]) -> Optional[str]
+        """Remove the subdirectories of a directory that should not be searched
+
+        Returns:
+            The directory, if it is a source directory
+        """
+        has_marker = False
+        for dir_ in list(dirs):
+            if (
+                dir_ in SPECIAL_DIRS
+                or dir_.endswith(".egg-info")
+                or dir_.endswith(".dist-info")
+            ):
+                dirs.remove(dir_)
+            elif exclusions.matches(os.path.join(root, dir_)):
+                dirs.remove(dir_)
+            if dir_ in self.marker_files:
+                has_marker = True
+                break
+
+        if root != self.path and has_marker:
+            return None
+
+        root_is_valid = False
+        for filename in files:
+            if root != self.path and filename in self.marker_files:
+                dirs[:] = []
+                root_is_valid = False
+                break
+
+            if filename in ("setup.py", "pyproject.toml"):
+                root_is_valid = True
+
+        if not root_is_valid:
+            return None
+
+        # Remove test directories from search
+        for dir_ in list(dirs):
+            if (
+                dir_ == "tests"
+                or dir_ == "test"
+                or dir_.endswith("-tests")
+                or dir_.endswith("-test")
+            ):
+                dirs.remove(dir_)
+        return root
+
+    def __repr__(self):
+        return "--source {}".format(self.path)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, SourceRepository)
+            and super(SourceRepository, self).__eq__(other)
+            and self.path == other.path
+        )
+
+    def __hash__(self):
+        return hash("source") ^ hash(self.path)
+
+    def get_candidates(self, req):
+        if req is None:
+            self._extract_pending(None)
+            return itertools.chain(*self.distributions.values())
+
+        project_name = utils.normalize_project_name(req.name)
+        self._extract_pending(project_name)
+        return self.distributions.get(project_name, [])
+
+    def resolve_candidate(self, candidate):
+        return candidate.preparsed, True
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+
+
+class ReferenceSourceRepository(SourceRepository):
+    """Represents a source that shows up in solution files but may not itself be present"""
+
+    def __init__(self, dist):
+        # Skip the SourceRepository super call
+        # pylint: disable=bad-super-call
+        super(SourceRepository, self).__init__("ref-source", allow_prerelease=True)
+        self.distributions = {dist.name: dist}
+        self.index = None
+        self._pending = {}
@@ -0,0 +1,398 @@
+"""Persistent index of a source tree scan, so later scans only revisit what
+changed"""
+import errno
+import io
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from six.moves import configparser
+
+from req_compile.containers import DistInfo, RequirementContainer
+from req_compile.metadata.setup_ast import evaluate_setup_kwargs
+from req_compile.repos.metadatacache import SOURCE_ENVIRONMENT
+from req_compile.repos.sourcewalk import DirListing, list_dir
+from req_compile.utils import parse_requirements, parse_version
+
+try:
+    import sqlite3
+except ImportError:  # Python built without sqlite
+    sqlite3 = None  # type: ignore
+
+LOG = logging.getLogger("req_compile.repository.sourceindex")
+
+# Bump whenever the meaning of a stored row changes so stale rows are ignored
+INDEX_FORMAT = 1
+
+# Files that commonly hold the version a setup.py reads, looked for in the
+# package directories below a project
+VERSION_FILES = frozenset(
+    ("__init__.py", "version.py", "_version.py", "__version__.py", "__about__.py")
+)
+
+# Directories of requirement files a setup.py may read, e.g. requirements/base.txt
+REQUIREMENTS_DIR_PREFIX = "requirements"
+
+# Anything changed this recently may change again within the resolution of the
+# file system's timestamps, so it is not trusted on the next scan
+RACY_SECONDS = 2.0
+
+# (modification time, subdirectories, files, symlinked subdirectories)
+Listing = Tuple[int, List[str], List[str], List[str]]
+
+
+def _mtime(stat_result):
+    # type: (os.stat_result) -> int
+    return int(stat_result.st_mtime * 1e6)
+
+
+def _split(value):
+    # type: (str) -> List[str]
+    return value.split("\n") if value else []
+
+
+def _setup_cfg_files(source_dir):
+    # type: (str) -> Set[str]
+    """The files named by file: directives in a project's setup.cfg"""
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read(os.path.join(source_dir, "setup.cfg"))
+    except configparser.Error:
+        return set()
+    files = set()
+    for section in parser.sections():
+        for _, value in parser.items(section):
+            value = value.strip()
+            if value.startswith("file:"):
+                files.update(
+                    name.strip() for name in value[5:].split(",") if name.strip()
+                )
+    return files
+
+
+def _setup_py_files(source_dir):
+    # type: (str) -> Set[str]
+    """The files a project's setup.py opens, as far as it can be evaluated
+    statically"""
+    setup_py = os.path.join(source_dir, "setup.py")
+    try:
+        with io.open(setup_py, encoding="utf-8") as handle:
+            contents = handle.read()
+    except (EnvironmentError, ValueError):
+        return set()
+
+    opened = set()
+
+    def _open(filename, **kwargs):
+        # type: (str, **Any) -> Any
+        opened.add(os.path.relpath(filename, source_dir))
+        return io.open(filename, **kwargs)
+
+    evaluate_setup_kwargs(contents, setup_py, _open)
+    return opened
+
+
+class SourceIndex(object):
+    """The directory listings of a source tree and the metadata extracted from
+    each project in it, stored in an sqlite database between runs.
+
+    A directory is listed again only if its modification time changed. A project
+    is extracted again only if one of the files in its directory, its
+    requirements directories or the version files of its packages changed, or a
+    file its setup.py or setup.cfg reads, as far as they can be understood
+    without running them. Versions computed from version control, e.g. by
+    setuptools_scm, are not tracked. Lookups are safe to make from several
+    threads. Nothing is written until save() is called.
+    """
+
+    def __init__(self, filename, root):
+        # type: (str, str) -> None
+        """
+        Args:
+            filename: Database file. Its directory is created if needed
+            root: The source tree indexed
+        """
+        self.filename = os.path.abspath(filename)
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._old_listings = {}  # type: Dict[str, Listing]
+        self._old_projects = {}  # type: Dict[str, Tuple[str, DistInfo]]
+        self._listings = {}  # type: Dict[str, Listing]
+        self._projects = {}  # type: Dict[str, Tuple[str, DistInfo]]
+        self._now = time.time()
+        self.connection = self._connect()
+        if self.connection is not None:
+            self._load()
+
+    def __repr__(self):
+        return "SourceIndex({}, {})".format(self.filename, self.root)
+
+    def _connect(self):
+        if sqlite3 is None:
+            LOG.warning("sqlite3 is not available, source trees will not be indexed")
+            return None
+
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have created it first
+                if not os.path.isdir(directory):
+                    raise
+        try:
+            connection = sqlite3.connect(
+                self.filename, timeout=30, check_same_thread=False
+            )
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS listings "
+                    "(root TEXT, path TEXT, format INTEGER, mtime INTEGER, "
+                    "dirs TEXT, files TEXT, links TEXT, PRIMARY KEY (root, path))"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS projects "
+                    "(root TEXT, path TEXT, format INTEGER, fingerprint TEXT, "
+                    "name TEXT, version TEXT, requires TEXT, PRIMARY KEY (root, path))"
+                )
+        except sqlite3.Error:
+            LOG.warning("Unable to open source index %s", self.filename, exc_info=True)
+            return None
+        return connection
+
+    def _load(self):
+        try:
+            listings = self.connection.execute(
+                "SELECT path, mtime, dirs, files, links FROM listings "
+                "WHERE root = ? AND format = ?",
+                (self.root, INDEX_FORMAT),
+            ).fetchall()
+            projects = self.connection.execute(
+                "SELECT path, fingerprint, name, version, requires FROM projects "
+                "WHERE root = ? AND format = ?",
+                (self.root, INDEX_FORMAT),
+            ).fetchall()
+        except sqlite3.Error:
+            LOG.warning("Unable to read source index %s", self.filename, exc_info=True)
+            return
+
+        for path, mtime, dirs, files, links in listings:
+            self._old_listings[path] = (
+                mtime,
+                _split(dirs),
+                _split(files),
+                _split(links),
+            )
+        for path, fingerprint, name, version, requires in projects:
+            self._old_projects[path] = (
+                fingerprint,
+                DistInfo(
+                    name,
+                    parse_version(version) if version is not None else None,
+                    list(parse_requirements(_split(requires))),
+                ),
+            )
+        LOG.debug(
+            "Loaded %d directories and %d projects of %s from the source index",
+            len(self._old_listings),
+            len(self._old_projects),
+            self.root,
+        )
+
+    def list_dir(self, path):
+        # type: (str) -> Optional[DirListing]
+        """List a directory like sourcewalk.list_dir, from the index if it hasn't
+        been modified since. Safe to call from several threads"""
+        try:
+            mtime = _mtime(os.stat(path))
+        except EnvironmentError:
+            return None
+
+        listing = self._old_listings.get(path)
+        if listing is None or listing[0] != mtime:
+            dir_listing = list_dir(path)
+            if dir_listing is None:
+                return None
+            listing = (mtime,) + dir_listing
+
+        if not self._is_racy(mtime):
+            self._listings[path] = listing
+        return listing[1:]
+
+    def _is_racy(self, mtime):
+        # type: (int) -> bool
+        return mtime >= (self._now - RACY_SECONDS) * 1e6
+
+    def fingerprint(self, source_dir):
+        # type: (str) -> Optional[str]
+        """Describe the files a project's metadata is likely to come from, so a
+        change to any of them can be detected. Running a setup.py may give other
+        metadata on another interpreter or platform, so the environment is part of
+        the fingerprint as well
+
+        Returns:
+            The fingerprint, or None if the files can't be trusted to be unchanged
+        """
+        listing = self._listings.get(source_dir)
+        if listing is None:
+            return None
+
+        files = set(listing[2])
+        if "setup.cfg" in listing[2]:
+            files.update(_setup_cfg_files(source_dir))
+        if "setup.py" in listing[2]:
+            files.update(_setup_py_files(source_dir))
+        subdirs = [
+            (dir_, self._listings.get(os.path.join(source_dir, dir_)))
+            for dir_ in listing[1]
+        ]
+        for dir_, sublisting in subdirs:
+            if sublisting is None:
+                continue
+            files.update(
+                dir_ + "/" + name
+                for name in sublisting[2]
+                if name in VERSION_FILES or dir_.startswith(REQUIREMENTS_DIR_PREFIX)
+            )
+            # Packages in a src layout are one level further down
+            if dir_ == "src":
+                for package in sublisting[1]:
+                    package_listing = self._listings.get(
+                        os.path.join(source_dir, dir_, package)
+                    )
+                    if package_listing is not None:
+                        files.update(
+                            dir_ + "/" + package + "/" + name
+                            for name in package_listing[2]
+                            if name in VERSION_FILES
+                        )
+
+        parts = ["environment:{}".format(SOURCE_ENVIRONMENT)]
+        for name in sorted(files):
+            path = os.path.join(source_dir, name)
+            try:
+                stat = os.stat(path)
+            except EnvironmentError as ex:
+                if ex.errno != errno.ENOENT:
+                    return None
+                # A file the project would read if it existed
+                parts.append("{}:missing".format(name))
+                continue
+            if self._is_racy(_mtime(stat)):
+                return None
+            parts.append("{}:{}:{}".format(name, stat.st_size, _mtime(stat)))
+        return "\n".join(parts)
+
+    def get(self, source_dir, fingerprint):
+        # type: (str, Optional[str]) -> Optional[DistInfo]
+        """Load the metadata of a project, if it was extracted from the same files"""
+        with self.lock:
+            entry = self._old_projects.get(source_dir)
+            if fingerprint is None or entry is None or entry[0] != fingerprint:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._projects[source_dir] = entry
+        return entry[1]
+
+    def put(self, source_dir, fingerprint, result):
+        # type: (str, Optional[str], Optional[RequirementContainer]) -> None
+        """Record the metadata extracted from a project. Only complete DistInfo
+        results are stored, as other containers can't be rebuilt from their
+        requirements"""
+        if (
+            fingerprint is None
+            or not isinstance(result, DistInfo)
+            or result.meta
+            or result.name is None
+        ):
+            return
+        with self.lock:
+            self._projects[source_dir] = (fingerprint, result)
+
+    def save(self):
+        # type: () -> None
+        """Replace the stored index of the source tree with what was seen in this
+        scan, dropping directories and projects that are gone. Projects whose
+        directories are still there but weren't looked up are kept"""
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                projects = dict(
+                    (path, entry)
+                    for path, entry in self._old_projects.items()
+                    if path in self._listings
+                )
+                projects.update(self._projects)
+                self.connection.execute(
+                    "DELETE FROM listings WHERE root = ?", (self.root,)
+                )
+                self.connection.execute(
+                    "DELETE FROM projects WHERE root = ?", (self.root,)
+                )
+                self.connection.executemany(
+                    "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            self.root,
+                            path,
+                            INDEX_FORMAT,
+                            mtime,
+                            "\n".join(dirs),
+                            "\n".join(files),
+                            "\n".join(links),
+                        )
+                        for path, (mtime, dirs, files, links) in self._listings.items()
+                    ),
+                )
+                self._insert_projects(projects)
+        except sqlite3.Error:
+            LOG.warning("Unable to write source index %s", self.filename, exc_info=True)
+
+    def save_projects(self, source_dirs):
+        # type: (Iterable[str]) -> None
+        """Store the metadata recorded for some projects since the last save,
+        without rewriting the rest of the index"""
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                self._insert_projects(
+                    dict(
+                        (path, self._projects[path])
+                        for path in source_dirs
+                        if path in self._projects
+                    )
+                )
+        except sqlite3.Error:
+            LOG.warning("Unable to write source index %s", self.filename, exc_info=True)
+
+    def _insert_projects(self, projects):
+        # type: (Dict[str, Tuple[str, DistInfo]]) -> None
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    self.root,
+                    path,
+                    INDEX_FORMAT,
+                    fingerprint,
+                    result.name,
+                    str(result.version) if result.version is not None else None,
+                    "\n".join(str(req) for req in result.reqs),
+                )
+                for path, (fingerprint, result) in projects.items()
+            ),
+        )
+
+    def close(self):
+        # type: () -> None
+        if self.connection is not None:
+            with self.lock:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,144 @@
+"""Parallel directory tree walking, for discovering projects in large source
+trees"""
+import os
+from multiprocessing.pool import ThreadPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# (subdirectories, files, symlinked subdirectories)
+DirListing = Tuple[List[str], List[str], List[str]]
+
+# Listing directories is dominated by I/O latency, especially on network file
+# systems, so more threads than cores still help
+WALK_THREADS = 8
+
+
+def list_dir(path):
+    # type: (str) -> Optional[DirListing]
+    """List a directory, classifying its entries like os.walk does
+
+    Returns:
+        The subdirectories, files and symlinked subdirectories, or None if the
+        directory can't be listed
+    """
+    scandir = getattr(os, "scandir", None)
+    dirs, files, links = [], [], []  # type: List[str], List[str], List[str]
+    try:
+        if scandir is None:
+            names = os.listdir(path)
+            for name in names:
+                full_path = os.path.join(path, name)
+                if os.path.isdir(full_path):
+                    dirs.append(name)
+                    if os.path.islink(full_path):
+                        links.append(name)
+                else:
+                    files.append(name)
+        else:
+            for entry in scandir(path):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(entry.name)
+                    if entry.is_symlink():
+                        links.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except EnvironmentError:
+        return None
+    return dirs, files, links
+
+
+class _TrieNode(object):
+    __slots__ = ("children", "terminals")
+
+    def __init__(self):
+        self.children = {}  # type: Dict[str, _TrieNode]
+        self.terminals = []  # type: List[str]
+
+
+class PrefixTrie(object):
+    """A set of path prefixes, matched one path component at a time. A path
+    matches if it starts with any of the prefixes as a string, the same as
+    str.startswith, so "/src/lib" matches both "/src/lib/a" and "/src/libs"
+    """
+
+    def __init__(self, prefixes=()):
+        # type: (Iterable[str]) -> None
+        self.root = _TrieNode()
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix):
+        # type: (str) -> None
+        components = prefix.split(os.sep)
+        node = self.root
+        for component in components[:-1]:
+            node = node.children.setdefault(component, _TrieNode())
+        if components[-1] not in node.terminals:
+            node.terminals.append(components[-1])
+
+    def matches(self, path):
+        # type: (str) -> bool
+        """Whether the path starts with any of the prefixes"""
+        node = self.root
+        for component in path.split(os.sep):
+            # A prefix may end partway through a component
+            for terminal in node.terminals:
+                if component.startswith(terminal):
+                    return True
+            next_node = node.children.get(component)
+            if next_node is None:
+                return False
+            node = next_node
+        return False
+
+
+def walk_parallel(
+    top,  # type: str
+    visit,  # type: Callable[[str, List[str], List[str]], Any]
+    list_dir_func=list_dir,  # type: Callable[[str], Optional[DirListing]]
+    threads=WALK_THREADS,  # type: int
+):
+    # type: (...) -> List[Any]
+    """Walk a directory tree top down like os.walk, without following symlinks,
+    listing the directories at each depth in parallel
+
+    Args:
+        top: The directory to start from
+        visit: Called with each directory, its subdirectories and its files,
+            from several threads at once. Subdirectories it removes from the list
+            are not walked
+        list_dir_func: Lists a directory, see list_dir
+        threads: How many directories to list at once
+
+    Returns:
+        The results of visit that aren't None, in no particular order
+    """
+
+    def _walk_one(path):
+        listing = list_dir_func(path)
+        if listing is None:
+            return None, []
+        dirs, files, links = listing
+        dirs = list(dirs)
+        result = visit(path, dirs, list(files))
+        return result, [os.path.join(path, dir_) for dir_ in dirs if dir_ not in links]
+
+    results = []
+    frontier = [top]
+    pool = ThreadPool(threads)
+    try:
+        while frontier:
+            next_frontier = []  # type: List[str]
+            for result, subdirs in pool.imap_unordered(
+                _walk_one, frontier, chunksize=max(1, len(frontier) // (threads * 4))
+            ):
+                if result is not None:
+                    results.append(result)
+                next_frontier.extend(subdirs)
+            frontier = next_frontier
+    finally:
+        pool.close()
+    return results
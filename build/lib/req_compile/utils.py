@@ -0,0 +1,322 @@
+import itertools
+import logging
+import os
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+try:
+    from functools32 import lru_cache  # type: ignore
+except ImportError:
+    from functools import lru_cache
+
+import packaging.markers
+import packaging.version
+import pkg_resources
+from packaging.markers import Marker
+
+
+def _req_iter_from_file(reqfile_name):
+    with open(reqfile_name, "r") as reqfile:
+        for req_line in reqfile:
+            req_line = req_line.strip()
+            if not req_line:
+                continue
+            if req_line.startswith("-r"):
+                for req in _req_iter_from_file(
+                    os.path.join(
+                        os.path.dirname(reqfile_name), req_line.split(" ")[1].strip()
+                    )
+                ):
+                    yield req
+            elif req_line.startswith("--index-url") or req_line.startswith(
+                "--extra-index-url"
+            ):
+                pass
+            elif req_line.startswith("#"):
+                pass
+            else:
+                try:
+                    yield parse_requirement(req_line)
+                except ValueError:
+                    logging.getLogger("req.utils").exception(
+                        "Failed to parse %s", req_line
+                    )
+                    raise
+
+
+def reqs_from_files(requirements_files):
+    """
+    Args:
+        requirements_files (list[str]): Requirements files
+    """
+    raw_reqs = iter([])
+    for reqfile_name in requirements_files:
+        raw_reqs = itertools.chain(raw_reqs, _req_iter_from_file(reqfile_name))
+
+    return list(raw_reqs)
+
+
+def reduce_requirements(raw_reqs):
+    """Reduce a list of requirements to a minimal list by combining requirements with the same key"""
+    constraints = {}  # type: Dict[str, Constraint]
+    for req in raw_reqs:
+        constraint = constraints.get(req.name)
+        if constraint is None:
+            constraints[req.name] = Constraint(req)
+        else:
+            constraint.merge(req)
+
+    return [constraint.to_requirement() for constraint in constraints.values()]
+
+
+# Maximum number of parsed requirements to keep
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_requirement(req_text):
+    # type: (str) -> Optional[pkg_resources.Requirement]
+    """
+    Parse a string into a Requirement object
+
+    Args:
+        req_text (str): The pkg_resources style requirement string,
+            e.g. flask==1.1 ; python_version >= '3.0'
+
+    Returns:
+        (pkg_resources.Requirement) The parsed requirement
+    """
+    req_text = req_text.strip()
+    if not req_text:
+        return None
+    if req_text[0] == "#":
+        return None
+    return pkg_resources.Requirement.parse(req_text)
+
+
+@lru_cache(maxsize=None)
+def parse_version(version):
+    # type: (str) -> packaging.version.Version
+    """
+    Args:
+        version (str): Version to parse
+    """
+    return pkg_resources.parse_version(version)  # type: ignore
+
+
+def parse_requirements(reqs):
+    # type: (Iterable[str]) -> Iterable[pkg_resources.Requirement]
+    """Parse a list of strings into a generate of pkg_resources.Requirements"""
+    for req in reqs:
+        req = req.strip()
+        if "\n" in req:
+            for inner_req in parse_requirements(req.split("\n")):
+                yield inner_req
+        else:
+            result = parse_requirement(req)
+            if result is not None:
+                yield result
+
+
+def merge_extras(extras1, extras2):
+    """Merge two iterables of extra into a single sorted tuple. Case-sensitive"""
+    if not extras1:
+        return extras2
+    if not extras2:
+        return extras1
+    return tuple(sorted(set(extras1) | set(extras2)))
+
+
+def _merge_markers(marker1, marker2):
+    # type: (Optional[Marker], Optional[Marker]) -> Optional[Marker]
+    if not marker1 or not marker2:
+        return None
+    marker1_str = str(marker1)
+    marker2_str = str(marker2)
+    if marker1_str == marker2_str or marker1_str in marker2_str:
+        return marker1
+    if marker2_str in marker1_str:
+        return marker2
+    return None
+
+
+class Constraint(object):
+    """All of the constraints placed on a single project, merged in place. Merging
+    requirements into a Constraint avoids building and parsing a new Requirement
+    for every merge. Convert it with to_requirement once merging is done"""
+
+    __slots__ = ("name", "specs", "extras", "marker", "_requirement")
+
+    def __init__(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        self.name = normalize_project_name(req.project_name)
+        self.specs = frozenset(req.specs or [])  # type: FrozenSet[Tuple[str, str]]
+        self.extras = req.extras  # type: Tuple[str, ...]
+        self.marker = req.marker  # type: Optional[packaging.markers.Marker]
+
+        # The requirement this was built from, until something is merged into it
+        self._requirement = req  # type: Optional[pkg_resources.Requirement]
+
+    def __repr__(self):
+        return "Constraint({})".format(self.to_requirement())
+
+    def merge(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Further constrain the project with a requirement"""
+        if self.name != normalize_project_name(req.project_name):
+            raise ValueError(
+                "Reqs don't match: {} != {}".format(self.to_requirement(), req)
+            )
+        if req.specs:
+            self.specs = self.specs.union(req.specs)
+        self.marker = _merge_markers(self.marker, req.marker)
+        self.extras = merge_extras(self.extras, req.extras)
+        self._requirement = None
+
+    def to_requirement(self):
+        # type: () -> pkg_resources.Requirement
+        """Build a requirement that would satisfy all of the merged requirements"""
+        if self._requirement is None:
+            extras_str = ""
+            if self.extras:
+                extras_str = "[" + ",".join(self.extras) + "]"
+            marker_str = ""
+            if self.marker:
+                marker_str = ";" + str(self.marker)
+            self._requirement = parse_requirement(
+                self.name
+                + extras_str
+                + ",".join("".join(parts) for parts in self.specs)
+                + marker_str
+            )
+        return self._requirement
+
+
+def merge_requirements(req1, req2):
+    # type: (Optional[pkg_resources.Requirement], Optional[pkg_resources.Requirement]) -> pkg_resources.Requirement
+    """Merge two requirements into a single requirement that would satisfy both"""
+    if req1 is not None and req2 is None:
+        return req1
+    if req2 is not None and req1 is None:
+        return req2
+
+    assert req1 is not None
+    assert req2 is not None
+
+    constraint = Constraint(req1)
+    constraint.merge(req2)
+    return constraint.to_requirement()
+
+
+NAME_CACHE = {}  # type: Dict[str, str]
+
+
+def normalize_project_name(project_name):
+    """Normalize a project name"""
+    if project_name in NAME_CACHE:
+        return NAME_CACHE[project_name]
+    value = project_name.lower().replace("-", "_").replace(".", "_").replace(" ", "_")
+    NAME_CACHE[project_name] = value
+    return value
+
+
+MARKER_CACHE = {}  # type: Dict[Tuple[str, Optional[str]], bool]
+
+
+def evaluate_marker(marker, extra):
+    # type: (packaging.markers.Marker, Optional[str]) -> bool
+    """Evaluate a marker in the current environment with the given extra. Results are
+    shared between all identical markers"""
+    key = (str(marker), extra)
+    result = MARKER_CACHE.get(key)
+    if result is None:
+        result = MARKER_CACHE[key] = marker.evaluate({"extra": extra})
+    return result
+
+
+def marker_extras(marker):
+    # type: (Optional[packaging.markers.Marker]) -> Set[str]
+    """Find the names of the extras a marker compares against"""
+    extras = set()  # type: Set[str]
+    if marker is None:
+        return extras
+    to_visit = list(marker._markers)  # pylint: disable=protected-access
+    while to_visit:
+        item = to_visit.pop()
+        if isinstance(item, list):
+            to_visit.extend(item)
+        elif isinstance(item, tuple) and len(item) == 3:
+            lhs, _, rhs = item
+            if lhs.value == "extra":
+                extras.add(rhs.value)
+            elif rhs.value == "extra":
+                extras.add(lhs.value)
+    return extras
+
+
+def filter_req(req, extra):
+    """Apply an extra using a requirements markers and return True if this requirement is kept"""
+    if extra and not req.marker:
+        return False
+    keep_req = True
+    if req.marker:
+        if not extra:
+            extra = None
+        keep_req = evaluate_marker(req.marker, extra)
+    return keep_req
+
+
+def is_pinned_requirement(req):
+    """Returns whether an InstallRequirement is a "pinned" requirement.
+
+    An InstallRequirement is considered pinned if:
+    - Is not editable
+    - It has exactly one specifier
+    - That specifier is "=="
+    - The version does not contain a wildcard
+
+    Examples:
+        django==1.8   # pinned
+        django>1.8    # NOT pinned
+        django~=1.8   # NOT pinned
+        django==1.*   # NOT pinned
+    """
+
+    return any(
+        (spec.operator == "==" or spec.operator == "===")
+        and not spec.version.endswith(".*")
+        for spec in req.specifier
+    )
+
+
+def has_prerelease(req):
+    """Returns whether an InstallRequirement has a prerelease specifier"""
+    return any(parse_version(spec.version).is_prerelease for spec in req.specifier)
+
+
+def have_compatible_glibc(major, minimum_minor):
+    """Pulled from PEP 513"""
+    import ctypes  # pylint: disable=bad-option-value,import-outside-toplevel
+
+    process_namespace = ctypes.CDLL(None)
+    try:
+        gnu_get_libc_version = process_namespace.gnu_get_libc_version
+    except AttributeError:
+        # Symbol doesn't exist -> therefore, we are not linked to
+        # glibc.
+        return False
+
+    # Call gnu_get_libc_version, which returns a string like "2.5".
+    gnu_get_libc_version.restype = ctypes.c_char_p
+    version_str = gnu_get_libc_version()
+    # py2 / py3 compatibility:
+    if not isinstance(version_str, str):
+        version_str = version_str.decode("ascii")
+
+    # Parse string and check against requested version.
+    version = [int(piece) for piece in version_str.split(".")]
+    assert len(version) == 2
+    if major != version[0]:
+        return False
+    if minimum_minor > version[1]:
+        return False
+    return True
@@ -78,6 +78,10 @@ def candidates_main():
         args.no_index,
         wheeldir,
         allow_prerelease=args.allow_prerelease,
+        cache_dir=args.cache_dir,
+        index_max_age=args.index_max_age,
+        lazy_wheels=args.lazy_wheels,
+        lazy_sources=args.lazy_sources,
     )
 
     if isinstance(repo, PyPIRepository) and args.project_name is None:
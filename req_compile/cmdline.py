@@ -8,7 +8,7 @@ import os
 import shutil
 import sys
 import tempfile
-from typing import Iterable
+from typing import Iterable, Optional
 
 import pkg_resources
 
@@ -23,17 +23,23 @@ from req_compile.compile import perform_compile
 from req_compile.config import read_pip_default_index
 from req_compile.containers import DistInfo, RequirementsFile
 from req_compile.errors import NoCandidateException
+from req_compile.metadata.source import SETUP_PY_STATS, configure_setup_py_workers
+from req_compile.repos.artifactcache import get_artifact_cache, parse_size
 from req_compile.repos.findlinks import FindLinksRepository
 from req_compile.repos.multi import MultiRepository
+from req_compile.repos.metadatacache import MetadataCache
+from req_compile.repos.pagecache import PageCache
+from req_compile.repos.prefetch import PrefetchRepository
 from req_compile.repos.pypi import PyPIRepository
 from req_compile.repos.repository import (
+    BaseRepository,
     CantUseReason,
     RepositoryInitializationError,
     sort_candidates,
 )
 from req_compile.repos.solution import SolutionRepository
 from req_compile.repos.source import SourceRepository
-from req_compile.versions import is_possible
+from req_compile.versions import VersionSet
 
 # Blacklist of requirements that will be filtered out of the output
 BLACKLIST = []  # type: Iterable[str]
@@ -56,6 +62,8 @@ def _cantusereason_to_text(reason):  # pylint: disable=too-many-return-statement
         return "name doesn't match"
     if reason == CantUseReason.WRONG_ABI:
         return "extension ABI mismatch"
+    if reason == CantUseReason.IS_YANKED:
+        return "yanked from the index"
     return "unknown"
 
 
@@ -87,10 +95,7 @@ def _generate_no_candidate_display(req, repo, dists, failure):
     no_candidates = False
 
     if isinstance(failure, NoCandidateException):
-        try:
-            can_satisfy = is_possible(constraints)
-        except (ValueError, TypeError):
-            can_satisfy = True
+        can_satisfy = not VersionSet.from_requirement(constraints).is_empty()
 
         all_candidates = {repo: repo.get_candidates(req) for repo in repo}
         no_candidates = (
@@ -397,6 +402,11 @@ def build_repo(
     no_index,
     wheeldir,
     allow_prerelease=False,
+    cache_dir=None,
+    index_max_age=0,
+    lazy_wheels=False,
+    prefetch=0,
+    lazy_sources=False,
 ):
     repos = []
     if solutions:
@@ -406,27 +416,49 @@ def build_repo(
         )
     if sources:
         repos.extend(
-            SourceRepository(source, excluded_paths=excluded_sources)
+            SourceRepository(
+                source,
+                excluded_paths=excluded_sources,
+                index_file=os.path.join(cache_dir, "sources.sqlite3")
+                if cache_dir
+                else None,
+                lazy=lazy_sources,
+            )
             for source in sources
         )
+    metadata_cache = None
+    if cache_dir:
+        metadata_cache = MetadataCache(os.path.join(cache_dir, "metadata.sqlite3"))
     if find_links:
         repos.extend(
-            FindLinksRepository(find_link, allow_prerelease=allow_prerelease)
+            FindLinksRepository(
+                find_link,
+                allow_prerelease=allow_prerelease,
+                metadata_cache=metadata_cache,
+            )
             for find_link in find_links
         )
     if not no_index:
+        page_cache = None
+        if cache_dir:
+            page_cache = PageCache(
+                os.path.join(cache_dir, "index"), max_age=index_max_age
+            )
         if not index_urls:
             default_index_url = read_pip_default_index() or "https://pypi.org/simple"
-            repos.append(
-                PyPIRepository(
-                    default_index_url, wheeldir, allow_prerelease=allow_prerelease
-                )
-            )
-        else:
-            repos.extend(
-                PyPIRepository(index_url, wheeldir, allow_prerelease=allow_prerelease)
-                for index_url in index_urls
+            index_urls = [default_index_url]
+        for index_url in index_urls:
+            index_repo = PyPIRepository(
+                index_url,
+                wheeldir,
+                allow_prerelease=allow_prerelease,
+                page_cache=page_cache,
+                lazy_wheels=lazy_wheels,
+                metadata_cache=metadata_cache,
             )
+            if prefetch:
+                index_repo = PrefetchRepository(index_repo, max_queued=prefetch)
+            repos.append(index_repo)
     if not repos:
         raise ValueError("At least one Python distributions source must be provided.")
     if len(repos) > 1:
@@ -445,6 +477,50 @@ class IndentFilter(logging.Filter):
         return record
 
 
+def _stop_prefetching(repo):
+    # type: (BaseRepository) -> None
+    repos = repo.repositories if isinstance(repo, MultiRepository) else [repo]
+    for single_repo in repos:
+        if isinstance(single_repo, PrefetchRepository):
+            single_repo.stop()
+
+
+def _close_metadata_caches(repo):
+    # type: (BaseRepository) -> None
+    for single_repo in repo:
+        metadata_cache = getattr(single_repo, "metadata_cache", None)
+        if metadata_cache is not None:
+            metadata_cache.close()
+
+
+def _finish_wheeldir(wheeldir, max_size):
+    # type: (str, Optional[int]) -> None
+    logger = logging.getLogger("req_compile")
+    cache = get_artifact_cache(wheeldir)
+    logger.info(
+        "Wheel-dir %s: %d reused, %d downloaded",
+        wheeldir,
+        cache.hits,
+        cache.misses,
+    )
+    if max_size is not None:
+        removed, freed = cache.prune(max_size)
+        logger.info("Pruned %d files (%d bytes) from %s", removed, freed, wheeldir)
+
+
+def _log_setup_py_stats():
+    # type: () -> None
+    total = SETUP_PY_STATS["static"] + SETUP_PY_STATS["exec"]
+    if total:
+        logging.getLogger("req_compile").info(
+            "setup.py files: %d of %d evaluated statically (%.0f%%), %d run",
+            SETUP_PY_STATS["static"],
+            total,
+            100.0 * SETUP_PY_STATS["static"] / total,
+            SETUP_PY_STATS["exec"],
+        )
+
+
 def compile_main(args=None):
     parser = argparse.ArgumentParser(
         description="Req-Compile: Python requirements compiler"
@@ -519,6 +595,31 @@ def compile_main(args=None):
         action="store_true",
         help="Disable version pins, just list distributions",
     )
+    group.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of candidates to fetch concurrently. Does not affect the output",
+    )
+    group.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Speculatively fetch index pages and metadata of up to N newly discovered "
+        "requirements in the background. Does not affect the output",
+    )
+    group.add_argument(
+        "--setup-py-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of isolated processes to run setup.py files in. Defaults to the "
+        "value of --jobs. 0 runs them in the req-compile process, which requires "
+        "--jobs 1 and no --prefetch",
+    )
     add_logging_args(parser)
     add_repo_args(parser)
 
@@ -533,6 +634,14 @@ def compile_main(args=None):
     else:
         logging.basicConfig(level=logging.CRITICAL, stream=sys.stderr)
 
+    setup_py_workers = (
+        args.jobs if args.setup_py_workers is None else args.setup_py_workers
+    )
+    if setup_py_workers == 0 and (args.jobs > 1 or args.prefetch):
+        # Running setup.py in this process patches globals the other threads use
+        parser.error("--setup-py-workers 0 can't be used with --jobs or --prefetch")
+    configure_setup_py_workers(setup_py_workers)
+
     wheeldir = args.wheel_dir
     if wheeldir:
         try:
@@ -578,6 +687,7 @@ def compile_main(args=None):
             )
             constraint_reqs.append(extra_constraint)
 
+    repo = None
     try:
         repo = build_repo(
             args.solutions,
@@ -589,9 +699,18 @@ def compile_main(args=None):
             args.no_index,
             wheeldir,
             allow_prerelease=args.allow_prerelease,
+            cache_dir=args.cache_dir,
+            index_max_age=args.index_max_age,
+            lazy_wheels=args.lazy_wheels,
+            prefetch=args.prefetch,
+            lazy_sources=args.lazy_sources,
         )
         results, roots = perform_compile(
-            input_reqs, repo, extras=args.extras, constraint_reqs=constraint_reqs
+            input_reqs,
+            repo,
+            extras=args.extras,
+            constraint_reqs=constraint_reqs,
+            jobs=args.jobs,
         )
     except RepositoryInitializationError as ex:
         logger.exception("Error initialization repository")
@@ -604,8 +723,15 @@ def compile_main(args=None):
         _generate_no_candidate_display(ex.req, repo, ex.results, ex)
         sys.exit(1)
     finally:
+        if repo is not None:
+            _stop_prefetching(repo)
+            _close_metadata_caches(repo)
+        configure_setup_py_workers(0)
+        _log_setup_py_stats()
         if delete_wheeldir:
             shutil.rmtree(wheeldir)
+        else:
+            _finish_wheeldir(wheeldir, args.wheel_dir_max_size)
 
     write_requirements_file(
         results,
@@ -659,6 +785,13 @@ def add_repo_args(parser):
         default=[],
         help="Directories to exclude when searching for projects. Applies recursively",
     )
+    group.add_argument(
+        "--lazy-sources",
+        action="store_true",
+        default=False,
+        help="Only extract the metadata of projects found with --source when they "
+        "are required, for projects that declare their name statically",
+    )
     group.add_argument(
         "-f",
         "--find-links",
@@ -684,12 +817,43 @@ def add_repo_args(parser):
         metavar="wheel_dir",
         help="Directory to which to download wheel and source distributions from remote index",
     )
+    group.add_argument(
+        "--wheel-dir-max-size",
+        type=parse_size,
+        default=None,
+        metavar="size",
+        help="Remove the least recently used files from --wheel-dir after compiling "
+        "until it is no larger than this size, e.g. 500M or 10G",
+    )
     group.add_argument(
         "--no-index",
         action="store_true",
         default=False,
         help="Do not connect to the internet to compile",
     )
+    group.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        metavar="cache_dir",
+        help="Directory to persist caches (such as remote index pages, extracted "
+        "metadata and source tree scans) between runs",
+    )
+    group.add_argument(
+        "--index-max-age",
+        type=float,
+        default=0,
+        metavar="seconds",
+        help="Number of seconds a cached index page is used without revalidating it "
+        "with the remote index. Requires --cache-dir",
+    )
+    group.add_argument(
+        "--lazy-wheels",
+        action="store_true",
+        default=False,
+        help="Read metadata of remote wheels using HTTP range requests instead of "
+        "downloading them, if the index supports it",
+    )
 
 
 if __name__ == "__main__":
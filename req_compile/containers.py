@@ -1,12 +1,15 @@
-import os
 import shutil
-from typing import Any, Iterable, Optional, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
+import packaging.utils
 import packaging.version
 import pkg_resources
 
 from req_compile import utils
-from req_compile.utils import filter_req, reduce_requirements
+from req_compile.utils import filter_req, marker_extras, reduce_requirements
+
+# Cache key for the requirements selected by any extra that is not declared
+_UNDECLARED = object()
 
 
 class RequirementContainer(object):
@@ -20,12 +23,55 @@ class RequirementContainer(object):
         self.meta = meta
         self.version = None  # type: Optional[packaging.version.Version]
 
+        # The lists are shared between callers and must not be modified
+        self._requires = {}  # type: Dict[Any, List[pkg_resources.Requirement]]
+        self._declared_extras = None  # type: Optional[FrozenSet[str]]
+        self._canonical_extras = None  # type: Optional[FrozenSet[str]]
+
     def __iter__(self):
         return iter(self.reqs)
 
+    def add_requirement(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Add a requirement. Requirements must not be modified any other way once
+        they have been queried"""
+        self.reqs.append(req)
+        self._requires = {}
+        self._declared_extras = None
+        self._canonical_extras = None
+
+    @property
+    def declared_extras(self):
+        # type: () -> FrozenSet[str]
+        """The extras referenced by the markers of the requirements"""
+        if self._declared_extras is None:
+            extras = set()  # type: Set[str]
+            for req in self.reqs:
+                extras |= marker_extras(req.marker)
+            self._declared_extras = frozenset(extras)
+        return self._declared_extras
+
     def requires(self, extra=None):
         # type: (str) -> Iterable[pkg_resources.Requirement]
-        return reduce_requirements(req for req in self.reqs if filter_req(req, extra))
+        if self._canonical_extras is None:
+            self._canonical_extras = frozenset(
+                packaging.utils.canonicalize_name(declared)
+                for declared in self.declared_extras
+            )
+        # Every extra that is not declared selects the same requirements. Markers
+        # may compare extras by their normalized names (PEP 685), so "Socks_Proxy"
+        # is the declared extra "socks-proxy"
+        key = extra
+        if extra and packaging.utils.canonicalize_name(extra) not in (
+            self._canonical_extras
+        ):
+            key = _UNDECLARED
+        result = self._requires.get(key)
+        if result is None:
+            result = self._requires[key] = reduce_requirements(
+                req for req in self.reqs if filter_req(req, extra)
+            )
+        return result
 
     def to_definition(self, extras):
         # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
@@ -104,23 +150,36 @@ class DistInfo(RequirementContainer):
 
 
 class PkgResourcesDistInfo(RequirementContainer):
-    def __init__(self, dist):
-        # type: (pkg_resources.Distribution) -> None
+    def __init__(self, dist, temp_dir=None):
+        # type: (pkg_resources.Distribution, Optional[str]) -> None
         """
         Args:
             dist: The distribution to wrap
+            temp_dir: Temporary directory holding the distribution, removed along
+                with this object
         """
         super(PkgResourcesDistInfo, self).__init__(dist.project_name, [])
         self.dist = dist
         self.version = dist.parsed_version  # type: ignore
+        self.temp_dir = temp_dir
 
     def __str__(self):
         # type: () -> str
         return "{}=={}".format(*self.to_definition(None))
 
+    @property
+    def declared_extras(self):
+        # type: () -> FrozenSet[str]
+        return frozenset(self.dist.extras)
+
     def requires(self, extra=None):
         # type: (str) -> Iterable[pkg_resources.Requirement]
-        return self.dist.requires(extras=(extra,) if extra else ())
+        result = self._requires.get(extra)
+        if result is None:
+            result = self._requires[extra] = self.dist.requires(
+                extras=(extra,) if extra else ()
+            )
+        return result
 
     def to_definition(self, extras):
         # type: (Optional[Iterable[str]]) -> Tuple[str, Optional[packaging.version.Version]]
@@ -132,7 +191,9 @@ class PkgResourcesDistInfo(RequirementContainer):
 
     def __del__(self):
         # type: () -> None
+        if self.temp_dir is None:
+            return
         try:
-            shutil.rmtree(os.path.join(self.dist.location, ".."))
+            shutil.rmtree(self.temp_dir)
         except EnvironmentError:
             pass
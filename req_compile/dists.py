@@ -1,20 +1,26 @@
 from __future__ import print_function
 
-import collections
 import itertools
 import logging
-from typing import Any, Dict, Iterable, List, Optional, Set, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import pkg_resources
 import six
 
 from req_compile.containers import RequirementContainer
 from req_compile.repos import Repository
-from req_compile.utils import (
-    merge_requirements,
-    normalize_project_name,
-    parse_requirement,
-)
+from req_compile.utils import Constraint, normalize_project_name, parse_requirement
 
 
 class DependencyNode(object):
@@ -37,6 +43,11 @@ class DependencyNode(object):
             False  # Whether this node and all of its dependency are completely solved
         )
 
+        # Values derived from the incoming edges of this node, cleared by invalidate()
+        self._extras = None  # type: Optional[FrozenSet[str]]
+        self._constraints = None  # type: Optional[pkg_resources.Requirement]
+        self._constraint_sources = None  # type: Optional[List[str]]
+
     def __repr__(self):
         # type: () -> str
         return self.key
@@ -55,25 +66,39 @@ class DependencyNode(object):
 
     @property
     def extras(self):
-        # type: () -> Set[str]
-        extras = set()
-        for rdep in self.reverse_deps:
-            assert (
-                rdep.metadata is not None
-            ), "Reverse dependency should already have a solution"
-            reason = rdep.dependencies[self]
-            if reason is not None:
-                extras |= set(reason.extras)
-        return extras
+        # type: () -> FrozenSet[str]
+        if self._extras is None:
+            extras = set()
+            for rdep in self.reverse_deps:
+                assert (
+                    rdep.metadata is not None
+                ), "Reverse dependency should already have a solution"
+                reason = rdep.dependencies[self]
+                if reason is not None:
+                    extras |= set(reason.extras)
+            self._extras = frozenset(extras)
+        return self._extras
 
     def add_reason(self, node, reason):
         # type: (DependencyNode, Optional[pkg_resources.Requirement]) -> None
         self.dependencies[node] = reason
+        node.invalidate()
 
-    def build_constraints(self):
-        # type: () -> pkg_resources.Requirement
-        result = None
-
+    def invalidate(self):
+        # type: () -> None
+        """Clear the values derived from the incoming edges of this node. Must be
+        called whenever an incoming edge changes, or the metadata of this node changes.
+        The metadata and extras of this node constrain its dependencies, so their
+        constraints are cleared as well"""
+        self._extras = None
+        self._constraints = None
+        self._constraint_sources = None
+        for dep in self.dependencies:
+            dep._constraints = None  # pylint: disable=protected-access
+            dep._constraint_sources = None  # pylint: disable=protected-access
+
+    def _incoming_reqs(self):
+        # type: () -> Iterable[Tuple[DependencyNode, pkg_resources.Requirement]]
         for rdep_node in self.reverse_deps:
             assert (
                 rdep_node.metadata is not None
@@ -83,37 +108,41 @@ class DependencyNode(object):
                 all_reqs |= set(rdep_node.metadata.requires(extra=extra))
             for req in all_reqs:
                 if normalize_project_name(req.project_name) == self.key:
-                    result = merge_requirements(result, req)
+                    yield rdep_node, req
 
-        if result is None:
-            if self.metadata is None:
-                result = parse_requirement(self.key)
+    def build_constraints(self):
+        # type: () -> pkg_resources.Requirement
+        if self._constraints is not None:
+            return self._constraints
+
+        result = None
+        constraint = None
+        for _, req in self._incoming_reqs():
+            if constraint is None:
+                constraint = Constraint(req)
             else:
-                result = parse_requirement(self.metadata.name)
+                constraint.merge(req)
+        if constraint is not None:
+            result = constraint.to_requirement()
+        else:
+            name = self.key if self.metadata is None else self.metadata.name
+            if self.extras:
+                name += "[" + ",".join(sorted(self.extras)) + "]"
+            result = parse_requirement(name)
             assert result is not None
 
-            if self.extras:
-                result.extras = self.extras
-                # Reparse to create a correct hash
-                result = parse_requirement(str(result))
-                assert result is not None
+        self._constraints = result
         return result
 
-
-def _build_constraints(root_node):
-    # type: (DependencyNode) -> Iterable[str]
-    constraints = []  # type: List[str]
-    for node in root_node.reverse_deps:
-        assert (
-            node.metadata is not None
-        ), "Reverse dependency should already have a solution"
-        all_reqs = set(node.metadata.requires())
-        for extra in node.extras:
-            all_reqs |= set(node.metadata.requires(extra=extra))
-        for req in all_reqs:
-            if normalize_project_name(req.project_name) == root_node.key:
+    def build_constraint_sources(self):
+        # type: () -> List[str]
+        """Describe the nodes that constrain this one, for annotating the results"""
+        if self._constraint_sources is None:
+            constraints = []  # type: List[str]
+            for node, req in self._incoming_reqs():
                 _process_constraint_req(req, node, constraints)
-    return constraints
+            self._constraint_sources = constraints
+        return self._constraint_sources
 
 
 def _process_constraint_req(req, node, constraints):
@@ -133,17 +162,88 @@ def _process_constraint_req(req, node, constraints):
     constraints.extend([source + specifics])
 
 
+class _Component(object):
+    """A strongly connected component of the dependency graph, and its position in
+    a topological order of all of the components"""
+
+    __slots__ = ("members", "order")
+
+    def __init__(self, members, order):
+        # type: (Set[DependencyNode], int) -> None
+        self.members = members
+        self.order = order
+
+
+def _strongly_connected(nodes):
+    # type: (Iterable[DependencyNode]) -> List[Set[DependencyNode]]
+    """Find the strongly connected components of the graph reachable from nodes using
+    Tarjan's algorithm. Components are returned in reverse topological order"""
+    index = {}  # type: Dict[DependencyNode, int]
+    lowlink = {}  # type: Dict[DependencyNode, int]
+    stack = []  # type: List[DependencyNode]
+    on_stack = set()  # type: Set[DependencyNode]
+    components = []  # type: List[Set[DependencyNode]]
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(root.dependencies))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(child.dependencies)))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = set()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                        if member is node:
+                            break
+                    components.append(component)
+    return components
+
+
 class DistributionCollection(object):
     """A collection of dependencies and their distributions. This is the main representation
     of the graph of dependencies when putting together a resolution. As distributions are
     added to the collection and provide a concrete RequirementContainer (like a DistInfo from
     a wheel), the corresponding node in this collection will be marked solved."""
 
-    def __init__(self):
-        # type: () -> None
+    def __init__(self, on_placeholder=None):
+        # type: (Optional[Callable[[pkg_resources.Requirement], None]]) -> None
+        """
+        Args:
+            on_placeholder: Called with the requirement that caused a new, unsolved
+                node to be added to the graph
+        """
         self.nodes = {}  # type: Dict[str, DependencyNode]
+        self.on_placeholder = on_placeholder
         self.logger = logging.getLogger("req_compile.dists")
 
+        # Strongly connected components of the graph, kept in topological order as
+        # edges are added so reachability queries only search a small part of the
+        # graph. Removing an edge inside of a cycle may split it, so the components
+        # are then rebuilt on the next query
+        self._components = {}  # type: Dict[DependencyNode, _Component]
+        self._next_order = 0
+        self._components_stale = False
+
     @staticmethod
     def _build_key(name):
         return normalize_project_name(name)
@@ -181,6 +281,13 @@ class DistributionCollection(object):
         else:
             node = DependencyNode(key, metadata_to_apply)
             self.nodes[key] = node
+            self._track(node)
+            if (
+                metadata_to_apply is None
+                and reason is not None
+                and self.on_placeholder is not None
+            ):
+                self.on_placeholder(reason)
 
         # If a new extra is being supplied, update the metadata
         if (
@@ -192,8 +299,7 @@ class DistributionCollection(object):
             metadata_to_apply = node.metadata
 
         if source is not None and source.key in self.nodes:
-            node.reverse_deps.add(source)
-            source.add_reason(node, reason)
+            self._add_edge(source, node, reason)
 
         nodes = set()
         if metadata_to_apply is not None:
@@ -219,6 +325,7 @@ class DistributionCollection(object):
 
     def _update_dists(self, node, metadata):
         node.metadata = metadata
+        node.invalidate()
         add_nodes = {node}
         for extra in {None} | node.extras:
             for req in metadata.requires(extra):
@@ -226,34 +333,184 @@ class DistributionCollection(object):
                 add_nodes |= self.add_dist(req.name, node, req)
         return add_nodes
 
+    def contains_node(self, node):
+        # type: (DependencyNode) -> bool
+        """Whether the node is still part of this collection"""
+        return self.nodes.get(node.key) is node
+
+    def reaches(self, source, target):
+        # type: (DependencyNode, DependencyNode) -> bool
+        """Whether target is a (possibly indirect) dependency of source. A node only
+        reaches itself if it is part of a cycle"""
+        if self._components_stale:
+            self._rebuild_components()
+
+        source_comp = self._components.get(source)
+        target_comp = self._components.get(target)
+        if source_comp is None or target_comp is None:
+            return any(node is target for node in self.visit_nodes([source]))
+
+        if source_comp is target_comp:
+            return source is not target or len(source_comp.members) > 1 or (
+                source in source.dependencies
+            )
+
+        if source_comp.order > target_comp.order:
+            return False
+
+        return target_comp in self._collect_components(
+            source_comp, lambda comp: comp.order <= target_comp.order
+        )
+
+    def _track(self, node):
+        # type: (DependencyNode) -> None
+        # A new node has no edges, so it may go anywhere in the order
+        self._components[node] = _Component({node}, self._next_order)
+        self._next_order += 1
+
+    def _untrack(self, node):
+        # type: (DependencyNode) -> None
+        component = self._components.pop(node, None)
+        if component is not None and len(component.members) > 1:
+            self._components_stale = True
+
+    def _remove_edge(self, source, target):
+        # type: (DependencyNode, DependencyNode) -> None
+        component = self._components.get(source)
+        if (
+            component is not None
+            and component is self._components.get(target)
+            and len(component.members) > 1
+        ):
+            self._components_stale = True
+
+    def _add_edge(self, source, target, reason):
+        # type: (DependencyNode, DependencyNode, Optional[pkg_resources.Requirement]) -> None
+        is_new = target not in source.dependencies
+        target.reverse_deps.add(source)
+        source.add_reason(target, reason)
+        if is_new and not self._components_stale:
+            self._order_edge(source, target)
+
+    def _order_edge(self, source, target):
+        # type: (DependencyNode, DependencyNode) -> None
+        """Restore the topological order of the components after adding an edge,
+        merging components if the edge closed a cycle (Pearce-Kelly)"""
+        source_comp = self._components.get(source)
+        target_comp = self._components.get(target)
+        if source_comp is None or target_comp is None:
+            self._components_stale = True
+            return
+        if source_comp is target_comp or source_comp.order < target_comp.order:
+            return
+
+        upper = source_comp.order
+        lower = target_comp.order
+        forward = self._collect_components(
+            target_comp, lambda comp: comp.order <= upper
+        )
+        backward = self._collect_components(
+            source_comp, lambda comp: comp.order >= lower, reverse=True
+        )
+        forward.add(target_comp)
+        backward.add(source_comp)
+        if self._components_stale:
+            return
+
+        # Components on a path from target to source are now a single cycle. The
+        # components that reach the source take the lowest of the freed positions and
+        # the ones reachable from the target the highest, so neither moves past a
+        # component outside of the affected region
+        cycle = forward & backward
+        order_key = lambda comp: comp.order
+        slots = sorted(comp.order for comp in forward | backward)
+        before = sorted(backward - cycle, key=order_key)
+        after = sorted(forward - cycle, key=order_key)
+        for comp, slot in zip(before, slots):
+            comp.order = slot
+        for comp, slot in zip(reversed(after), reversed(slots)):
+            comp.order = slot
+
+        if cycle:
+            merged = _Component(set(), slots[len(before)])
+            for comp in cycle:
+                merged.members |= comp.members
+            for member in merged.members:
+                self._components[member] = merged
+
+    def _collect_components(self, start, within, reverse=False):
+        # type: (_Component, Callable[[_Component], bool], bool) -> Set[_Component]
+        """Find the components reachable from start, only passing through components
+        within the given bound. Start itself is only included if it is reachable"""
+        found = set()  # type: Set[_Component]
+        stack = [start]
+        while stack:
+            comp = stack.pop()
+            for member in comp.members:
+                for node in member.reverse_deps if reverse else member.dependencies:
+                    next_comp = self._components.get(node)
+                    if next_comp is None:
+                        self._components_stale = True
+                        continue
+                    if next_comp not in found and within(next_comp):
+                        found.add(next_comp)
+                        stack.append(next_comp)
+        return found
+
+    def _rebuild_components(self):
+        # type: () -> None
+        self._components = {}
+        components = _strongly_connected(list(self.nodes.values()))
+        for order, members in enumerate(reversed(components)):
+            component = _Component(members, order)
+            for member in members:
+                self._components[member] = component
+        self._next_order = len(components)
+        self._components_stale = False
+
     def remove_dists(self, node, remove_upstream=True):
         # type: (Union[DependencyNode, Iterable[DependencyNode]], bool) -> None
-        if isinstance(node, collections.Iterable):
+        if not isinstance(node, DependencyNode):
             for single_node in node:
                 self.remove_dists(single_node, remove_upstream=remove_upstream)
             return
 
-        self.logger.info("Removing dist(s): %s (upstream = %s)", node, remove_upstream)
-
-        if node.key not in self.nodes:
-            self.logger.debug("Node %s was already removed", node.key)
-            return
-
-        if remove_upstream:
-            del self.nodes[node.key]
-            for reverse_dep in node.reverse_deps:
-                del reverse_dep.dependencies[node]
-
-        for dep in node.dependencies:
-            if remove_upstream or dep.key != node.key:
-                dep.reverse_deps.remove(node)
-                if not dep.reverse_deps:
-                    self.remove_dists(dep)
+        # Dependencies left without a reverse dependency are removed as well. They
+        # are queued rather than removed recursively, since a chain of them can be
+        # deeper than the recursion limit
+        worklist = [(node, remove_upstream)]
+        while worklist:
+            node, remove_upstream = worklist.pop()
+            self.logger.info(
+                "Removing dist(s): %s (upstream = %s)", node, remove_upstream
+            )
+
+            if node.key not in self.nodes:
+                self.logger.debug("Node %s was already removed", node.key)
+                continue
 
-        if not remove_upstream:
-            node.dependencies = {}
-            node.metadata = None
-            node.complete = False
+            if remove_upstream:
+                del self.nodes[node.key]
+                self._untrack(node)
+                for reverse_dep in node.reverse_deps:
+                    self._remove_edge(reverse_dep, node)
+                    del reverse_dep.dependencies[node]
+
+            for dep in node.dependencies:
+                if remove_upstream or dep.key != node.key:
+                    self._remove_edge(node, dep)
+                    dep.reverse_deps.remove(node)
+                    dep.invalidate()
+                    if not dep.reverse_deps:
+                        worklist.append((dep, True))
+
+            if not remove_upstream:
+                if node in node.dependencies:
+                    self._remove_edge(node, node)
+                node.dependencies = {}
+                node.metadata = None
+                node.complete = False
+                node.invalidate()
 
     def build(self, roots):
         results = self.generate_lines(roots)
@@ -262,33 +519,30 @@ class DistributionCollection(object):
             for result in results
         ]
 
-    def visit_nodes(
-        self, roots, max_depth=None, reverse=False, _visited=None, _cur_depth=0
-    ):
-        if _visited is None:
-            _visited = set()
+    def visit_nodes(self, roots, max_depth=None, reverse=False):
+        # type: (Iterable[DependencyNode], Optional[int], bool) -> Iterable[DependencyNode]
+        """Visit the nodes reachable from roots depth first, yielding each node once"""
+        visited = set()  # type: Set[DependencyNode]
 
-        if reverse:
-            next_nodes = itertools.chain(*[root.reverse_deps for root in roots])
-        else:
-            next_nodes = itertools.chain(*[root.dependencies.keys() for root in roots])
-        for node in next_nodes:
-            if node in _visited:
-                continue
+        def _next_nodes(nodes):
+            if reverse:
+                return itertools.chain(*[node.reverse_deps for node in nodes])
+            return itertools.chain(*[node.dependencies.keys() for node in nodes])
 
-            _visited.add(node)
-            yield node
+        stack = [_next_nodes(roots)]
+        while stack:
+            for node in stack[-1]:
+                if node in visited:
+                    continue
 
-            if max_depth is None or _cur_depth < max_depth - 1:
-                results = self.visit_nodes(
-                    [node],
-                    reverse=reverse,
-                    max_depth=max_depth,
-                    _visited=_visited,
-                    _cur_depth=_cur_depth + 1,
-                )
-                for result in results:
-                    yield result
+                visited.add(node)
+                yield node
+
+                if max_depth is None or len(stack) < max_depth:
+                    stack.append(_next_nodes([node]))
+                break
+            else:
+                stack.pop()
 
     def generate_lines(self, roots, req_filter=None, _visited=None):
         """
@@ -308,7 +562,7 @@ class DistributionCollection(object):
             if node.metadata is None:
                 continue
             if not node.metadata.meta and req_filter(node):
-                constraints = _build_constraints(node)
+                constraints = node.build_constraint_sources()
                 req_expr = node.metadata.to_definition(node.extras)
                 constraint_text = ", ".join(sorted(constraints))
                 results.append((req_expr, constraint_text))
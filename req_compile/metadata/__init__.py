@@ -1 +1 @@
-from .metadata import extract_metadata
+from .metadata import extract_metadata, guess_project_name
@@ -47,18 +47,32 @@ def _fetch_from_wheel(wheel):
     Returns:
         (DistInfo, None) The metadata for this zip, or None if it could not be found or parsed
     """
-    project_name = os.path.basename(wheel).split("-")[0]
-
     zfile = zipfile.ZipFile(wheel, "r")
     with closing(zfile):
-        # Reverse since metadata details are supposed to be written at the end of the zip
-        infos = list(reversed(zfile.namelist()))
-        result = _find_dist_info_metadata(project_name, infos)
-        if result is not None:
-            return _parse_flat_metadata(zfile.read(result).decode("utf-8", "ignore"))
-
-        LOG.warning("Could not find .dist-info/METADATA in the zip archive")
-        return None
+        return _fetch_from_wheel_zip(os.path.basename(wheel), zfile)
+
+
+def _fetch_from_wheel_zip(wheel_filename, zfile):
+    # type: (str, zipfile.ZipFile) -> Optional[DistInfo]
+    """
+    Fetch metadata from an opened wheel archive
+    Args:
+        wheel_filename (str): Basename of the wheel, used to find the project's dist-info
+        zfile (zipfile.ZipFile): The opened wheel
+
+    Returns:
+        (DistInfo, None) The metadata for this zip, or None if it could not be found or parsed
+    """
+    project_name = wheel_filename.split("-")[0]
+
+    # Reverse since metadata details are supposed to be written at the end of the zip
+    infos = list(reversed(zfile.namelist()))
+    result = _find_dist_info_metadata(project_name, infos)
+    if result is not None:
+        return _parse_flat_metadata(zfile.read(result).decode("utf-8", "ignore"))
+
+    LOG.warning("Could not find .dist-info/METADATA in the zip archive")
+    return None
 
 
 def _parse_flat_metadata(contents):
@@ -1,5 +1,6 @@
 """Extractors for Python distribution archive types"""
 import io
+import locale
 import logging
 import os
 import shutil
@@ -44,6 +45,9 @@ class Extractor(object):
         ):
             return self.io_open(filename, mode=mode, encoding=encoding)
 
+        if encoding == "locale":
+            # Python 3.10+ io.text_encoding() default for files opened without one
+            encoding = locale.getpreferredencoding(False)
         kwargs = {}
         if "b" not in mode:
             kwargs = {"encoding": encoding or "ascii"}
@@ -169,12 +173,7 @@ class TarExtractor(Extractor):
             return False
 
     def extract(self, target_dir):
-        old_dir = os.getcwd()
-        os.chdir(target_dir)
-        try:
-            self.tar.extractall()
-        finally:
-            os.chdir(old_dir)
+        self.tar.extractall(target_dir)
 
     def _open_handle(self, filename):
         try:
@@ -205,12 +204,7 @@ class ZipExtractor(Extractor):
             return any(name.startswith(filename + "/") for name in self.names())
 
     def extract(self, target_dir):
-        old_dir = os.getcwd()
-        os.chdir(target_dir)
-        try:
-            self.zfile.extractall()
-        finally:
-            os.chdir(old_dir)
+        self.zfile.extractall(target_dir)
 
     def _open_handle(self, filename):
         try:
@@ -11,6 +11,8 @@ from typing import Any, Mapping, Optional
 import toml
 from six.moves import StringIO
 
+from req_compile import utils
+
 from ..containers import DistInfo
 from .dist_info import _fetch_from_wheel, _parse_flat_metadata
 from .patch import patch
@@ -18,6 +20,45 @@ from .patch import patch
 LOG = logging.getLogger("req_compile.metadata.source")
 LOCK = threading.Lock()
 
+# PEP 621 fields that must be static to read the metadata without the backend
+STATIC_FIELDS = frozenset(("version", "dependencies", "optional-dependencies"))
+
+
+def _parse_requirement_with_extra(req_str, extra):
+    req_text, marker = req_str.partition(";")[::2]
+    extra_marker = 'extra == "{}"'.format(extra)
+    if marker.strip():
+        extra_marker = "({}) and {}".format(marker.strip(), extra_marker)
+    return utils.parse_requirement("{}; {}".format(req_text.strip(), extra_marker))
+
+
+def _parse_from_project_table(pyproject):
+    # type: (Mapping) -> Optional[DistInfo]
+    """Read the metadata from the PEP 621 [project] table, when none of it is left
+    for the backend to fill in"""
+    project = pyproject.get("project")
+    if not isinstance(project, dict):
+        return None
+    if STATIC_FIELDS & set(project.get("dynamic", [])):
+        LOG.debug("The [project] table has dynamic fields")
+        return None
+    if "name" not in project or "version" not in project:
+        return None
+
+    try:
+        reqs = list(utils.parse_requirements(project.get("dependencies", [])))
+        for extra, extra_reqs in project.get("optional-dependencies", {}).items():
+            reqs.extend(
+                _parse_requirement_with_extra(req_str, extra)
+                for req_str in extra_reqs
+                if req_str.strip()
+            )
+        version = utils.parse_version(project["version"])
+    except ValueError as ex:
+        LOG.debug("Invalid [project] table: %s", ex)
+        return None
+    return DistInfo(project["name"], version, reqs)
+
 
 def _create_build_backend(build_system):
     # type: (Mapping) -> Any
@@ -76,7 +117,8 @@ def _parse_from_wheel(backend):
 
 def fetch_from_pyproject(source_file):
     # type: (str) -> Optional[DistInfo]
-    """Fetch metadata from pyproject.toml either by relying on the backend to provide metadata, or by building
+    """Fetch metadata from the static [project] table of pyproject.toml if possible.
+    Otherwise either by relying on the backend to provide metadata, or by building
     a wheel and extracting the metadata"""
     try:
         pyproject = toml.load(os.path.join(source_file, "pyproject.toml"))
@@ -84,6 +126,10 @@ def fetch_from_pyproject(source_file):
         LOG.debug("Failed to load pyproject.toml: %s", ex)
         return None
 
+    result = _parse_from_project_table(pyproject)
+    if result is not None:
+        return result
+
     try:
         build_system = pyproject["build-system"]
         backend_name = build_system["build-backend"]
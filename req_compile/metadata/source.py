@@ -17,6 +17,7 @@ import threading
 import time
 from contextlib import closing
 from types import ModuleType
+from typing import Any, Dict, List, Optional
 
 import pkg_resources
 import setuptools  # type: ignore
@@ -30,21 +31,81 @@ from req_compile.filename import parse_source_filename
 
 from ..containers import DistInfo, PkgResourcesDistInfo
 from .dist_info import _fetch_from_wheel
-from .extractor import NonExtractor
+from .extractor import Extractor, NonExtractor
 from .patch import begin_patch, end_patch, patch
+from .pkg_info import _fetch_from_pkg_info
+from .setup_ast import evaluate_setup_kwargs
+from .workers import WorkerPool
 
 LOG = logging.getLogger("req_compile.metadata.source")
 
 WHEEL_TIMEOUT = float(os.getenv("REQ_COMPILE_WHEEL_TIMEOUT", "30.0"))
 EGG_INFO_TIMEOUT = float(os.getenv("REQ_COMPILE_EGG_INFO_TIMEOUT", "15.0"))
+SETUP_PY_TIMEOUT = float(os.getenv("REQ_COMPILE_SETUP_PY_TIMEOUT", "30.0"))
 
 FAILED_BUILDS = set()
 
 THREADLOCAL = threading.local()
 
+# setup.py files run in this process are executed under process-wide patches
+# (open, os.getcwd, sys.stdout, ...) so only one may be parsed at a time. Nothing
+# else may run meanwhile either, so whatever fetches metadata from several
+# threads runs them in worker processes instead, see use_setup_py_workers
+SETUP_PY_LOCK = threading.RLock()
+
+# How many setup.py files were understood without running them, and how many
+# had to be run
+SETUP_PY_STATS = {"static": 0, "exec": 0}
+
+# When set, setup.py files are run in these worker processes instead
+_SETUP_PY_POOL = None  # type: Optional[WorkerPool]
+_SETUP_PY_POOL_LOCK = threading.Lock()
+
+
+def configure_setup_py_workers(workers, timeout=SETUP_PY_TIMEOUT):
+    # type: (int, float) -> None
+    """Run setup.py files in a pool of isolated worker processes, so that several
+    can be parsed at once and a misbehaving one can't affect the compile
+
+    Args:
+        workers: Number of worker processes. 0 runs setup.py files in this
+            process, one at a time
+        timeout: Seconds a setup.py may run before its worker is killed
+    """
+    global _SETUP_PY_POOL  # pylint: disable=global-statement
+    with _SETUP_PY_POOL_LOCK:
+        if _SETUP_PY_POOL is not None:
+            _SETUP_PY_POOL.close()
+        _SETUP_PY_POOL = WorkerPool(workers, timeout) if workers > 0 else None
+
+
+def use_setup_py_workers(workers, timeout=SETUP_PY_TIMEOUT):
+    # type: (int, float) -> bool
+    """Make sure setup.py files are run in worker processes, before starting
+    threads that may fetch metadata. Running one in this process patches globals
+    those threads use
+
+    Returns:
+        True if a pool was started, which the caller should stop with
+        configure_setup_py_workers(0) once its threads are done
+    """
+    global _SETUP_PY_POOL  # pylint: disable=global-statement
+    with _SETUP_PY_POOL_LOCK:
+        if _SETUP_PY_POOL is not None:
+            return False
+        _SETUP_PY_POOL = WorkerPool(max(1, workers), timeout)
+        return True
+
+
+def _fake_path(extractor, filename):
+    # type: (Extractor, str) -> str
+    """The absolute path of a file in the archive, which the extractor resolves
+    without looking at the working directory"""
+    return os.path.join(extractor.fake_root, filename).replace("/", os.sep)
+
 
 def find_in_archive(extractor, filename, max_depth=None):
-    if extractor.exists(filename):
+    if extractor.exists(_fake_path(extractor, filename)):
         return filename
 
     for info_name in extractor.names():
@@ -77,9 +138,18 @@ def _fetch_from_source(source_file, extractor_type, run_setup_py=True):
 
     extractor = extractor_type(source_file)
     with closing(extractor):
+        # Source directories are skipped, their .egg-info is often left over from
+        # an older version of the project
+        if not isinstance(extractor, NonExtractor):
+            results = _fetch_from_static_metadata(extractor, name, version)
+            if results is not None:
+                return results
+
         if run_setup_py:
             LOG.info("Attempting to fetch metadata from setup.py")
-            results = _fetch_from_setup_py(source_file, name, version, extractor)
+            results = _fetch_from_setup_py(
+                source_file, name, version, extractor, extractor_type
+            )
             if results is not None:
                 return results
         else:
@@ -92,8 +162,32 @@ def _fetch_from_source(source_file, extractor_type, run_setup_py=True):
         raise MetadataError(name, version, Exception("Invalid project distribution"))
 
 
+def _fetch_from_static_metadata(extractor, name, version):
+    """Read the metadata a source archive ships with, if it can be trusted to match
+    what running its setup.py would produce"""
+    try:
+        results = _fetch_from_pkg_info(extractor)
+    except (EnvironmentError, ValueError):
+        LOG.debug("Unable to read static metadata for %s", name, exc_info=True)
+        return None
+    if results is None:
+        return None
+    if (
+        utils.normalize_project_name(results.name) != utils.normalize_project_name(name)
+        or (version and results.version != version)
+    ):
+        LOG.debug(
+            "Static metadata of %s %s does not match the filename",
+            results.name,
+            results.version,
+        )
+        return None
+    LOG.info("Using static metadata for %s %s", results.name, results.version)
+    return results
+
+
 def _fetch_from_setup_py(
-    source_file, name, version, extractor
+    source_file, name, version, extractor, extractor_type
 ):  # pylint: disable=too-many-branches
     """Attempt a set of executions to obtain metadata from the setup.py without having to build
     a wheel.  First attempt without mocking __import__ at all. This means that projects
@@ -107,12 +201,134 @@ def _fetch_from_setup_py(
         source_file (str): The source archive or directory
         name (str): The project name. Use if it cannot be determined from the archive
         extractor (Extractor): The extractor to use to obtain files from the archive
+        extractor_type (type[Extractor]): Type of the extractor, used to open the
+            archive again in a worker process
 
     Returns:
         (DistInfo) The resulting distribution metadata
     """
     results = None
 
+    setup_file = find_in_archive(extractor, "setup.py", max_depth=1)
+
+    if name == "setuptools":
+        LOG.debug("Not running setup.py for setuptools")
+        return None
+
+    if setup_file is None:
+        LOG.warning("Could not find a setup.py in %s", os.path.basename(source_file))
+        return None
+
+    try:
+        LOG.info("Parsing setup.py %s", setup_file)
+        results = _run_setup_py(
+            source_file, extractor_type, name, setup_file, extractor
+        )
+    except (Exception, RuntimeError, ImportError):  # pylint: disable=broad-except
+        LOG.warning("Failed to parse %s", name, exc_info=True)
+
+    if results is None:
+        with SETUP_PY_LOCK:
+            results = _build_egg_info(name, extractor, setup_file)
+
+    if results is None or (results.name is None and results.version is None):
+        return None
+
+    if results.name is None:
+        results.name = name
+    if results.version is None or (version and results.version != version):
+        LOG.debug(
+            "Parsed version of %s did not match filename %s", results.version, version
+        )
+        results.version = version or utils.parse_version("0.0.0")
+
+    if not isinstance(extractor, NonExtractor) and utils.normalize_project_name(
+        results.name
+    ) != utils.normalize_project_name(name):
+        LOG.warning("Name coming from setup.py does not match: %s", results.name)
+        results.name = name
+    return results
+
+
+def _run_setup_py(source_file, extractor_type, name, setup_file, extractor):
+    """Parse a setup.py statically if possible. Otherwise run it, in a worker
+    process if they are configured"""
+    results = _parse_setup_py_static(setup_file, extractor)
+    SETUP_PY_STATS["static" if results is not None else "exec"] += 1
+    if results is not None:
+        LOG.debug("Evaluated %s statically", setup_file)
+        return results
+
+    pool = _SETUP_PY_POOL
+    if pool is None:
+        with SETUP_PY_LOCK, _fake_working_dir(extractor):
+            return _parse_setup_py(name, setup_file, extractor)
+
+    result_name, version, reqs = pool.run(
+        _parse_setup_py_job,
+        extractor_type,
+        os.path.abspath(source_file),
+        name,
+        setup_file,
+    )
+    return DistInfo(
+        result_name,
+        utils.parse_version(version) if version is not None else None,
+        list(utils.parse_requirements(reqs)),
+    )
+
+
+def _parse_setup_py_static(setup_file, extractor):
+    """Build the metadata from the arguments of the setup() call in a setup.py,
+    evaluated without running any of it. Files are read through the extractor by
+    their absolute fake paths, so nothing process-wide is patched and this is
+    safe to call from several threads
+
+    Returns:
+        (DistInfo|None) The metadata, or None if the setup.py must be run
+    """
+    fake_setup_file = _fake_path(extractor, setup_file)
+    contents = extractor.contents(fake_setup_file)
+    if six.PY2:
+        contents = remove_encoding_lines(contents)
+
+    kwargs = evaluate_setup_kwargs(contents, fake_setup_file, extractor.open)
+    if kwargs is None:
+        return None
+
+    results = []  # type: List[DistInfo]
+    try:
+        # setup.cfg is read from the directory of setup.py
+        setup_cfg_file = os.path.join(os.path.dirname(fake_setup_file), "setup.cfg")
+        setup_cfg = None
+        if extractor.exists(setup_cfg_file):
+            with extractor.open(setup_cfg_file, encoding="utf-8") as handle:
+                setup_cfg = _read_setup_cfg(handle)
+        _setup(results, setup_cfg, kwargs)
+    except (ValueError, TypeError, AttributeError, configparser.Error):
+        LOG.debug("Unable to use the setup() arguments of %s", setup_file)
+        return None
+    if results[0].name is None and results[0].version is None:
+        return None
+    return results[0]
+
+
+def _parse_setup_py_job(extractor_type, source_file, name, setup_file):
+    """Parse a setup.py in a worker process. The DistInfo is returned as strings,
+    as its parts are not all picklable"""
+    extractor = extractor_type(source_file)
+    with closing(extractor), _fake_working_dir(extractor):
+        result = _parse_setup_py(name, setup_file, extractor)
+    return (
+        result.name,
+        str(result.version) if result.version is not None else None,
+        [str(req) for req in result.reqs],
+    )
+
+
+def _fake_working_dir(extractor):
+    """Patch the working directory functions to act as if inside the root of the
+    extractor. Only one thread may use them at a time"""
     setattr(THREADLOCAL, "curdir", extractor.fake_root)
 
     def _fake_chdir(new_dir):
@@ -142,52 +358,13 @@ def _fetch_from_setup_py(
         return path
 
     # fmt: off
-    patches = patch(
+    return patch(
             os, 'chdir', _fake_chdir,
             os, 'getcwd', _fake_getcwd,
             os, 'getcwdu', _fake_getcwd,
             os.path, 'abspath', _fake_abspath,
     )
     # fmt: on
-    with patches:
-        setup_file = find_in_archive(extractor, "setup.py", max_depth=1)
-
-        if name == "setuptools":
-            LOG.debug("Not running setup.py for setuptools")
-            return None
-
-        if setup_file is None:
-            LOG.warning(
-                "Could not find a setup.py in %s", os.path.basename(source_file)
-            )
-            return None
-
-        try:
-            LOG.info("Parsing setup.py %s", setup_file)
-            results = _parse_setup_py(name, setup_file, extractor)
-        except (Exception, RuntimeError, ImportError):  # pylint: disable=broad-except
-            LOG.warning("Failed to parse %s", name, exc_info=True)
-
-    if results is None:
-        results = _build_egg_info(name, extractor, setup_file)
-
-    if results is None or (results.name is None and results.version is None):
-        return None
-
-    if results.name is None:
-        results.name = name
-    if results.version is None or (version and results.version != version):
-        LOG.debug(
-            "Parsed version of %s did not match filename %s", results.version, version
-        )
-        results.version = version or utils.parse_version("0.0.0")
-
-    if not isinstance(extractor, NonExtractor) and utils.normalize_project_name(
-        results.name
-    ) != utils.normalize_project_name(name):
-        LOG.warning("Name coming from setup.py does not match: %s", results.name)
-        results.name = name
-    return results
 
 
 def _run_with_output(cmd, cwd=None, timeout=30.0):
@@ -326,7 +503,8 @@ def _build_egg_info(name, extractor, setup_file):
             pkg_dist = PkgResourcesDistInfo(
                 pkg_resources.Distribution(
                     setup_dir, project_name=name, metadata=metadata
-                )
+                ),
+                temp_dir=temp_tar,
             )
             return pkg_dist
         except IndexError:
@@ -356,9 +534,28 @@ def parse_req_with_marker(req_str, marker):
     )
 
 
-def setup(
-    results, *_args, **kwargs
-):  # pylint: disable=too-many-branches,too-many-locals
+def _read_setup_cfg(handle):
+    # type: (Any) -> configparser.ConfigParser
+    parser = configparser.ConfigParser()
+    if six.PY2:
+        parser.readfp(handle)  # pylint: disable=deprecated-method
+    else:
+        parser.read_file(handle)
+    return parser
+
+
+def setup(results, *_args, **kwargs):
+    """Stands in for setuptools.setup() while a setup.py is run, reading setup.cfg
+    from the (fake) working directory"""
+    setup_cfg = None
+    if os.path.exists("setup.cfg"):
+        with open("setup.cfg") as handle:
+            setup_cfg = _read_setup_cfg(handle)
+    return _setup(results, setup_cfg, kwargs)
+
+
+def _setup(results, setup_cfg, kwargs):  # pylint: disable=too-many-branches
+    # type: (List[DistInfo], Optional[configparser.ConfigParser], Dict[str, Any]) -> Any
     # pbr uses a dangerous pattern that only works when you build using setuptools
     # d2to1 uses unknown config options in setup.cfg
     setup_frameworks = ("pbr", "d2to1", "use_pyscaffold")
@@ -371,8 +568,8 @@ def setup(
     ):
         raise ValueError("Must run egg-info if pbr/setupmeta is in setup_requires")
 
-    if os.path.exists("setup.cfg"):
-        _add_setup_cfg_kwargs(kwargs)
+    if setup_cfg is not None:
+        _add_setup_cfg_kwargs(kwargs, setup_cfg)
 
     name = kwargs.get("name", None)
     version = kwargs.get("version", None)
@@ -463,12 +660,9 @@ class FakeModule(ModuleType):
         return FakeModule(item)
 
 
-def _add_setup_cfg_kwargs(kwargs):
+def _add_setup_cfg_kwargs(kwargs, parser):
     LOG.info("Parsing from setup.cfg")
 
-    parser = configparser.ConfigParser()
-    parser.read("setup.cfg")
-
     install_requires = kwargs.get("install_requires", [])
     if parser.has_option("options", "install_requires"):
         install_requires.extend(parser.get("options", "install_requires").split("\n"))
@@ -0,0 +1,175 @@
+"""Management of a wheel directory shared between runs and processes"""
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from req_compile.repos.filelock import FileLocked, file_lock
+from req_compile.repos.hashmanifest import get_manifest
+
+LOG = logging.getLogger("req_compile.repository.artifactcache")
+
+LOCK_DIR = ".locks"
+PARTIAL_PREFIX = ".download-"
+PARTIAL_SUFFIX = ".part"
+
+# Partial downloads older than this were abandoned by a process that died
+STALE_PARTIAL_AGE = 60 * 60
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+_CACHES = {}  # type: Dict[str, ArtifactCache]
+_REGISTRY_LOCK = threading.Lock()
+
+
+def parse_size(value):
+    # type: (str) -> int
+    """Parse a size such as 500M or 2G into a number of bytes"""
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", value, re.IGNORECASE)
+    if match is None:
+        raise ValueError("Invalid size: {}".format(value))
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def _makedirs(directory):
+    # type: (str) -> None
+    if not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another process may have created it first
+            if not os.path.isdir(directory):
+                raise
+
+
+class ArtifactCache(object):
+    """A directory of downloaded distributions. Downloads of the same file are
+    serialized with file locks, so concurrent processes share a download instead of
+    racing on it, and the directory can be pruned to a size, least recently used
+    files first. Use recency is tracked through file access times"""
+
+    def __init__(self, directory):
+        # type: (str) -> None
+        self.directory = os.path.abspath(directory)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def __repr__(self):
+        return "ArtifactCache({})".format(self.directory)
+
+    def lock(self, filename, blocking=True):
+        # type: (str, bool) -> contextlib.AbstractContextManager
+        """Lock a file in the directory, e.g. while downloading it. See file_lock"""
+        lock_dir = os.path.join(self.directory, LOCK_DIR)
+        _makedirs(lock_dir)
+        return file_lock(
+            os.path.join(lock_dir, os.path.basename(filename) + ".lock"),
+            blocking=blocking,
+        )
+
+    def record_hit(self, filename):
+        # type: (str) -> None
+        """Record that an existing file was reused"""
+        with self._stats_lock:
+            self.hits += 1
+        try:
+            # Only the access time is updated, the modification time identifies the
+            # file contents in the hash manifest
+            os.utime(filename, (time.time(), os.stat(filename).st_mtime))
+        except EnvironmentError:
+            pass
+
+    def record_miss(self, filename):  # pylint: disable=unused-argument
+        # type: (str) -> None
+        """Record that a file had to be downloaded"""
+        with self._stats_lock:
+            self.misses += 1
+
+    def stats(self):
+        # type: () -> Dict[str, int]
+        return {"hits": self.hits, "misses": self.misses}
+
+    def artifacts(self):
+        # type: () -> List[Tuple[str, int, float]]
+        """The files in the directory as (path, size, last use) tuples, excluding
+        the files used to manage it"""
+        results = []
+        for name in os.listdir(self.directory):
+            if name.startswith("."):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except EnvironmentError:
+                continue
+            if os.path.isfile(path):
+                results.append((path, stat.st_size, max(stat.st_atime, stat.st_mtime)))
+        return results
+
+    def size(self):
+        # type: () -> int
+        return sum(size for _, size, _ in self.artifacts())
+
+    def prune(self, max_size):
+        # type: (int) -> Tuple[int, int]
+        """Remove the least recently used files until the directory is no larger
+        than max_size bytes. Abandoned partial downloads are removed as well. Files
+        locked by another thread or process, e.g. while being downloaded, are kept
+
+        Returns:
+            The number of files removed and the number of bytes freed
+        """
+        self._remove_stale_partials()
+
+        artifacts = sorted(self.artifacts(), key=lambda artifact: artifact[2])
+        total = sum(size for _, size, _ in artifacts)
+        removed = []
+        freed = 0
+        for path, size, _ in artifacts:
+            if total <= max_size:
+                break
+            try:
+                with self.lock(path, blocking=False):
+                    os.remove(path)
+            except FileLocked:
+                LOG.debug("Not pruning %s, it is in use", path)
+                continue
+            except EnvironmentError:
+                LOG.warning("Unable to remove %s", path, exc_info=True)
+                continue
+            LOG.debug("Pruned %s", path)
+            removed.append(os.path.basename(path))
+            total -= size
+            freed += size
+
+        if removed:
+            get_manifest(self.directory).forget(removed)
+        return len(removed), freed
+
+    def _remove_stale_partials(self):
+        # type: () -> None
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not (name.startswith(PARTIAL_PREFIX) and name.endswith(PARTIAL_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > STALE_PARTIAL_AGE:
+                    os.remove(path)
+            except EnvironmentError:
+                pass
+
+
+def get_artifact_cache(directory):
+    # type: (str) -> ArtifactCache
+    """Get the cache of a directory, shared by everything using it in this process"""
+    directory = os.path.abspath(directory)
+    with _REGISTRY_LOCK:
+        cache = _CACHES.get(directory)
+        if cache is None:
+            cache = _CACHES[directory] = ArtifactCache(directory)
+        return cache
@@ -5,6 +5,7 @@ import req_compile.metadata.metadata
 import req_compile.repos.repository
 from req_compile import utils
 from req_compile.repos import Repository, RepositoryInitializationError
+from req_compile.repos.metadatacache import file_key
 
 
 class FindLinksRepository(Repository):
@@ -12,11 +13,19 @@ class FindLinksRepository(Repository):
     A directory on the filesystem as a source of distributions.
     """
 
-    def __init__(self, path, allow_prerelease=None):
+    def __init__(self, path, allow_prerelease=None, metadata_cache=None):
+        """
+        Args:
+            path (str): Directory containing the distributions
+            allow_prerelease (bool, optional): Whether or not to consider prereleases
+            metadata_cache (MetadataCache, optional): Persistent cache of metadata
+                extracted from distributions
+        """
         super(FindLinksRepository, self).__init__(
             "findlinks", allow_prerelease=allow_prerelease
         )
         self.path = path
+        self.metadata_cache = metadata_cache
         self.links = []
         self._find_all_links()
 
@@ -61,10 +70,17 @@ class FindLinksRepository(Repository):
 
     def resolve_candidate(self, candidate):
         filename = os.path.join(self.path, candidate.filename)
-        return (
-            req_compile.metadata.extract_metadata(filename, origin=self),
-            True,
-        )
+        if self.metadata_cache is None:
+            return req_compile.metadata.extract_metadata(filename, origin=self), True
+
+        key = file_key(filename)
+        result = self.metadata_cache.get(key)
+        if result is None:
+            result = req_compile.metadata.extract_metadata(filename, origin=self)
+            self.metadata_cache.put(key, result)
+        else:
+            result.origin = self
+        return result, True
 
     def close(self):
         pass
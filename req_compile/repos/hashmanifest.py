@@ -0,0 +1,144 @@
+"""Record of the verified hashes of the files in a wheel directory"""
+import json
+import logging
+import os
+import threading
+from hashlib import sha256
+from typing import Dict, Iterable, Optional, Tuple
+
+from req_compile.repos.filelock import file_lock
+from req_compile.repos.pagecache import atomic_write
+
+LOG = logging.getLogger("req_compile.repository.hashmanifest")
+
+MANIFEST_NAME = ".req-compile-hashes.json"
+
+# Files are hashed in large blocks to keep the number of reads down
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_MANIFESTS = {}  # type: Dict[str, HashManifest]
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def hash_file(filename):
+    # type: (str) -> str
+    """Calculate the sha256 of a file"""
+    hasher = sha256()
+    with open(filename, "rb") as handle:
+        while True:
+            block = handle.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _file_state(filename):
+    # type: (str) -> Optional[Tuple[int, int]]
+    try:
+        stat = os.stat(filename)
+    except EnvironmentError:
+        return None
+    return stat.st_size, int(stat.st_mtime * 1e6)
+
+
+class HashManifest(object):
+    """The sha256 of files in a directory that were verified against an index,
+    along with the size and modification time they had. A file that hasn't changed
+    since can be trusted without hashing it again. The manifest file may be
+    shared by concurrent processes, each change is merged into its latest
+    contents"""
+
+    def __init__(self, directory):
+        # type: (str) -> None
+        self.directory = directory
+        self.filename = os.path.join(directory, MANIFEST_NAME)
+        self.lock_filename = self.filename + ".lock"
+        self.lock = threading.Lock()
+        self.entries = self._load()  # type: Dict[str, Dict[str, object]]
+
+    def __repr__(self):
+        return "HashManifest({})".format(self.directory)
+
+    def _load(self):
+        # type: () -> Dict[str, Dict[str, object]]
+        try:
+            with open(self.filename, "r") as handle:
+                entries = json.load(handle)
+        except EnvironmentError:
+            return {}
+        except ValueError:
+            LOG.debug("Discarding unreadable manifest %s", self.filename)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def verified_hash(self, filename):
+        # type: (str) -> Optional[str]
+        """The recorded sha256 of a file, or None if it is unknown or the file has
+        changed since it was recorded"""
+        state = _file_state(filename)
+        with self.lock:
+            entry = self.entries.get(os.path.basename(filename))
+        if state is None or entry is None:
+            return None
+        if (entry.get("size"), entry.get("mtime")) != state:
+            return None
+        return entry.get("sha256")  # type: ignore
+
+    def forget(self, filenames):
+        # type: (Iterable[str]) -> None
+        """Drop the entries of files that were removed from the directory"""
+        self._save({}, [os.path.basename(filename) for filename in filenames])
+
+    def record(self, filename, hexdigest):
+        # type: (str, str) -> None
+        """Record the verified sha256 of a file in the directory"""
+        state = _file_state(filename)
+        if state is None:
+            return
+        self._save(
+            {
+                os.path.basename(filename): {
+                    "sha256": hexdigest,
+                    "size": state[0],
+                    "mtime": state[1],
+                }
+            },
+            [],
+        )
+
+    def _save(self, updated, removed):
+        # type: (Dict[str, Dict[str, object]], Iterable[str]) -> None
+        """Apply changes to the manifest file, keeping the changes other processes
+        made to it since it was read"""
+        with self.lock:
+            try:
+                with file_lock(self.lock_filename):
+                    self.entries = self._load()
+                    self._apply(updated, removed)
+                    atomic_write(
+                        self.filename,
+                        json.dumps(self.entries, sort_keys=True).encode("utf-8"),
+                    )
+                    return
+            except EnvironmentError:
+                LOG.warning("Unable to write %s", self.filename, exc_info=True)
+            # The changes still apply to this process
+            self._apply(updated, removed)
+
+    def _apply(self, updated, removed):
+        # type: (Dict[str, Dict[str, object]], Iterable[str]) -> None
+        self.entries.update(updated)
+        for name in removed:
+            self.entries.pop(name, None)
+
+
+def get_manifest(directory):
+    # type: (str) -> HashManifest
+    """Get the manifest of a directory, shared by everything using it in this process"""
+    directory = os.path.abspath(directory)
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(directory)
+        if manifest is None:
+            manifest = _MANIFESTS[directory] = HashManifest(directory)
+        return manifest
@@ -0,0 +1,183 @@
+"""Persistent cache of the metadata extracted from distribution files"""
+import logging
+import os
+import platform
+import sys
+import threading
+from typing import Optional
+
+from req_compile.containers import DistInfo, RequirementContainer
+from req_compile.utils import parse_requirements, parse_version
+
+try:
+    import sqlite3
+except ImportError:  # Python built without sqlite
+    sqlite3 = None  # type: ignore
+
+LOG = logging.getLogger("req_compile.repository.metadatacache")
+
+# Bump whenever the meaning of a stored row changes so stale rows are ignored
+CACHE_FORMAT = 1
+
+# The metadata of a source distribution may come from running its setup.py, which
+# can depend on the interpreter and platform it runs on. Wheels are already built
+# for a single environment, so their metadata is the same everywhere
+SOURCE_ENVIRONMENT = "{}{}.{}-{}-{}".format(
+    platform.python_implementation().lower(),
+    sys.version_info[0],
+    sys.version_info[1],
+    sys.platform,
+    platform.machine().lower(),
+)
+
+
+def _scoped_key(key, filename):
+    # type: (str, str) -> str
+    if filename.lower().endswith(".whl"):
+        return key
+    return "{}:{}".format(key, SOURCE_ENVIRONMENT)
+
+
+def link_key(link):
+    # type: (str) -> Optional[str]
+    """Build the cache key of a remote distribution from the sha256 in its link.
+    Keys of source distributions are specific to the running environment
+
+    Args:
+        link: Link to the distribution, as found on an index page
+
+    Returns:
+        The key, or None if the link does not carry a sha256
+    """
+    split_link = link.split("#sha256=")
+    if len(split_link) < 2 or not split_link[1]:
+        return None
+    return _scoped_key("sha256:" + split_link[1].lower(), split_link[0])
+
+
+def file_key(filename):
+    # type: (str) -> Optional[str]
+    """Build the cache key of a local distribution from its path, size and
+    modification time, so a replaced file is not matched. Keys of source
+    distributions are specific to the running environment
+
+    Returns:
+        The key, or None if the file can't be read
+    """
+    try:
+        stat = os.stat(filename)
+    except EnvironmentError:
+        return None
+    return _scoped_key(
+        "file:{}:{}:{}".format(
+            os.path.abspath(filename), stat.st_size, int(stat.st_mtime * 1e6)
+        ),
+        filename,
+    )
+
+
+class MetadataCache(object):
+    """An sqlite database mapping distribution files to the name, version and
+    requirements extracted from them. Safe to share between threads and
+    repositories"""
+
+    def __init__(self, filename):
+        # type: (str) -> None
+        """
+        Args:
+            filename: Database file. Its directory is created if needed
+        """
+        self.filename = os.path.abspath(filename)
+        self.lock = threading.Lock()
+        self.connection = None
+        if sqlite3 is None:
+            LOG.warning("sqlite3 is not available, metadata will not be cached")
+            return
+
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have created it first
+                if not os.path.isdir(directory):
+                    raise
+        try:
+            self.connection = sqlite3.connect(
+                self.filename, timeout=30, check_same_thread=False
+            )
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS metadata "
+                    "(key TEXT PRIMARY KEY, format INTEGER, name TEXT, "
+                    "version TEXT, requires TEXT)"
+                )
+        except sqlite3.Error:
+            LOG.warning(
+                "Unable to open metadata cache %s", self.filename, exc_info=True
+            )
+            self.connection = None
+
+    def __repr__(self):
+        return "MetadataCache({})".format(self.filename)
+
+    def get(self, key):
+        # type: (Optional[str]) -> Optional[DistInfo]
+        """Load the metadata stored for a key, if any"""
+        if key is None or self.connection is None:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT format, name, version, requires FROM metadata "
+                    "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error:
+            LOG.debug("Unable to read metadata cache entry %s", key, exc_info=True)
+            return None
+
+        if row is None or row[0] != CACHE_FORMAT:
+            return None
+        _, name, version, requires = row
+        LOG.debug("Using cached metadata for %s %s", name, version)
+        return DistInfo(
+            name,
+            parse_version(version),
+            list(parse_requirements(requires.split("\n") if requires else [])),
+        )
+
+    def put(self, key, result):
+        # type: (Optional[str], Optional[RequirementContainer]) -> None
+        """Store the metadata extracted for a key. Only complete DistInfo results
+        are stored, as other containers can't be rebuilt from their requirements"""
+        if (
+            key is None
+            or self.connection is None
+            or not isinstance(result, DistInfo)
+            or result.meta
+            or result.name is None
+            or result.version is None
+        ):
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        CACHE_FORMAT,
+                        result.name,
+                        str(result.version),
+                        "\n".join(str(req) for req in result.reqs),
+                    ),
+                )
+        except sqlite3.Error:
+            LOG.warning("Unable to write metadata cache entry %s", key, exc_info=True)
+
+    def close(self):
+        # type: () -> None
+        if self.connection is not None:
+            with self.lock:
+                self.connection.close()
+                self.connection = None
@@ -28,6 +28,10 @@ class MultiRepository(BaseRepository):
                 last_ex = ex
         raise last_ex
 
+    def prefetch(self, req):
+        for repo in self.repositories:
+            repo.prefetch(req)
+
     def get_candidates(self, req):
         candidates = []
         for repo in self.repositories:
@@ -0,0 +1,223 @@
+"""Speculative background prefetching of candidates for a repository"""
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+from typing import Dict, Iterable, Optional, Tuple
+
+import pkg_resources
+
+import req_compile.metadata.source
+from req_compile.containers import RequirementContainer
+from req_compile.repos.repository import (
+    Candidate,
+    Repository,
+    filter_candidates,
+    sort_candidates,
+)
+from req_compile.utils import normalize_project_name
+
+LOG = logging.getLogger("req_compile.repository.prefetch")
+
+PREFETCH_WORKERS = 4
+
+
+class _PrefetchResult(object):
+    """The progress and result of speculatively fetching a project"""
+
+    def __init__(self):
+        self.started = False
+        self.abandoned = False
+        self.candidates = None  # type: Optional[Iterable[Candidate]]
+        self.top_candidate = None  # type: Optional[Candidate]
+        self.resolved = None  # type: Optional[Tuple[Optional[RequirementContainer], bool]]
+        # Set once the candidates and the top candidate are known, even on failure
+        self.page_fetched = threading.Event()
+        # Set once the top candidate is resolved, even on failure
+        self.finished = threading.Event()
+
+
+class PrefetchRepository(Repository):
+    """Wraps a repository to fetch the project page and the metadata of the best
+    candidate in the background, as soon as the solver learns a project will be
+    needed. Lookups made by the solver then usually find the data already local.
+    Prefetches that haven't started yet are never waited for, the lookup is made
+    directly instead. Each prefetched result is used at most once"""
+
+    def __init__(self, repo, max_queued=16, workers=PREFETCH_WORKERS):
+        # type: (Repository, int, int) -> None
+        """
+        Args:
+            repo: The repository to prefetch from
+            max_queued: Maximum number of projects being prefetched at once. Further
+                prefetch requests are dropped
+            workers: Number of background threads
+        """
+        super(PrefetchRepository, self).__init__(
+            "prefetch", allow_prerelease=repo.allow_prerelease
+        )
+        self.repo = repo
+        self.max_queued = max_queued
+        self.own_setup_py_workers = req_compile.metadata.source.use_setup_py_workers(
+            workers
+        )
+        self.pool = ThreadPool(workers)
+        self.lock = threading.Lock()
+        self.pending = {}  # type: Dict[str, _PrefetchResult]
+        self.queued = 0
+        self.stopped = False
+
+        self.page_hits = 0
+        self.page_misses = 0
+        self.metadata_hits = 0
+        self.metadata_misses = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return repr(self.repo)
+
+    def __eq__(self, other):
+        if isinstance(other, PrefetchRepository):
+            other = other.repo
+        return self.repo == other
+
+    def __hash__(self):
+        return hash(self.repo)
+
+    def __iter__(self):
+        return iter(self.repo)
+
+    def prefetch(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        key = normalize_project_name(req.project_name)
+        with self.lock:
+            if self.stopped or key in self.pending:
+                return
+            if self.queued >= self.max_queued:
+                self.dropped += 1
+                return
+            self.queued += 1
+            result = self.pending[key] = _PrefetchResult()
+        self.pool.apply_async(self._do_prefetch, (req, result))
+
+    def _do_prefetch(self, req, result):
+        # type: (pkg_resources.Requirement, _PrefetchResult) -> None
+        try:
+            with self.lock:
+                if self.stopped or result.abandoned:
+                    return
+                result.started = True
+            LOG.debug("Prefetching %s", req)
+            result.candidates = self.repo.get_candidates(req)
+            candidates = sort_candidates(
+                filter_candidates(
+                    req, result.candidates, allow_prereleases=self.allow_prerelease
+                )
+            )
+            if candidates:
+                result.top_candidate = candidates[0]
+            result.page_fetched.set()
+            if result.top_candidate is not None:
+                result.resolved = self.repo.resolve_candidate(result.top_candidate)
+        except Exception:  # pylint: disable=broad-except
+            # The solver will hit the same error and report it
+            LOG.debug("Failed to prefetch %s", req, exc_info=True)
+        finally:
+            result.page_fetched.set()
+            result.finished.set()
+            with self.lock:
+                self.queued -= 1
+
+    def _started(self, project_name):
+        # type: (str) -> Optional[_PrefetchResult]
+        """The prefetch of a project, if it is under way. One that is still queued
+        is abandoned, as the lookup won't wait for it"""
+        key = normalize_project_name(project_name)
+        with self.lock:
+            result = self.pending.get(key)
+            if result is not None and not result.started:
+                result.abandoned = True
+                del self.pending[key]
+                return None
+            return result
+
+    def _consume(self, project_name, result):
+        # type: (str, _PrefetchResult) -> None
+        with self.lock:
+            key = normalize_project_name(project_name)
+            if self.pending.get(key) is result:
+                del self.pending[key]
+
+    def get_candidates(self, req):
+        # type: (Optional[pkg_resources.Requirement]) -> Iterable[Candidate]
+        if req is not None:
+            result = self._started(req.project_name)
+            if result is not None:
+                result.page_fetched.wait()
+                candidates = result.candidates
+                # The page is only used once, the metadata may still be
+                if result.top_candidate is None:
+                    self._consume(req.project_name, result)
+                result.candidates = None
+                if candidates is not None:
+                    self.page_hits += 1
+                    return candidates
+            self.page_misses += 1
+        return self.repo.get_candidates(req)
+
+    def resolve_candidate(self, candidate):
+        # type: (Candidate) -> Tuple[Optional[RequirementContainer], bool]
+        result = self._started(candidate.name)
+        # Only wait for the prefetch if it is resolving this same candidate
+        if (
+            result is not None
+            and result.page_fetched.is_set()
+            and result.top_candidate == candidate
+        ):
+            result.finished.wait()
+            self._consume(candidate.name, result)
+            if result.resolved is not None:
+                resolved, result.resolved = result.resolved, None
+                self.metadata_hits += 1
+                return resolved
+        elif result is not None:
+            self._consume(candidate.name, result)
+        self.metadata_misses += 1
+        return self.repo.resolve_candidate(candidate)
+
+    def why_cant_I_use(self, req, candidate):  # pylint: disable=invalid-name
+        return self.repo.why_cant_I_use(req, candidate)
+
+    def stats(self):
+        # type: () -> str
+        """Describe how effective prefetching was"""
+        return (
+            "index pages {} hit / {} miss, metadata {} hit / {} miss, "
+            "{} dropped".format(
+                self.page_hits,
+                self.page_misses,
+                self.metadata_hits,
+                self.metadata_misses,
+                self.dropped,
+            )
+        )
+
+    def stop(self):
+        # type: () -> None
+        """Stop prefetching. Queued work is abandoned and work in progress is waited
+        for, so nothing is written to the wheel directory after this returns. Lookups
+        keep working, going straight to the wrapped repository"""
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.pending = {}
+        self.pool.close()
+        self.pool.join()
+        if self.own_setup_py_workers:
+            req_compile.metadata.source.configure_setup_py_workers(0)
+        LOG.info("Prefetch statistics for %r: %s", self.repo, self.stats())
+
+    def close(self):
+        # type: () -> None
+        self.stop()
+        self.repo.close()
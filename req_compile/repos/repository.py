@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import bisect
 import enum
 import logging
 import os
@@ -7,18 +8,24 @@ import platform
 import struct
 import sys
 import sysconfig
-from typing import Iterable, Optional, Sequence, Tuple, Any
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
 
 import packaging.version
 import pkg_resources
 import six
 
+try:
+    import packaging.tags as packaging_tags
+except ImportError:  # packaging < 20
+    packaging_tags = None  # type: ignore
+
 import req_compile.errors
 import req_compile.utils
 from req_compile.containers import DistInfo, RequirementContainer
 from req_compile.errors import NoCandidateException
 from req_compile.filename import parse_source_filename
 from req_compile.utils import have_compatible_glibc, normalize_project_name, parse_version
+from req_compile.versions import VersionSet
 
 INTERPRETER_TAGS = {
     "CPython": "cp",
@@ -30,6 +37,8 @@ INTERPRETER_TAGS = {
 INTERPRETER_TAG = INTERPRETER_TAGS.get(platform.python_implementation(), "cp")
 PY_VERSION_NUM = str(sys.version_info.major) + str(sys.version_info.minor)
 
+SortKey = Tuple[packaging.version.Version, str, int, Tuple[int, int, int, int, int]]
+
 
 def is_manylinux2010_compatible():
     # type: () -> bool
@@ -120,8 +129,74 @@ def _get_abi_tag():
     return tag
 
 
-PLATFORM_TAGS = _get_platform_tags()
-ABI_TAGS = ("abi" + str(sys.version_info.major), _get_abi_tag())
+def _legacy_supported_tags():
+    # type: () -> Tuple[Tuple[str, str, str], ...]
+    """Approximate the wheel tags of this interpreter, for versions of packaging
+    without the tags module"""
+    platforms = tuple(reversed(_get_platform_tags()))
+    interpreter = INTERPRETER_TAG + PY_VERSION_NUM
+    abis = (_get_abi_tag(), "abi" + str(sys.version_info.major), "none")
+    generic = ("py" + PY_VERSION_NUM, "py" + str(sys.version_info.major))
+    return tuple(
+        (interpreter, abi, plat) for abi in abis for plat in platforms
+    ) + tuple((py_tag, "none", plat) for py_tag in generic for plat in platforms)
+
+
+def _get_supported_tags():
+    # type: () -> Tuple[Tuple[str, str, str], ...]
+    """All (interpreter, abi, platform) wheel tags this interpreter can install,
+    from most to least preferred (PEP 425)"""
+    if packaging_tags is None:
+        return _legacy_supported_tags()
+    return tuple(
+        (tag.interpreter, tag.abi, tag.platform) for tag in packaging_tags.sys_tags()
+    )
+
+
+def _unique(values):
+    # type: (Iterable[str]) -> Tuple[str, ...]
+    seen = set()  # type: Set[str]
+    result = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            result.append(value)
+    return tuple(result)
+
+
+SUPPORTED_TAGS = _get_supported_tags()
+
+# Each component of the supported tags, from least to most preferred
+PLATFORM_TAGS = _unique(plat for _, _, plat in reversed(SUPPORTED_TAGS))
+ABI_TAGS = _unique(abi for _, abi, _ in reversed(SUPPORTED_TAGS) if abi != "none")
+
+# Position of each tag in the preference order, for constant time checks and
+# scoring. Higher is better
+_TAG_PRIORITY = {tag: score for score, tag in enumerate(reversed(SUPPORTED_TAGS))}
+_PLATFORM_SCORES = {tag: score for score, tag in enumerate(PLATFORM_TAGS)}
+_ABI_SCORES = {tag: score for score, tag in enumerate(ABI_TAGS)}
+
+
+def _wheel_tag_priority(py_tags, abi, platforms):
+    # type: (Iterable[str], str, str) -> Optional[int]
+    """Find the priority of the best supported tag in a wheel's compressed tag set
+
+    Args:
+        py_tags: The python tags of the wheel
+        abi: The ABI tag of the wheel, possibly compressed
+        platforms: The platform tag of the wheel, possibly compressed
+
+    Returns:
+        The priority, or None if this interpreter supports none of the tags
+    """
+    best = None
+    for py_tag in py_tags:
+        for abi_tag in abi.lower().split("."):
+            for plat in platforms.lower().split("."):
+                priority = _TAG_PRIORITY.get((py_tag.lower(), abi_tag, plat))
+                if priority is not None and (best is None or priority > best):
+                    best = priority
+    return best
 
 
 class RepositoryInitializationError(ValueError):
@@ -202,6 +277,24 @@ class WheelVersionTags(PythonVersionRequirement):
 class Candidate(object):  # pylint: disable=too-many-instance-attributes
     """A candidate representing come kind of distribution to resolve"""
 
+    # Project pages can list thousands of files, so avoid a dict per candidate
+    __slots__ = (
+        "name",
+        "filename",
+        "version",
+        "py_version",
+        "abi",
+        "platform",
+        "link",
+        "type",
+        "tag_priority",
+        "_sortkey",
+        "_extra_sort_info",
+        "preparsed",
+        "yanked",
+        "core_metadata",
+    )
+
     def __init__(
         self,
         name,  # type: str
@@ -222,7 +315,7 @@ class Candidate(object):  # pylint: disable=too-many-instance-attributes
             version:
             py_version (RequiresPython): Python version
             abi (str, None)
-            plat (str):
+            plat (str): Platform tag, which may be a compressed tag set (PEP 425)
             link:
             candidate_type:
         """
@@ -235,16 +328,31 @@ class Candidate(object):  # pylint: disable=too-many-instance-attributes
         self.link = link
         self.type = candidate_type
 
+        # Priority of the best tag of a wheel that this interpreter supports. None
+        # if it supports none of them, or if the tags aren't known
+        self.tag_priority = None  # type: Optional[int]
+        if isinstance(py_version, WheelVersionTags) and py_version.py_version:
+            self.tag_priority = _wheel_tag_priority(
+                py_version.py_version, abi or "none", plat
+            )
+
         # Sort based on tags to make sure the most specific distributions
         # are matched first
-        self._sortkey = None  # type: Optional[Tuple[packaging.version.Version, str, int, Tuple[int, int, int, int]]]
+        self._sortkey = None  # type: Optional[SortKey]
         self._extra_sort_info = extra_sort_info
 
         self.preparsed = None  # type: Optional[RequirementContainer]
 
+        # Whether the index marked this file as yanked (PEP 592)
+        self.yanked = False
+
+        # Hashes of the standalone metadata file the index serves for this
+        # file (PEP 658/714), or None if it doesn't serve one
+        self.core_metadata = None  # type: Optional[Dict[str, str]]
+
     @property
     def sortkey(self):
-        # type: () -> Tuple[packaging.version.Version, str, int, Tuple[int, int, int, int]]
+        # type: () -> SortKey
         if self._sortkey is None:
             self._sortkey = (
                 self.version,
@@ -256,25 +364,23 @@ class Candidate(object):  # pylint: disable=too-many-instance-attributes
 
     @property
     def tag_score(self):
-        # type: () -> Tuple[int, int, int, int]
+        # type: () -> Tuple[int, int, int, int, int]
+        tag_priority = self.tag_priority if self.tag_priority is not None else -1
         py_version_score = (
             self.py_version.tag_score if self.py_version is not None else 0
         )
-        try:
-            abi_score = ABI_TAGS.index(self.abi) if self.abi is not None else 0
-        except ValueError:
-            abi_score = 0
-        try:
-            plat_score = PLATFORM_TAGS.index(self.platform.lower())
-        except ValueError:
-            plat_score = 0
+        abi_score = _ABI_SCORES.get(self.abi, 0) if self.abi is not None else 0
+        plat_score = max(
+            _PLATFORM_SCORES.get(plat, 0)
+            for plat in self.platform.lower().split(".")
+        )
         # Spaces in source dist filenames penalize them in the search order
         extra_score = (
             0
             if isinstance(self.filename, six.string_types) and " " in self.filename
             else 1
         )
-        return py_version_score, plat_score, abi_score, extra_score
+        return tag_priority, py_version_score, plat_score, abi_score, extra_score
 
     def __eq__(self, other):
         # type: (Any) -> bool
@@ -314,12 +420,25 @@ class Candidate(object):  # pylint: disable=too-many-instance-attributes
         )
 
 
-def process_distribution(source, filename):
-    # type: (str, str) -> Optional[Candidate]
+def process_distribution(source, filename, check_compatibility=False):
+    # type: (Any, str, bool) -> Optional[Candidate]
+    """Build a candidate from a distribution filename
+
+    Args:
+        source: Where the distribution came from, stored as the candidate's link
+        filename: Filename of the distribution
+        check_compatibility: Skip wheels whose ABI or platform tags can't be used by
+            this interpreter, without building a candidate for them
+
+    Returns:
+        The candidate, or None if the file is not a usable distribution
+    """
     candidate = None
     if filename.endswith(".egg"):
         return None
     if ".whl" in filename:
+        if check_compatibility and not _wheel_filename_compatible(filename):
+            return None
         candidate = _wheel_candidate(source, filename)
     elif (
         ".tar.gz" in filename
@@ -334,6 +453,23 @@ def process_distribution(source, filename):
     return candidate
 
 
+def _wheel_filename_compatible(filename):
+    # type: (str) -> bool
+    """Check whether this interpreter supports any of the tags of a wheel filename.
+    Filenames that can't be split into tags are left for _wheel_candidate to report"""
+    data_parts = os.path.basename(filename).split("-")
+    if len(data_parts) < 5:
+        return True
+    return (
+        _wheel_tag_priority(
+            data_parts[-3].split("."),
+            data_parts[-2],
+            data_parts[-1].rsplit(".whl", 1)[0],
+        )
+        is not None
+    )
+
+
 def _wheel_candidate(source, filename):
     # type: (str, str) -> Optional[Candidate]
     filename = os.path.basename(filename)
@@ -352,7 +488,7 @@ def _wheel_candidate(source, filename):
     abi = data_parts[3]
     #  Convert old-style post-versions to new style so it will sort correctly
     version = parse_version(data_parts[1].replace("_", "-"))
-    plat = data_parts[4].split(".")[0]
+    plat = data_parts[4].rsplit(".whl", 1)[0]
 
     requires_python = WheelVersionTags(tuple(data_parts[2].split(".")))
 
@@ -386,12 +522,15 @@ def _tar_gz_candidate(source, filename):
 
 def _check_platform_compatibility(py_platform):
     # type: (str) -> bool
-    return py_platform == "any" or (py_platform.lower() in PLATFORM_TAGS)
+    return any(
+        plat == "any" or plat in _PLATFORM_SCORES
+        for plat in py_platform.lower().split(".")
+    )
 
 
 def _check_abi_compatibility(abi):
     # type: (str) -> bool
-    return abi in ABI_TAGS
+    return abi in _ABI_SCORES
 
 
 class BaseRepository(object):
@@ -409,6 +548,15 @@ class BaseRepository(object):
         """
         raise NotImplementedError()
 
+    def prefetch(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Hint that a candidate for the requirement will soon be requested. Repositories
+        that can fetch in the background may start doing so. The default does nothing
+
+        Args:
+            req: Requirement that will be looked up
+        """
+
 
 class CantUseReason(enum.Enum):
     U_CAN_USE = 0
@@ -419,6 +567,7 @@ class CantUseReason(enum.Enum):
     BAD_METADATA = 6
     NAME_DOESNT_MATCH = 7
     WRONG_ABI = 8
+    IS_YANKED = 9
 
 
 def sort_candidates(candidates):
@@ -434,8 +583,12 @@ def sort_candidates(candidates):
     return sorted(candidates, key=lambda x: x.sortkey, reverse=True)
 
 
-def check_usability(req, candidate, has_equality=None, allow_prereleases=False):
-    # type: (pkg_resources.Requirement, Candidate, bool, bool) -> Optional[CantUseReason]
+def _check_compatibility(candidate):
+    # type: (Candidate) -> Optional[CantUseReason]
+    """Check whether a candidate can be installed into this interpreter at all"""
+    if candidate.tag_priority is not None:
+        return None
+
     if (
         candidate.py_version is not None
         and not candidate.py_version.check_compatibility()
@@ -448,9 +601,33 @@ def check_usability(req, candidate, has_equality=None, allow_prereleases=False):
     if not _check_platform_compatibility(candidate.platform):
         return CantUseReason.WRONG_PLATFORM
 
+    if isinstance(candidate.py_version, WheelVersionTags) and (
+        candidate.py_version.py_version
+    ):
+        # Each tag is fine on its own, but this interpreter doesn't support any
+        # of their combinations (e.g. cp39-none-any)
+        return CantUseReason.WRONG_PYTHON_VERSION
+
+    return None
+
+
+def check_usability(req, candidate, has_equality=None, allow_prereleases=False):
+    # type: (pkg_resources.Requirement, Candidate, bool, bool) -> Optional[CantUseReason]
+    reason = _check_compatibility(candidate)
+    if reason is not None:
+        return reason
+    return _check_version(req, candidate, has_equality, allow_prereleases)
+
+
+def _check_version(req, candidate, has_equality, allow_prereleases):
+    # type: (pkg_resources.Requirement, Candidate, Optional[bool], bool) -> Optional[CantUseReason]
     if not has_equality and not allow_prereleases and candidate.version.is_prerelease:
         return CantUseReason.IS_PRERELEASE
 
+    # Yanked files are only considered when explicitly pinned, per PEP 592
+    if candidate.yanked and not has_equality:
+        return CantUseReason.IS_YANKED
+
     if req is not None and not req.specifier.contains(  # type: ignore[attr-defined]
         candidate.version, prereleases=has_equality or allow_prereleases
     ):
@@ -486,6 +663,71 @@ def _is_all_prereleases(candidates):
     return all_prereleases
 
 
+class CandidateIndex(object):
+    """The candidates of a single project, sorted once from best to worst and with
+    the ones that can't be installed into this interpreter removed. Lookups narrow
+    the candidates down to the allowed versions with a binary search before
+    checking each remaining candidate against the requirement"""
+
+    def __init__(self, candidates):
+        # type: (Iterable[Candidate]) -> None
+        self.source = candidates
+        candidates = list(candidates)
+        self._members = candidates
+        self.all_prereleases = _is_all_prereleases(candidates)
+        self.unversioned = [
+            candidate for candidate in candidates if candidate.version is None
+        ]
+        self.candidates = sort_candidates(
+            candidate
+            for candidate in candidates
+            if candidate.version is not None
+            and _check_compatibility(candidate) is None
+        )
+        # Ascending, for bisect. Local version labels are ignored by the bounds
+        self._versions = [
+            parse_version(candidate.version.public)
+            for candidate in reversed(self.candidates)
+        ]
+
+    def built_from(self, candidates):
+        # type: (Iterable[Candidate]) -> bool
+        """Whether the index holds exactly the given candidates. Iterators can only
+        be read once, so they are never considered the same"""
+        if candidates is self.source:
+            return True
+        if not isinstance(candidates, (list, tuple)) or len(candidates) != len(
+            self._members
+        ):
+            return False
+        return all(
+            candidate is member for candidate, member in zip(candidates, self._members)
+        )
+
+    def matching(self, req, allow_prereleases=False):
+        # type: (pkg_resources.Requirement, bool) -> Iterable[Candidate]
+        """Yield the candidates that satisfy the requirement, best first"""
+        has_equality = (
+            req_compile.utils.is_pinned_requirement(req) if req is not None else False
+        )
+        total = len(self.candidates)
+        # Intervals are ascending and disjoint, so walking them backwards preserves
+        # the best first order
+        for interval in reversed(VersionSet.from_requirement(req).intervals):
+            start = 0
+            if interval.lower is not None:
+                start = bisect.bisect_left(self._versions, interval.lower)
+            end = total
+            if interval.upper is not None:
+                end = bisect.bisect_right(self._versions, interval.upper)
+            for candidate in self.candidates[total - end : total - start]:
+                if (
+                    _check_version(req, candidate, has_equality, allow_prereleases)
+                    is None
+                ):
+                    yield candidate
+
+
 class Repository(BaseRepository):
     def __init__(self, logger_name, allow_prerelease=None):
         # type: (str, bool) -> None
@@ -494,6 +736,7 @@ class Repository(BaseRepository):
             allow_prerelease = False
         self.logger = logging.getLogger("req_compile.repository").getChild(logger_name)
         self.allow_prerelease = allow_prerelease
+        self._candidate_indexes = {}  # type: Dict[str, CandidateIndex]
 
     def __eq__(self, other):
         return self.allow_prerelease == other.allow_prerelease
@@ -547,19 +790,13 @@ class Repository(BaseRepository):
             The distribution and whether or not it was cached
         """
         allow_prereleases = force_allow_prerelease or self.allow_prerelease
+        index = self._candidate_index(req, candidates)
         if candidates:
-            filtered_candidates = filter_candidates(
-                req, candidates, allow_prereleases=allow_prereleases
-            )
+            for candidate in index.unversioned:
+                self.logger.warning("Found candidate with no version: %s", candidate)
             tried_versions = set()
 
-            for candidate in sort_candidates(filtered_candidates):
-                if candidate.version is None:
-                    self.logger.warning(
-                        "Found candidate with no version: %s", candidate
-                    )
-                    continue
-
+            for candidate in index.matching(req, allow_prereleases=allow_prereleases):
                 if candidate.type == DistributionType.SDIST:
                     self.logger.warning(
                         "Considering source distribution for %s", candidate.name
@@ -582,7 +819,7 @@ class Repository(BaseRepository):
                     break
 
         if (
-            _is_all_prereleases(candidates) or req_compile.utils.has_prerelease(req)
+            index.all_prereleases or req_compile.utils.has_prerelease(req)
         ) and not allow_prereleases:
             self.logger.debug(
                 "No non-prerelease candidates available. Now allowing prereleases"
@@ -596,6 +833,17 @@ class Repository(BaseRepository):
 
         raise NoCandidateException(req)
 
+    def _candidate_index(self, req, candidates):
+        # type: (pkg_resources.Requirement, Iterable[Candidate]) -> CandidateIndex
+        """Get the index of a project's candidates. Repositories may build a new
+        list for each lookup of a project, so the index is reused for as long as
+        it holds the same candidates"""
+        key = normalize_project_name(req.project_name)
+        index = self._candidate_indexes.get(key)
+        if index is None or not index.built_from(candidates):
+            index = self._candidate_indexes[key] = CandidateIndex(candidates)
+        return index
+
     def why_cant_I_use(self, req, candidate):  # pylint: disable=invalid-name
         # type: (pkg_resources.Requirement, Candidate) -> CantUseReason
         reason = check_usability(
@@ -144,7 +144,7 @@ def _add_sources(req, sources, result, origin):
             reverse_dep = None
         reason = _create_metadata_req(req, metadata, name, constraint)
         if reverse_dep is not None:
-            reverse_dep.metadata.reqs.append(reason)
+            reverse_dep.metadata.add_requirement(reason)
         result.add_dist(metadata.name, reverse_dep, reason)
 
 
@@ -1,16 +1,17 @@
 import itertools
 import logging
 import os
-from collections import defaultdict
-from typing import Dict, Iterable, Optional
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
 
 try:
     from functools32 import lru_cache  # type: ignore
 except ImportError:
     from functools import lru_cache
 
+import packaging.markers
 import packaging.version
 import pkg_resources
+from packaging.markers import Marker
 
 
 def _req_iter_from_file(reqfile_name):
@@ -56,14 +57,22 @@ def reqs_from_files(requirements_files):
 
 def reduce_requirements(raw_reqs):
     """Reduce a list of requirements to a minimal list by combining requirements with the same key"""
-    reqs = defaultdict(lambda: None)
+    constraints = {}  # type: Dict[str, Constraint]
     for req in raw_reqs:
-        reqs[req.name] = merge_requirements(reqs[req.name], req)
+        constraint = constraints.get(req.name)
+        if constraint is None:
+            constraints[req.name] = Constraint(req)
+        else:
+            constraint.merge(req)
 
-    return list(reqs.values())
+    return [constraint.to_requirement() for constraint in constraints.values()]
 
 
-@lru_cache(maxsize=None)
+# Maximum number of parsed requirements to keep
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_requirement(req_text):
     # type: (str) -> Optional[pkg_resources.Requirement]
     """
@@ -117,6 +126,71 @@ def merge_extras(extras1, extras2):
     return tuple(sorted(set(extras1) | set(extras2)))
 
 
+def _merge_markers(marker1, marker2):
+    # type: (Optional[Marker], Optional[Marker]) -> Optional[Marker]
+    if not marker1 or not marker2:
+        return None
+    marker1_str = str(marker1)
+    marker2_str = str(marker2)
+    if marker1_str == marker2_str or marker1_str in marker2_str:
+        return marker1
+    if marker2_str in marker1_str:
+        return marker2
+    return None
+
+
+class Constraint(object):
+    """All of the constraints placed on a single project, merged in place. Merging
+    requirements into a Constraint avoids building and parsing a new Requirement
+    for every merge. Convert it with to_requirement once merging is done"""
+
+    __slots__ = ("name", "specs", "extras", "marker", "_requirement")
+
+    def __init__(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        self.name = normalize_project_name(req.project_name)
+        self.specs = frozenset(req.specs or [])  # type: FrozenSet[Tuple[str, str]]
+        self.extras = req.extras  # type: Tuple[str, ...]
+        self.marker = req.marker  # type: Optional[packaging.markers.Marker]
+
+        # The requirement this was built from, until something is merged into it
+        self._requirement = req  # type: Optional[pkg_resources.Requirement]
+
+    def __repr__(self):
+        return "Constraint({})".format(self.to_requirement())
+
+    def merge(self, req):
+        # type: (pkg_resources.Requirement) -> None
+        """Further constrain the project with a requirement"""
+        if self.name != normalize_project_name(req.project_name):
+            raise ValueError(
+                "Reqs don't match: {} != {}".format(self.to_requirement(), req)
+            )
+        if req.specs:
+            self.specs = self.specs.union(req.specs)
+        self.marker = _merge_markers(self.marker, req.marker)
+        self.extras = merge_extras(self.extras, req.extras)
+        self._requirement = None
+
+    def to_requirement(self):
+        # type: () -> pkg_resources.Requirement
+        """Build a requirement that would satisfy all of the merged requirements"""
+        if self._requirement is None:
+            extras_str = ""
+            if self.extras:
+                extras_str = "[" + ",".join(self.extras) + "]"
+            marker_str = ""
+            if self.marker:
+                marker_str = ";" + str(self.marker)
+            self._requirement = parse_requirement(
+                self.name
+                + extras_str
+                + ",".join("".join(parts) for parts in self.specs)
+                + marker_str
+            )
+        return self._requirement
+
+
 def merge_requirements(req1, req2):
     # type: (Optional[pkg_resources.Requirement], Optional[pkg_resources.Requirement]) -> pkg_resources.Requirement
     """Merge two requirements into a single requirement that would satisfy both"""
@@ -128,36 +202,9 @@ def merge_requirements(req1, req2):
     assert req1 is not None
     assert req2 is not None
 
-    req1_name_norm = normalize_project_name(req1.project_name)
-    if req1_name_norm != normalize_project_name(req2.project_name):
-        raise ValueError("Reqs don't match: {} != {}".format(req1, req2))
-    all_specs = set(req1.specs or []) | set(req2.specs or [])
-
-    # Handle markers
-    if req1.marker and req2.marker:
-        if str(req1.marker) != str(req2.marker):
-            if str(req1.marker) in str(req2.marker):
-                new_marker = ";" + str(req1.marker)
-            elif str(req2.marker) in str(req1.marker):
-                new_marker = ";" + str(req2.marker)
-            else:
-                new_marker = ""
-        else:
-            new_marker = ";" + str(req1.marker)
-    else:
-        new_marker = ""
-
-    extras = merge_extras(req1.extras, req2.extras)
-    extras_str = ""
-    if extras:
-        extras_str = "[" + ",".join(extras) + "]"
-    req_str = (
-        req1_name_norm
-        + extras_str
-        + ",".join("".join(parts) for parts in all_specs)
-        + new_marker
-    )
-    return parse_requirement(req_str)
+    constraint = Constraint(req1)
+    constraint.merge(req2)
+    return constraint.to_requirement()
 
 
 NAME_CACHE = {}  # type: Dict[str, str]
@@ -172,6 +219,40 @@ def normalize_project_name(project_name):
     return value
 
 
+MARKER_CACHE = {}  # type: Dict[Tuple[str, Optional[str]], bool]
+
+
+def evaluate_marker(marker, extra):
+    # type: (packaging.markers.Marker, Optional[str]) -> bool
+    """Evaluate a marker in the current environment with the given extra. Results are
+    shared between all identical markers"""
+    key = (str(marker), extra)
+    result = MARKER_CACHE.get(key)
+    if result is None:
+        result = MARKER_CACHE[key] = marker.evaluate({"extra": extra})
+    return result
+
+
+def marker_extras(marker):
+    # type: (Optional[packaging.markers.Marker]) -> Set[str]
+    """Find the names of the extras a marker compares against"""
+    extras = set()  # type: Set[str]
+    if marker is None:
+        return extras
+    to_visit = list(marker._markers)  # pylint: disable=protected-access
+    while to_visit:
+        item = to_visit.pop()
+        if isinstance(item, list):
+            to_visit.extend(item)
+        elif isinstance(item, tuple) and len(item) == 3:
+            lhs, _, rhs = item
+            if lhs.value == "extra":
+                extras.add(rhs.value)
+            elif rhs.value == "extra":
+                extras.add(lhs.value)
+    return extras
+
+
 def filter_req(req, extra):
     """Apply an extra using a requirements markers and return True if this requirement is kept"""
     if extra and not req.marker:
@@ -180,7 +261,7 @@ def filter_req(req, extra):
     if req.marker:
         if not extra:
             extra = None
-        keep_req = req.marker.evaluate({"extra": extra})
+        keep_req = evaluate_marker(req.marker, extra)
     return keep_req
 
 
@@ -1,26 +1,216 @@
+"""Reasoning about the sets of versions allowed by version specifiers"""
+from collections import namedtuple
+from typing import Iterable, List, Optional
+
+import packaging.version
 import pkg_resources
 
-PART_MAX = "999999999"
+from req_compile.utils import lru_cache, parse_version
+
+# One contiguous range of versions. A bound of None is unbounded
+_Interval = namedtuple("_Interval", "lower lower_inclusive upper upper_inclusive")
+
+_EVERYTHING = _Interval(None, False, None, False)
+
+
+def _is_empty_interval(interval):
+    # type: (_Interval) -> bool
+    if interval.lower is None or interval.upper is None:
+        return False
+    if interval.lower == interval.upper:
+        return not (interval.lower_inclusive and interval.upper_inclusive)
+    return interval.lower > interval.upper
+
 
+def _max_lower(interval1, interval2):
+    if interval1.lower is None:
+        return interval2.lower, interval2.lower_inclusive
+    if interval2.lower is None or interval1.lower > interval2.lower:
+        return interval1.lower, interval1.lower_inclusive
+    if interval1.lower == interval2.lower:
+        return (
+            interval1.lower,
+            interval1.lower_inclusive and interval2.lower_inclusive,
+        )
+    return interval2.lower, interval2.lower_inclusive
 
-def _offset_minor_version(version, offset, pos=2):
-    parts = str(version).split(".")
-    while len(parts) < 3:
-        parts += ["0"]
 
-    cur_version = int(parts[pos])
-    if cur_version == 0 and offset < 0:
-        if pos == 0:
-            raise ValueError("Cannot create a version less than 0")
-        parts[pos] = PART_MAX
-        return _offset_minor_version(
-            pkg_resources.parse_version(".".join(parts)), -1, pos=pos - 1
+def _min_upper(interval1, interval2):
+    if interval1.upper is None:
+        return interval2.upper, interval2.upper_inclusive
+    if interval2.upper is None or interval1.upper < interval2.upper:
+        return interval1.upper, interval1.upper_inclusive
+    if interval1.upper == interval2.upper:
+        return (
+            interval1.upper,
+            interval1.upper_inclusive and interval2.upper_inclusive,
         )
-    parts[pos] = str(int(parts[pos]) + offset)
-    return pkg_resources.parse_version(".".join(parts))
+    return interval2.upper, interval2.upper_inclusive
 
 
-def is_possible(req):  # pylint: disable=too-many-branches
+def _ends_first(interval1, interval2):
+    # type: (_Interval, _Interval) -> bool
+    if interval1.upper is None:
+        return False
+    if interval2.upper is None or interval1.upper < interval2.upper:
+        return True
+    return (
+        interval1.upper == interval2.upper
+        and not interval1.upper_inclusive
+        and interval2.upper_inclusive
+    )
+
+
+class VersionSet(object):
+    """An immutable set of versions, stored as a sorted list of disjoint intervals.
+
+    Versions are compared by their public part, as local version labels are ignored
+    by all specifiers that order versions. Where a specifier can't be represented
+    exactly (e.g. > excluding post releases) the set is widened, so an empty set
+    always means that nothing can satisfy the specifiers"""
+
+    __slots__ = ("intervals",)
+
+    def __init__(self, intervals):
+        # type: (Iterable[_Interval]) -> None
+        self.intervals = [
+            interval for interval in intervals if not _is_empty_interval(interval)
+        ]  # type: List[_Interval]
+
+    def __repr__(self):
+        return "VersionSet({})".format(self.intervals)
+
+    def __contains__(self, version):
+        # type: (packaging.version.Version) -> bool
+        version = parse_version(version.public)
+        for interval in self.intervals:
+            if interval.lower is not None and (
+                version < interval.lower
+                or (version == interval.lower and not interval.lower_inclusive)
+            ):
+                return False
+            if interval.upper is None or (
+                version < interval.upper
+                or (version == interval.upper and interval.upper_inclusive)
+            ):
+                return True
+        return False
+
+    @classmethod
+    def everything(cls):
+        # type: () -> VersionSet
+        return cls([_EVERYTHING])
+
+    @classmethod
+    def from_requirement(cls, req):
+        # type: (Optional[pkg_resources.Requirement]) -> VersionSet
+        """Build the set of versions allowed by all of the specifiers of a requirement"""
+        result = cls.everything()
+        if req is not None:
+            for spec in req.specifier:  # type: ignore[attr-defined]
+                result = result.intersection(
+                    _specifier_versions(spec.operator, spec.version)
+                )
+        return result
+
+    def is_empty(self):
+        # type: () -> bool
+        return not self.intervals
+
+    def intersection(self, other):
+        # type: (VersionSet) -> VersionSet
+        intervals = []
+        idx = other_idx = 0
+        while idx < len(self.intervals) and other_idx < len(other.intervals):
+            interval = self.intervals[idx]
+            other_interval = other.intervals[other_idx]
+            intervals.append(
+                _Interval(
+                    *(
+                        _max_lower(interval, other_interval)
+                        + _min_upper(interval, other_interval)
+                    )
+                )
+            )
+            if _ends_first(interval, other_interval):
+                idx += 1
+            else:
+                other_idx += 1
+        return VersionSet(intervals)
+
+    def isdisjoint(self, other):
+        # type: (VersionSet) -> bool
+        return self.intersection(other).is_empty()
+
+
+def _prefix_interval(epoch, release):
+    # type: (int, List[int]) -> _Interval
+    """All versions starting with the given release segment, e.g. 1.2.*"""
+    epoch_str = "{}!".format(epoch) if epoch else ""
+    lower = "{}{}.dev0".format(epoch_str, ".".join(str(part) for part in release))
+    upper = "{}{}.dev0".format(
+        epoch_str,
+        ".".join(str(part) for part in release[:-1] + [release[-1] + 1]),
+    )
+    return _Interval(parse_version(lower), True, parse_version(upper), False)
+
+
+def _complement(interval):
+    # type: (_Interval) -> List[_Interval]
+    return [
+        _Interval(None, False, interval.lower, not interval.lower_inclusive),
+        _Interval(interval.upper, not interval.upper_inclusive, None, False),
+    ]
+
+
+@lru_cache(maxsize=None)
+def _specifier_versions(operator, version_str):
+    # type: (str, str) -> VersionSet
+    """Build the set of versions allowed by a single specifier"""
+    try:
+        if version_str.endswith(".*"):
+            prefix = parse_version(version_str[:-2])
+            if prefix.public != str(prefix.base_version) or prefix.local:
+                return VersionSet.everything()
+            interval = _prefix_interval(prefix.epoch, list(prefix.release))
+            if operator == "==":
+                return VersionSet([interval])
+            if operator == "!=":
+                return VersionSet(_complement(interval))
+            return VersionSet.everything()
+
+        version = parse_version(version_str)
+        if not getattr(version, "release", None):
+            # Legacy versions can't be ordered against release segments
+            return VersionSet.everything()
+    except (ValueError, TypeError, AttributeError):
+        return VersionSet.everything()
+
+    public = parse_version(version.public)
+    exact = _Interval(public, True, public, True)
+    if operator in ("==", "==="):
+        return VersionSet([exact])
+    if operator == "!=":
+        if version.local:
+            # Only excludes one local version of the release
+            return VersionSet.everything()
+        return VersionSet(_complement(exact))
+    if operator == ">":
+        return VersionSet([_Interval(public, False, None, False)])
+    if operator == ">=":
+        return VersionSet([_Interval(public, True, None, False)])
+    if operator == "<":
+        return VersionSet([_Interval(None, False, public, False)])
+    if operator == "<=":
+        return VersionSet([_Interval(None, False, public, True)])
+    if operator == "~=" and len(version.release) > 1:
+        prefix = _prefix_interval(version.epoch, list(version.release[:-1]))
+        return VersionSet([_Interval(public, True, prefix.upper, False)])
+    return VersionSet.everything()
+
+
+def is_possible(req):
+    # type: (Optional[pkg_resources.Requirement]) -> bool
     """
     Determine whether or not the requirement with its given specifiers is even possible.
 
@@ -30,40 +220,4 @@ def is_possible(req):  # pylint: disable=too-many-branches
     Returns:
         (bool) Whether or not the constraint can be satisfied
     """
-    lower_bound = pkg_resources.parse_version("0.0.0")
-    exact = None
-    not_equal = []
-    upper_bound = pkg_resources.parse_version("{max}.{max}.{max}".format(max=PART_MAX))
-    for spec in req.specifier:
-        version = pkg_resources.parse_version(spec.version)
-        if spec.operator == "==":
-            if exact is None:
-                exact = version
-            if exact != version:
-                return False
-        if spec.operator == "!=":
-            not_equal.append(version)
-        elif spec.operator == ">":
-            if version > lower_bound:
-                lower_bound = _offset_minor_version(version, 1)
-        elif spec.operator == ">=":
-            if version >= lower_bound:
-                lower_bound = version
-        elif spec.operator == "<":
-            if version < upper_bound:
-                upper_bound = _offset_minor_version(version, -1)
-        elif spec.operator == "<=":
-            if version <= upper_bound:
-                upper_bound = version
-    # Some kind of parsing error occurred
-    if upper_bound is None or lower_bound is None:
-        return True
-    if upper_bound < lower_bound:
-        return False
-    if exact is not None:
-        if exact > upper_bound or exact < lower_bound:
-            return False
-    for check in not_equal:
-        if check == exact:
-            return False
-    return True
+    return not VersionSet.from_requirement(req).is_empty()
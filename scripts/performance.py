@@ -11,3 +11,11 @@ if __name__ == '__main__':
     print(timeit.timeit(stmt="scripts.run_dists.run_build_constraints()",
                         setup="import scripts.run_dists; scripts.run_dists.setup_build_constraints()",
                         number=10000))
+    print('Build constraints, large graph')
+    print(timeit.timeit(stmt="scripts.run_dists.run_large_build_constraints()",
+                        setup="import scripts.run_dists; scripts.run_dists.setup_large_graph()",
+                        number=50))
+    print('Generate lines, large graph')
+    print(timeit.timeit(stmt="scripts.run_dists.run_large_generate_lines()",
+                        setup="import scripts.run_dists; scripts.run_dists.setup_large_graph()",
+                        number=50))
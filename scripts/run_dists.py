@@ -33,3 +33,25 @@ def run_build_constraints():
     global dists
     result = dists['b'].build_constraints()
     return result
+
+
+def setup_large_graph():
+    global dists
+    dists = DistributionCollection()
+    project_count = 300
+    for idx in range(project_count):
+        reqs = ['proj{}>={}.0'.format(dep, idx % 3) for dep in range(idx + 1, min(idx + 6, project_count))]
+        reqs.append('proj{}[extra]; extra == "extra"'.format((idx + 7) % project_count))
+        info = DistInfo('proj{}'.format(idx), pkg_resources.parse_version('1.0.0'), pkg_resources.parse_requirements(reqs))
+        dists.add_dist(info, None, pkg_resources.Requirement.parse('proj{}[extra]'.format(idx)))
+
+
+def run_large_build_constraints():
+    global dists
+    for node in dists:
+        node.build_constraints()
+
+
+def run_large_generate_lines():
+    global dists
+    return dists.generate_lines([dists['proj0']])
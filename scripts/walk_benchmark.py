@@ -0,0 +1,157 @@
+"""Benchmark discovering source directories in a large synthetic tree, comparing
+the parallel walker against the os.walk based one it replaced"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from req_compile.repos import source
+from req_compile.repos.source import SPECIAL_DIRS, SourceRepository
+
+
+def legacy_find_all_source_dirs(path, excluded_paths, marker_files):
+    """SourceRepository._find_all_source_dirs before the parallel walker"""
+    for root, dirs, files in os.walk(path):
+        has_marker = False
+        for dir_ in list(dirs):
+            if (
+                dir_ in SPECIAL_DIRS
+                or dir_.endswith(".egg-info")
+                or dir_.endswith(".dist-info")
+            ):
+                dirs.remove(dir_)
+            else:
+                for excluded_path in excluded_paths:
+                    if os.path.join(root, dir_).startswith(excluded_path):
+                        dirs.remove(dir_)
+                        break
+            if dir_ in marker_files:
+                has_marker = True
+                break
+
+        if root != path and has_marker:
+            continue
+
+        root_is_valid = False
+        for filename in files:
+            if root != path and filename in marker_files:
+                dirs[:] = []
+                root_is_valid = False
+                break
+
+            if filename in ("setup.py", "pyproject.toml"):
+                root_is_valid = True
+
+        if root_is_valid:
+            for dir_ in list(dirs):
+                if (
+                    dir_ == "tests"
+                    or dir_ == "test"
+                    or dir_.endswith("-tests")
+                    or dir_.endswith("-test")
+                ):
+                    dirs.remove(dir_)
+            yield root
+
+
+def build_tree(root, directories):
+    """Create a monorepo-like tree of roughly the given number of directories:
+    groups of projects, each with a package, tests, build output and plain
+    directories of data"""
+    per_project = 11
+    projects = max(1, directories // per_project)
+    groups = max(1, int(projects ** 0.5))
+    created = 0
+    for project in range(projects):
+        project_dir = os.path.join(
+            root, "group{}".format(project % groups), "project{}".format(project)
+        )
+        for subdir in ("pkg", "tests", "build", "docs/api", "data/a/b/c/d"):
+            os.makedirs(os.path.join(project_dir, *subdir.split("/")))
+        created += per_project
+        with open(os.path.join(project_dir, "setup.py"), "w") as handle:
+            handle.write("from setuptools import setup\nsetup(name='p')\n")
+        open(os.path.join(project_dir, "pkg", "__init__.py"), "w").close()
+    return created + groups
+
+
+def excluded_paths_for(root, count):
+    return [
+        os.path.join(root, "group0", "project{}".format(project))
+        for project in range(count)
+    ] + [os.path.join(root, "missing{}".format(index)) for index in range(count)]
+
+
+def _time(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--directories", type=int, default=50000)
+    parser.add_argument("--excluded", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated latency of listing a directory, as on a network file system",
+    )
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="walk-benchmark")
+    original_scandir = getattr(os, "scandir", None)
+    try:
+        created = build_tree(root, args.directories)
+        excluded = excluded_paths_for(root, args.excluded)
+        repo = SourceRepository.__new__(SourceRepository)
+        repo.path = root
+        repo.marker_files = set(source.MARKER_FILES)
+        repo.index = None
+
+        if args.latency_ms and original_scandir is not None:
+
+            def _slow_scandir(path="."):
+                time.sleep(args.latency_ms / 1000.0)
+                return original_scandir(path)
+
+            os.scandir = _slow_scandir
+
+        legacy_time, legacy = _time(
+            lambda: set(
+                legacy_find_all_source_dirs(root, excluded, repo.marker_files)
+            ),
+            args.repeat,
+        )
+        # pylint: disable=protected-access
+        parallel_time, parallel = _time(
+            lambda: set(repo._find_all_source_dirs(excluded)), args.repeat
+        )
+        assert legacy == parallel, "The walkers found different source directories"
+
+        print("Directories created: {}".format(created))
+        print("Source directories found: {}".format(len(parallel)))
+        print("os.walk:  {:.3f}s".format(legacy_time))
+        print(
+            "parallel: {:.3f}s ({:.1f}x)".format(
+                parallel_time, legacy_time / parallel_time
+            )
+        )
+    finally:
+        if original_scandir is not None:
+            os.scandir = original_scandir
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ setup(
         "console_scripts": [
             "req-compile = req_compile.cmdline:compile_main",
             "req-candidates = req_compile.candidates:candidates_main",
+            "req-compile-cache = req_compile.cache:cache_main",
         ],
     },
     python_requires=">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*",
@@ -27,6 +27,7 @@ def clear_caches():
     """Fixture to automatically clear the LRU cache for
     the requirement parsing cache"""
     req_compile.utils.parse_requirement.cache_clear()
+    req_compile.utils.MARKER_CACHE.clear()
 
 
 @pytest.fixture
@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import pytest
+import responses
+
+from req_compile.cache import cache_main
+from req_compile.repos import artifactcache, hashmanifest
+from req_compile.repos.artifactcache import (
+    ArtifactCache,
+    get_artifact_cache,
+    parse_size,
+)
+from req_compile.repos.hashmanifest import get_manifest
+from req_compile.repos.pypi import _do_download
+
+CONTENTS = b"wheel contents" * 1000
+SHA = hashlib.sha256(CONTENTS).hexdigest()
+LINK = ("https://files/", "thing-1.0-py3-none-any.whl#sha256=" + SHA)
+LOGGER = logging.getLogger("test")
+
+
+@pytest.fixture
+def mocked_responses():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        yield rsps
+
+
+@pytest.fixture(autouse=True)
+def clear_registries():
+    artifactcache._CACHES.clear()
+    hashmanifest._MANIFESTS.clear()
+    yield
+    artifactcache._CACHES.clear()
+    hashmanifest._MANIFESTS.clear()
+
+
+def _write_artifact(directory, name, size, last_used):
+    path = directory.join(name)
+    path.write_binary(b"x" * size)
+    os.utime(str(path), (last_used, last_used))
+    return path
+
+
+def _visible(directory):
+    return sorted(name for name in os.listdir(str(directory)) if name[0] != ".")
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("100", 100),
+        ("2K", 2048),
+        ("500M", 500 * 1024 ** 2),
+        ("1.5g", int(1.5 * 1024 ** 3)),
+        ("10GB", 10 * 1024 ** 3),
+    ],
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_parse_size_invalid():
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_prune_least_recently_used(tmpdir):
+    now = time.time()
+    _write_artifact(tmpdir, "old.whl", 100, now - 300)
+    _write_artifact(tmpdir, "middle.whl", 100, now - 200)
+    _write_artifact(tmpdir, "new.whl", 100, now - 100)
+    tmpdir.join(".req-compile-hashes.json").write("{}")
+
+    cache = ArtifactCache(str(tmpdir))
+    get_manifest(str(tmpdir)).record(str(tmpdir.join("old.whl")), "abc")
+    assert cache.size() == 300
+
+    assert cache.prune(250) == (1, 100)
+    assert _visible(tmpdir) == ["middle.whl", "new.whl"]
+    assert os.path.exists(str(tmpdir.join(".req-compile-hashes.json")))
+    assert get_manifest(str(tmpdir)).entries == {}
+
+    assert cache.prune(0) == (2, 200)
+    assert _visible(tmpdir) == []
+
+
+def test_prune_skips_locked_files(tmpdir):
+    now = time.time()
+    _write_artifact(tmpdir, "old.whl", 100, now - 300)
+    _write_artifact(tmpdir, "new.whl", 100, now - 100)
+
+    cache = ArtifactCache(str(tmpdir))
+    with cache.lock(str(tmpdir.join("old.whl"))):
+        assert cache.prune(0) == (1, 100)
+    assert _visible(tmpdir) == ["old.whl"]
+
+
+def test_file_lock_non_blocking(tmpdir):
+    lock_file = str(tmpdir.join("a.lock"))
+    with artifactcache.file_lock(lock_file):
+        with pytest.raises(artifactcache.FileLocked):
+            with artifactcache.file_lock(lock_file, blocking=False):
+                pass
+    with artifactcache.file_lock(lock_file, blocking=False):
+        pass
+
+
+def test_hit_marks_file_used(tmpdir):
+    now = time.time()
+    old = _write_artifact(tmpdir, "old.whl", 100, now - 300)
+    _write_artifact(tmpdir, "new.whl", 100, now - 100)
+    get_manifest(str(tmpdir)).record(str(old), "abc")
+
+    cache = ArtifactCache(str(tmpdir))
+    cache.record_hit(str(old))
+    assert cache.stats() == {"hits": 1, "misses": 0}
+    # The hash manifest still trusts the file
+    assert get_manifest(str(tmpdir)).verified_hash(str(old)) == "abc"
+
+    cache.prune(100)
+    assert _visible(tmpdir) == ["old.whl"]
+
+
+def test_prune_removes_stale_partials(tmpdir):
+    stale = _write_artifact(
+        tmpdir,
+        ".download-stale.part",
+        10,
+        time.time() - artifactcache.STALE_PARTIAL_AGE - 10,
+    )
+    fresh = _write_artifact(tmpdir, ".download-fresh.part", 10, time.time())
+
+    ArtifactCache(str(tmpdir)).prune(1000)
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_download_counts_and_reuses(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET,
+        "https://files/thing-1.0-py3-none-any.whl",
+        body=CONTENTS,
+        status=200,
+    )
+    _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+
+    assert get_artifact_cache(str(tmpdir)).stats() == {"hits": 1, "misses": 1}
+    assert len(mocked_responses.calls) == 1
+
+
+def test_failed_download_leaves_nothing(mocked_responses, tmpdir, mocker):
+    mocked_responses.add(
+        responses.GET,
+        "https://files/thing-1.0-py3-none-any.whl",
+        body=CONTENTS,
+        status=200,
+    )
+    mocker.patch("requests.models.Response.iter_content", side_effect=IOError("Reset"))
+    with pytest.raises(IOError):
+        _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    assert os.listdir(str(tmpdir)) == [artifactcache.LOCK_DIR]
+
+
+def test_concurrent_downloads_share_file(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET,
+        "https://files/thing-1.0-py3-none-any.whl",
+        body=CONTENTS,
+        status=200,
+    )
+    results = []
+
+    def _download():
+        results.append(_do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir)))
+
+    threads = [threading.Thread(target=_download) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(mocked_responses.calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True, True]
+    assert _visible(tmpdir) == ["thing.whl"]
+
+
+def test_cache_main_prune(tmpdir, capsys):
+    now = time.time()
+    _write_artifact(tmpdir, "old.whl", 100, now - 300)
+    _write_artifact(tmpdir, "new.whl", 100, now - 100)
+
+    cache_main(["prune", str(tmpdir), "--max-size", "150"])
+
+    assert _visible(tmpdir) == ["new.whl"]
+    assert "1 files, 100 bytes" in capsys.readouterr().out
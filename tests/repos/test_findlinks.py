@@ -2,6 +2,8 @@ import os
 import subprocess
 import sys
 
+import pkg_resources
+
 from req_compile.repos.findlinks import FindLinksRepository
 
 
@@ -19,3 +21,28 @@ def test_find_links(tmpdir):
     candidates = list(repo.get_candidates(None))
     assert len(candidates) == 1
     assert candidates[0].name == "req_compile"
+
+
+def test_candidate_index_reused(tmpdir, mocker):
+    """Each lookup builds a new candidate list, the sorted candidates are reused"""
+    for version in ("1.0", "2.0"):
+        tmpdir.join("thing-{}-py2.py3-none-any.whl".format(version)).write("")
+    repo = FindLinksRepository(str(tmpdir))
+    mocker.patch.object(
+        repo, "resolve_candidate", side_effect=lambda candidate: (candidate, True)
+    )
+    req = pkg_resources.Requirement.parse("thing")
+
+    first, _ = repo.get_candidate(req)
+    index = repo._candidate_indexes["thing"]
+    second, _ = repo.get_candidate(req)
+    assert first is second
+    assert first.version == pkg_resources.parse_version("2.0")
+    assert repo._candidate_indexes["thing"] is index
+
+    # New files are picked up
+    tmpdir.join("thing-3.0-py2.py3-none-any.whl").write("")
+    repo.links = []
+    repo._find_all_links()
+    third, _ = repo.get_candidate(req)
+    assert third.version == pkg_resources.parse_version("3.0")
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import os
+
+import pytest
+import responses
+
+from req_compile.repos import hashmanifest
+from req_compile.repos.hashmanifest import HashManifest, MANIFEST_NAME, get_manifest
+from req_compile.repos.pypi import HashMismatchError, _do_download
+
+CONTENTS = b"wheel contents" * 1000
+SHA = hashlib.sha256(CONTENTS).hexdigest()
+LINK = ("https://files/", "thing-1.0-py3-none-any.whl#sha256=" + SHA)
+LOGGER = logging.getLogger("test")
+
+
+@pytest.fixture
+def mocked_responses():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        yield rsps
+
+
+@pytest.fixture(autouse=True)
+def clear_manifests():
+    hashmanifest._MANIFESTS.clear()
+    yield
+    hashmanifest._MANIFESTS.clear()
+
+
+def test_manifest_detects_changes(tmpdir):
+    path = tmpdir.join("thing.whl")
+    path.write_binary(CONTENTS)
+    manifest = HashManifest(str(tmpdir))
+    manifest.record(str(path), SHA)
+
+    assert HashManifest(str(tmpdir)).verified_hash(str(path)) == SHA
+
+    path.write_binary(CONTENTS + b"changed")
+    assert manifest.verified_hash(str(path)) is None
+
+
+def test_manifest_merges_concurrent_changes(tmpdir):
+    paths = [tmpdir.join(name) for name in ("a.whl", "b.whl", "c.whl")]
+    for path in paths:
+        path.write_binary(CONTENTS)
+    first = HashManifest(str(tmpdir))
+    first.record(str(paths[0]), SHA)
+    # Another process, which read the manifest before
+    second = HashManifest(str(tmpdir))
+    first.record(str(paths[1]), SHA)
+    second.record(str(paths[2]), SHA)
+    second.forget([str(paths[0])])
+
+    assert sorted(HashManifest(str(tmpdir)).entries) == ["b.whl", "c.whl"]
+    assert sorted(second.entries) == ["b.whl", "c.whl"]
+
+
+def test_corrupt_manifest_ignored(tmpdir):
+    tmpdir.join(MANIFEST_NAME).write("{not json")
+    assert HashManifest(str(tmpdir)).entries == {}
+
+
+def test_download_records_hash(mocked_responses, tmpdir, mocker):
+    mocked_responses.add(
+        responses.GET,
+        "https://files/thing-1.0-py3-none-any.whl",
+        body=CONTENTS,
+        status=200,
+    )
+    filename, cached = _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    assert not cached
+    assert get_manifest(str(tmpdir)).verified_hash(filename) == SHA
+
+    # Reusing the file trusts the manifest instead of hashing it again
+    hashmanifest._MANIFESTS.clear()
+    mock_hash = mocker.patch("req_compile.repos.pypi.hash_file")
+    filename, cached = _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    assert cached
+    assert not mock_hash.called
+    assert len(mocked_responses.calls) == 1
+
+
+def test_mismatched_download_not_recorded(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET,
+        "https://files/thing-1.0-py3-none-any.whl",
+        body=b"something else",
+        status=200,
+    )
+    with pytest.raises(HashMismatchError):
+        _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    assert [
+        name for name in os.listdir(str(tmpdir)) if not name.startswith(".")
+    ] == []
+    assert get_manifest(str(tmpdir)).entries == {}
+
+
+def test_existing_file_hashed_and_recorded(tmpdir):
+    path = tmpdir.join("thing.whl")
+    path.write_binary(CONTENTS)
+    filename, cached = _do_download(LOGGER, "thing.whl", LINK, None, str(tmpdir))
+    assert cached
+    assert filename == str(path)
+    assert get_manifest(str(tmpdir)).verified_hash(str(path)) == SHA
@@ -0,0 +1,108 @@
+import io
+import zipfile
+
+import pkg_resources
+import pytest
+import requests
+import responses
+
+from req_compile.repos.lazywheel import RangeRequestsUnsupported, fetch_wheel_metadata
+from req_compile.repos.pypi import PyPIRepository
+
+INDEX_URL = "https://pypi.org"
+WHEEL_NAME = "pytest-4.3.0-py2.py3-none-any.whl"
+WHEEL_URL = "https://files/" + WHEEL_NAME
+
+
+def _build_wheel():
+    contents = io.BytesIO()
+    with zipfile.ZipFile(contents, "w", zipfile.ZIP_STORED) as zfile:
+        for idx in range(200):
+            zfile.writestr(
+                "pytest/module{}.py".format(idx), "x = {}\n".format(idx) * 500
+            )
+        zfile.writestr(
+            "pytest-4.3.0.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: pytest\nVersion: 4.3.0\n"
+            "Requires-Dist: six (>=1.10.0)\n",
+        )
+    return contents.getvalue()
+
+
+@pytest.fixture
+def wheel_server():
+    wheel = _build_wheel()
+
+    def _serve(supports_ranges):
+        def _head(_):
+            headers = {"Content-Length": str(len(wheel))}
+            if supports_ranges:
+                headers["Accept-Ranges"] = "bytes"
+            return 200, headers, b""
+
+        def _get(request):
+            range_header = request.headers.get("Range")
+            if not supports_ranges or range_header is None:
+                return 200, {}, wheel
+            start, end = range_header.replace("bytes=", "").split("-")
+            return 206, {}, wheel[int(start) : int(end) + 1]
+
+        rsps = responses.RequestsMock(assert_all_requests_are_fired=False)
+        rsps.add_callback(responses.HEAD, WHEEL_URL, callback=_head)
+        rsps.add_callback(responses.GET, WHEEL_URL, callback=_get)
+        return rsps, wheel
+
+    return _serve
+
+
+def test_fetch_metadata_with_ranges(wheel_server):
+    rsps, wheel = wheel_server(True)
+    with rsps:
+        result = fetch_wheel_metadata(WHEEL_URL, WHEEL_NAME, requests.Session())
+        fetched = sum(
+            len(call.response.content)
+            for call in rsps.calls
+            if call.request.method == "GET"
+        )
+
+    assert result.name == "pytest"
+    assert result.version == pkg_resources.parse_version("4.3.0")
+    assert fetched < len(wheel) / 10
+
+
+def test_fetch_metadata_without_ranges(wheel_server):
+    rsps, _ = wheel_server(False)
+    with rsps:
+        with pytest.raises(RangeRequestsUnsupported):
+            fetch_wheel_metadata(WHEEL_URL, WHEEL_NAME, requests.Session())
+
+
+@pytest.mark.parametrize("supports_ranges", [True, False])
+def test_pypi_lazy_wheels(wheel_server, tmpdir, mocker, supports_ranges):
+    rsps, _ = wheel_server(supports_ranges)
+    rsps.add(
+        responses.GET,
+        INDEX_URL + "/pytest/",
+        body='<a href="{}">{}</a>'.format(WHEEL_URL, WHEEL_NAME),
+    )
+    mock_extract = mocker.patch("req_compile.repos.pypi.extract_metadata")
+    mock_extract.return_value.name = "pytest"
+    with rsps:
+        repo = PyPIRepository(INDEX_URL, str(tmpdir), lazy_wheels=True)
+        metadata, cached = repo.get_candidate(
+            pkg_resources.Requirement.parse("pytest")
+        )
+
+    assert not cached
+    if supports_ranges:
+        assert metadata.name == "pytest"
+        assert metadata.origin is repo
+        assert not mock_extract.called
+        assert tmpdir.listdir() == []
+    else:
+        assert metadata is mock_extract.return_value
+        assert [
+            path.basename
+            for path in tmpdir.listdir()
+            if not path.basename.startswith(".")
+        ] == [WHEEL_NAME]
@@ -0,0 +1,149 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pkg_resources
+import pytest
+import responses
+
+from req_compile.containers import DistInfo
+from req_compile.repos.findlinks import FindLinksRepository
+from req_compile.repos.metadatacache import MetadataCache, file_key, link_key
+from req_compile.repos.pypi import PyPIRepository
+
+INDEX_URL = "https://pypi.org"
+WHEEL_NAME = "pytest-4.3.0-py2.py3-none-any.whl"
+
+
+def _build_wheel():
+    contents = io.BytesIO()
+    with zipfile.ZipFile(contents, "w") as zfile:
+        zfile.writestr(
+            "pytest-4.3.0.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: pytest\nVersion: 4.3.0\n"
+            "Requires-Dist: six (>=1.10.0)\n"
+            "Requires-Dist: mock ; extra == 'test'\n",
+        )
+    return contents.getvalue()
+
+
+WHEEL = _build_wheel()
+PAGE = '<a href="https://files/{name}#sha256={sha}">{name}</a>'.format(
+    name=WHEEL_NAME, sha=hashlib.sha256(WHEEL).hexdigest()
+)
+
+
+@pytest.fixture
+def mocked_responses():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        yield rsps
+
+
+@pytest.fixture
+def metadata_cache(tmpdir):
+    cache = MetadataCache(str(tmpdir.join("cache", "metadata.sqlite3")))
+    yield cache
+    cache.close()
+
+
+def test_round_trip(metadata_cache):
+    reqs = [
+        pkg_resources.Requirement.parse("six>=1.10"),
+        pkg_resources.Requirement.parse('mock; extra == "test"'),
+    ]
+    metadata_cache.put(
+        "sha256:abc", DistInfo("pytest", pkg_resources.parse_version("4.3.0"), reqs)
+    )
+
+    result = metadata_cache.get("sha256:abc")
+    assert result.name == "pytest"
+    assert result.version == pkg_resources.parse_version("4.3.0")
+    assert [str(req) for req in result.requires()] == ["six>=1.10"]
+    assert [str(req) for req in result.requires("test")] == ['mock; extra == "test"']
+    assert metadata_cache.get("sha256:other") is None
+    assert metadata_cache.get(None) is None
+
+
+def test_meta_results_not_stored(metadata_cache):
+    metadata_cache.put("key", DistInfo("-", None, [], meta=True))
+    metadata_cache.put("key", None)
+    assert metadata_cache.get("key") is None
+
+
+def test_link_key():
+    assert link_key("https://files/a.whl#sha256=ABC") == "sha256:abc"
+    assert link_key("https://files/a.whl") is None
+
+
+def test_source_keys_depend_on_environment(tmpdir, mocker):
+    sdist = tmpdir.join("a-1.0.tar.gz")
+    sdist.write("1")
+    keys = (link_key("https://files/a-1.0.tar.gz#sha256=ABC"), file_key(str(sdist)))
+    assert keys[0].startswith("sha256:abc:")
+
+    mocker.patch(
+        "req_compile.repos.metadatacache.SOURCE_ENVIRONMENT", "cpython2.7-win32-amd64"
+    )
+    assert link_key("https://files/a-1.0.tar.gz#sha256=ABC") != keys[0]
+    assert file_key(str(sdist)) != keys[1]
+    assert link_key("https://files/a.whl#sha256=ABC") == "sha256:abc"
+
+
+def test_file_key_changes_with_file(tmpdir):
+    path = tmpdir.join("a.whl")
+    path.write("1")
+    first = file_key(str(path))
+    path.write("22")
+    assert file_key(str(path)) != first
+    assert file_key(str(tmpdir.join("missing.whl"))) is None
+
+
+def test_pypi_skips_download_when_cached(mocked_responses, tmpdir, metadata_cache):
+    mocked_responses.add(responses.GET, INDEX_URL + "/pytest/", body=PAGE, status=200)
+    mocked_responses.add(
+        responses.GET, "https://files/" + WHEEL_NAME, body=WHEEL, status=200
+    )
+    req = pkg_resources.Requirement.parse("pytest")
+
+    repo = PyPIRepository(
+        INDEX_URL, str(tmpdir.mkdir("first")), metadata_cache=metadata_cache
+    )
+    metadata, cached = repo.get_candidate(req)
+    assert not cached
+    assert len(mocked_responses.calls) == 2
+
+    repo = PyPIRepository(
+        INDEX_URL, str(tmpdir.mkdir("second")), metadata_cache=metadata_cache
+    )
+    cached_metadata, cached = repo.get_candidate(req)
+    assert cached
+    assert cached_metadata.origin is repo
+    assert cached_metadata.name == metadata.name
+    assert cached_metadata.version == metadata.version
+    assert [str(dep) for dep in cached_metadata.requires("test")] == [
+        str(dep) for dep in metadata.requires("test")
+    ]
+    # The wheel was only downloaded by the first repository
+    downloads = [
+        call for call in mocked_responses.calls if WHEEL_NAME in call.request.url
+    ]
+    assert len(downloads) == 1
+    assert os.listdir(str(tmpdir.join("second"))) == []
+
+
+def test_find_links_uses_cache(tmpdir, metadata_cache, mocker):
+    links = tmpdir.mkdir("links")
+    links.join(WHEEL_NAME).write_binary(WHEEL)
+    req = pkg_resources.Requirement.parse("pytest")
+
+    repo = FindLinksRepository(str(links), metadata_cache=metadata_cache)
+    metadata, _ = repo.get_candidate(req)
+    assert metadata.version == pkg_resources.parse_version("4.3.0")
+
+    mock_extract = mocker.patch("req_compile.metadata.extract_metadata")
+    repo = FindLinksRepository(str(links), metadata_cache=metadata_cache)
+    cached_metadata, _ = repo.get_candidate(req)
+    assert not mock_extract.called
+    assert cached_metadata.origin is repo
+    assert cached_metadata.version == metadata.version
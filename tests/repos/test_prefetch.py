@@ -0,0 +1,194 @@
+import threading
+
+import mock
+import pkg_resources
+
+from req_compile.containers import DistInfo
+from req_compile.repos import Repository
+from req_compile.repos.prefetch import PrefetchRepository
+from req_compile.repos.repository import Candidate, DistributionType
+
+
+class FakeRepository(Repository):
+    def __init__(self):
+        super(FakeRepository, self).__init__("test")
+        self.get_candidates = mock.MagicMock(side_effect=self._get_candidates)
+        self.resolve_candidate = mock.MagicMock(side_effect=self._resolve_candidate)
+
+    def __repr__(self):
+        return "fake"
+
+    def get_candidates(self, req):
+        pass
+
+    def resolve_candidate(self, candidate):
+        pass
+
+    def _get_candidates(self, req):
+        return [
+            Candidate(
+                req.project_name,
+                "{}-{}-py2.py3-none-any.whl".format(req.project_name, version),
+                pkg_resources.parse_version(version),
+                None,
+                None,
+                "any",
+                None,
+                DistributionType.WHEEL,
+            )
+            for version in ("1.0", "2.0")
+        ]
+
+    def _resolve_candidate(self, candidate):
+        return DistInfo(candidate.name, candidate.version, []), False
+
+    def close(self):
+        pass
+
+
+def _prefetch(repo, name):
+    """Prefetch a project and wait for it to complete"""
+    repo.prefetch(pkg_resources.Requirement.parse(name))
+    repo.pending[name].finished.wait()
+
+
+def test_prefetched_candidate_is_used():
+    inner = FakeRepository()
+    repo = PrefetchRepository(inner)
+    try:
+        _prefetch(repo, "aaa")
+
+        dist, _ = repo.get_candidate(pkg_resources.Requirement.parse("aaa"))
+        assert dist.version == pkg_resources.parse_version("2.0")
+
+        assert inner.get_candidates.call_count == 1
+        assert inner.resolve_candidate.call_count == 1
+        assert (repo.page_hits, repo.page_misses) == (1, 0)
+        assert (repo.metadata_hits, repo.metadata_misses) == (1, 0)
+    finally:
+        repo.close()
+
+
+def test_different_candidate_is_resolved():
+    inner = FakeRepository()
+    repo = PrefetchRepository(inner)
+    try:
+        _prefetch(repo, "aaa")
+
+        dist, _ = repo.get_candidate(pkg_resources.Requirement.parse("aaa<2"))
+        assert dist.version == pkg_resources.parse_version("1.0")
+
+        assert inner.resolve_candidate.call_count == 2
+        assert (repo.metadata_hits, repo.metadata_misses) == (0, 1)
+    finally:
+        repo.close()
+
+
+def test_prefetch_used_once():
+    inner = FakeRepository()
+    repo = PrefetchRepository(inner)
+    try:
+        _prefetch(repo, "aaa")
+        repo.get_candidate(pkg_resources.Requirement.parse("aaa"))
+        assert "aaa" not in repo.pending
+
+        repo.get_candidate(pkg_resources.Requirement.parse("aaa"))
+        assert inner.get_candidates.call_count == 2
+        assert inner.resolve_candidate.call_count == 2
+        assert (repo.page_hits, repo.page_misses) == (1, 1)
+        assert (repo.metadata_hits, repo.metadata_misses) == (1, 1)
+    finally:
+        repo.close()
+
+
+def test_queued_prefetch_not_waited_for():
+    inner = FakeRepository()
+    release = threading.Event()
+    # Never left waiting if the lookup waits after all
+    timer = threading.Timer(10, release.set)
+    timer.start()
+    get_candidates = inner.get_candidates.side_effect
+    inner.get_candidates.side_effect = lambda req: (
+        req.project_name != "aaa" or release.wait()
+    ) and get_candidates(req)
+    repo = PrefetchRepository(inner, workers=1)
+    try:
+        repo.prefetch(pkg_resources.Requirement.parse("aaa"))
+        repo.prefetch(pkg_resources.Requirement.parse("bbb"))
+
+        dist, _ = repo.get_candidate(pkg_resources.Requirement.parse("bbb"))
+        assert dist.name == "bbb"
+        assert not release.is_set()
+        assert (repo.page_hits, repo.page_misses) == (0, 1)
+    finally:
+        release.set()
+        timer.cancel()
+        repo.close()
+    # The abandoned prefetch did nothing
+    assert [
+        call[0][0].project_name for call in inner.get_candidates.call_args_list
+    ].count("bbb") == 1
+
+
+def test_other_candidate_not_waited_for():
+    inner = FakeRepository()
+    release = threading.Event()
+    timer = threading.Timer(10, release.set)
+    timer.start()
+    resolve_candidate = inner.resolve_candidate.side_effect
+    inner.resolve_candidate.side_effect = lambda candidate: (
+        str(candidate.version) != "2.0" or release.wait()
+    ) and resolve_candidate(candidate)
+    repo = PrefetchRepository(inner)
+    try:
+        repo.prefetch(pkg_resources.Requirement.parse("aaa"))
+        repo.pending["aaa"].page_fetched.wait()
+
+        dist, _ = repo.get_candidate(pkg_resources.Requirement.parse("aaa<2"))
+        assert dist.version == pkg_resources.parse_version("1.0")
+        assert not release.is_set()
+        assert (repo.metadata_hits, repo.metadata_misses) == (0, 1)
+    finally:
+        release.set()
+        timer.cancel()
+        repo.close()
+
+
+def test_not_prefetched():
+    inner = FakeRepository()
+    repo = PrefetchRepository(inner)
+    try:
+        repo.get_candidate(pkg_resources.Requirement.parse("aaa"))
+
+        assert (repo.page_hits, repo.page_misses) == (0, 1)
+        assert (repo.metadata_hits, repo.metadata_misses) == (0, 1)
+    finally:
+        repo.close()
+
+
+def test_queue_is_bounded():
+    inner = FakeRepository()
+    release = threading.Event()
+    inner.get_candidates.side_effect = lambda req: release.wait() and []
+    repo = PrefetchRepository(inner, max_queued=1)
+    try:
+        repo.prefetch(pkg_resources.Requirement.parse("aaa"))
+        repo.prefetch(pkg_resources.Requirement.parse("bbb"))
+        repo.prefetch(pkg_resources.Requirement.parse("aaa"))
+        assert repo.dropped == 1
+    finally:
+        release.set()
+        repo.close()
+
+
+def test_stopped_repository_still_resolves():
+    inner = FakeRepository()
+    repo = PrefetchRepository(inner)
+    repo.prefetch(pkg_resources.Requirement.parse("aaa"))
+    repo.stop()
+    repo.prefetch(pkg_resources.Requirement.parse("bbb"))
+
+    dist, _ = repo.get_candidate(pkg_resources.Requirement.parse("bbb"))
+    assert dist.name == "bbb"
+    assert repo.page_misses == 1
+    repo.close()
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import pkg_resources
 import requests
@@ -7,6 +8,8 @@ import pytest
 
 from req_compile.repos.repository import Candidate, WheelVersionTags, DistributionType
 import req_compile.repos.pypi
+import req_compile.repos.repository
+from req_compile.repos.pagecache import PageCache
 from req_compile.repos.pypi import PyPIRepository, check_python_compatibility
 
 INDEX_URL = "https://pypi.org"
@@ -27,7 +30,17 @@ def read_contents():
     return _do_read
 
 
-def test_successful_numpy(mocked_responses, tmpdir, read_contents):
+@pytest.fixture
+def all_wheels_compatible(mocker):
+    """Parse every wheel on a page, regardless of the tags of this interpreter"""
+    mocker.patch(
+        "req_compile.repos.repository._wheel_filename_compatible", return_value=True
+    )
+
+
+def test_successful_numpy(
+    mocked_responses, tmpdir, read_contents, all_wheels_compatible
+):
     wheeldir = str(tmpdir)
     mocked_responses.add(
         responses.GET,
@@ -44,6 +57,26 @@ def test_successful_numpy(mocked_responses, tmpdir, read_contents):
     assert len(mocked_responses.calls) == 1
 
 
+def test_numpy_skips_incompatible_wheels(mocked_responses, tmpdir, read_contents):
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/numpy/",
+        body=read_contents("numpy.html"),
+        status=200,
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+
+    candidates = repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+
+    assert 0 < len(candidates) < 1127 - 34
+    for candidate in candidates:
+        reason = req_compile.repos.repository.check_usability(None, candidate)
+        assert reason not in (
+            req_compile.repos.repository.CantUseReason.WRONG_ABI,
+            req_compile.repos.repository.CantUseReason.WRONG_PLATFORM,
+        )
+
+
 def test_no_candidates(mocked_responses, tmpdir):
     wheeldir = str(tmpdir)
     mocked_responses.add(responses.GET, INDEX_URL + "/garbage/", status=404)
@@ -75,13 +108,20 @@ def test_resolve_new_numpy(mocked_responses, tmpdir, read_contents, mocker):
 
     repo = PyPIRepository(INDEX_URL, wheeldir)
     candidates = repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+    contents = read_contents("numpy.whl-contents")
     for candidate in candidates:
         if "1.16.3" in candidate.link[1]:
+            # The downloaded file is checked against the hash in its link
+            url, link = candidate.link
+            candidate.link = (
+                url,
+                "{}#sha256={}".format(
+                    link.split("#")[0],
+                    hashlib.sha256(contents.encode("utf-8")).hexdigest(),
+                ),
+            )
             mocked_responses.add(
-                responses.GET,
-                candidate.link[1],
-                body=read_contents("numpy.whl-contents"),
-                status=200,
+                responses.GET, link.split("#")[0], body=contents, status=200
             )
 
     mock_extract = mocker.MagicMock()
@@ -92,7 +132,7 @@ def test_resolve_new_numpy(mocked_responses, tmpdir, read_contents, mocker):
     assert candidate is not None
     assert not cached
 
-    listing = tmpdir.listdir()
+    listing = [path for path in tmpdir.listdir() if not path.basename.startswith(".")]
     assert len(listing) == 1
     assert "1.16.3" in str(listing[0])
     assert ".whl" in str(listing[0])
@@ -110,7 +150,12 @@ def test_resolve_new_numpy(mocked_responses, tmpdir, read_contents, mocker):
     ],
 )
 def test_python_requires_wheel_tags(
-    mocked_responses, tmpdir, mock_py_version, read_contents, url_to_check
+    mocked_responses,
+    tmpdir,
+    mock_py_version,
+    read_contents,
+    url_to_check,
+    all_wheels_compatible,
 ):
     mock_py_version("3.7.12")
 
@@ -272,3 +317,252 @@ def test_wheel_platform_specific_tags():
         "test",
         DistributionType.WHEEL,
     )
+
+
+def test_page_cache_revalidates(mocked_responses, tmpdir, read_contents):
+    page_cache = PageCache(str(tmpdir.mkdir("cache")))
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/numpy/",
+        body=read_contents("numpy.html"),
+        status=200,
+        headers={"ETag": '"abc"'},
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir), page_cache=page_cache)
+    candidates = repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+
+    mocked_responses.replace(responses.GET, INDEX_URL + "/numpy/", status=304)
+    repo = PyPIRepository(INDEX_URL, str(tmpdir), page_cache=page_cache)
+    cached_candidates = repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+
+    assert cached_candidates == candidates
+    assert len(mocked_responses.calls) == 2
+    assert mocked_responses.calls[1].request.headers["If-None-Match"] == '"abc"'
+
+
+def test_page_cache_fresh_skips_network(
+    mocked_responses, tmpdir, read_contents, all_wheels_compatible
+):
+    page_cache = PageCache(str(tmpdir.mkdir("cache")), max_age=3600)
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/numpy/",
+        body=read_contents("numpy.html"),
+        status=200,
+    )
+    for _ in range(2):
+        repo = PyPIRepository(INDEX_URL, str(tmpdir), page_cache=page_cache)
+        candidates = repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+        assert len(candidates) == 1127 - 34
+
+    assert len(mocked_responses.calls) == 1
+
+
+def test_page_cache_replaced_when_modified(mocked_responses, tmpdir, read_contents):
+    page_cache = PageCache(str(tmpdir.mkdir("cache")))
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/numpy/",
+        body=read_contents("numpy.html"),
+        status=200,
+        headers={"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir), page_cache=page_cache)
+    repo.get_candidates(pkg_resources.Requirement.parse("numpy"))
+
+    mocked_responses.replace(
+        responses.GET, INDEX_URL + "/numpy/", body="<html></html>", status=200
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir), page_cache=page_cache)
+    assert repo.get_candidates(pkg_resources.Requirement.parse("numpy")) == []
+    assert (
+        mocked_responses.calls[1].request.headers["If-Modified-Since"]
+        == "Wed, 21 Oct 2015 07:28:00 GMT"
+    )
+    assert page_cache.get(INDEX_URL + "/numpy").candidates == []
+
+
+def test_json_simple_api(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/pytest/",
+        json={
+            "meta": {"api-version": "1.0"},
+            "name": "pytest",
+            "files": [
+                {
+                    "filename": "pytest-4.3.0-py2.py3-none-any.whl",
+                    "url": "https://files/pytest-4.3.0-py2.py3-none-any.whl",
+                    "hashes": {"sha256": "HASH"},
+                },
+                {
+                    "filename": "pytest-4.2.0.tar.gz",
+                    "url": "https://files/pytest-4.2.0.tar.gz",
+                    "hashes": {},
+                    "requires-python": "<2",
+                },
+                {
+                    "filename": "pytest-4.1.0.tar.gz",
+                    "url": "https://files/pytest-4.1.0.tar.gz",
+                    "hashes": {},
+                    "yanked": "Broken",
+                },
+            ],
+        },
+        content_type="application/vnd.pypi.simple.v1+json",
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+
+    candidates = repo.get_candidates(pkg_resources.Requirement.parse("pytest"))
+
+    assert "application/vnd.pypi.simple.v1+json" in (
+        mocked_responses.calls[0].request.headers["Accept"]
+    )
+    assert [str(candidate.version) for candidate in candidates] == ["4.3.0", "4.1.0"]
+    assert candidates[0].link == (
+        INDEX_URL + "/pytest/",
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl#sha256=HASH",
+    )
+    assert not candidates[0].yanked
+    assert candidates[1].yanked
+
+
+def test_yanked_only_used_when_pinned(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET,
+        INDEX_URL + "/pytest/",
+        body='<a href="https://files/pytest-4.1.0.tar.gz" data-yanked="">'
+        "pytest-4.1.0.tar.gz</a>",
+        status=200,
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+    candidate = repo.get_candidates(pkg_resources.Requirement.parse("pytest"))[0]
+
+    assert candidate.yanked
+    assert (
+        req_compile.repos.repository.check_usability(
+            pkg_resources.Requirement.parse("pytest"), candidate
+        )
+        == req_compile.repos.repository.CantUseReason.IS_YANKED
+    )
+    assert (
+        req_compile.repos.repository.check_usability(
+            pkg_resources.Requirement.parse("pytest==4.1.0"),
+            candidate,
+            has_equality=True,
+        )
+        is None
+    )
+
+
+CORE_METADATA = (
+    b"Metadata-Version: 2.1\nName: pytest\nVersion: 4.3.0\n"
+    b"Requires-Dist: six (>=1.10.0)\n"
+)
+CORE_METADATA_PAGE = (
+    '<a href="https://files/pytest-4.3.0-py2.py3-none-any.whl#sha256={}" '
+    'data-core-metadata="sha256={}">pytest-4.3.0-py2.py3-none-any.whl</a>'
+).format(
+    hashlib.sha256(b"wheel").hexdigest(), hashlib.sha256(CORE_METADATA).hexdigest()
+)
+
+
+def test_core_metadata_skips_download(mocked_responses, tmpdir):
+    mocked_responses.add(
+        responses.GET, INDEX_URL + "/pytest/", body=CORE_METADATA_PAGE, status=200
+    )
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl.metadata",
+        body=CORE_METADATA,
+        status=200,
+    )
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+
+    candidate = repo.get_candidates(pkg_resources.Requirement.parse("pytest"))[0]
+    assert candidate.core_metadata == {
+        "sha256": hashlib.sha256(CORE_METADATA).hexdigest()
+    }
+
+    metadata, cached = repo.get_candidate(pkg_resources.Requirement.parse("pytest"))
+    assert not cached
+    assert metadata.name == "pytest"
+    assert metadata.version == pkg_resources.parse_version("4.3.0")
+    assert metadata.origin is repo
+    assert [str(req) for req in metadata.requires()] == ["six>=1.10.0"]
+    assert [call.request.url.split("#")[0] for call in mocked_responses.calls] == [
+        INDEX_URL + "/pytest/",
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl.metadata",
+    ]
+
+
+def test_core_metadata_falls_back_to_download(mocked_responses, tmpdir, mocker):
+    mocked_responses.add(
+        responses.GET, INDEX_URL + "/pytest/", body=CORE_METADATA_PAGE, status=200
+    )
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl.metadata",
+        status=404,
+    )
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl",
+        body="wheel",
+        status=200,
+    )
+    mock_extract = mocker.patch("req_compile.repos.pypi.extract_metadata")
+    mock_extract.return_value.name = "pytest"
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+
+    metadata, _ = repo.get_candidate(pkg_resources.Requirement.parse("pytest"))
+
+    assert metadata is mock_extract.return_value
+    assert len(mocked_responses.calls) == 3
+    assert [
+        name for name in os.listdir(str(tmpdir)) if not name.startswith(".")
+    ] == ["pytest-4.3.0-py2.py3-none-any.whl"]
+
+
+@pytest.mark.parametrize("metadata_status", [200, 404])
+def test_hash_mismatch_not_used(mocked_responses, tmpdir, mocker, metadata_status):
+    """A metadata file that doesn't match the index falls back to the distribution,
+    and a distribution that doesn't match is skipped for the next candidate"""
+    page = CORE_METADATA_PAGE + (
+        '<a href="https://files/pytest-4.2.0-py2.py3-none-any.whl#sha256={}">'
+        "pytest-4.2.0-py2.py3-none-any.whl</a>".format(
+            hashlib.sha256(b"old wheel").hexdigest()
+        )
+    )
+    mocked_responses.add(responses.GET, INDEX_URL + "/pytest/", body=page, status=200)
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl.metadata",
+        body=CORE_METADATA + b"Requires-Dist: tampered\n",
+        status=metadata_status,
+    )
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.3.0-py2.py3-none-any.whl",
+        body="tampered wheel",
+        status=200,
+    )
+    mocked_responses.add(
+        responses.GET,
+        "https://files/pytest-4.2.0-py2.py3-none-any.whl",
+        body="old wheel",
+        status=200,
+    )
+    mock_extract = mocker.patch("req_compile.repos.pypi.extract_metadata")
+    mock_extract.return_value.name = "pytest"
+    repo = PyPIRepository(INDEX_URL, str(tmpdir))
+
+    metadata, _ = repo.get_candidate(pkg_resources.Requirement.parse("pytest"))
+
+    assert metadata is mock_extract.return_value
+    mock_extract.assert_called_once_with(
+        os.path.join(str(tmpdir), "pytest-4.2.0-py2.py3-none-any.whl"), origin=repo
+    )
+    assert [
+        name for name in os.listdir(str(tmpdir)) if not name.startswith(".")
+    ] == ["pytest-4.2.0-py2.py3-none-any.whl"]
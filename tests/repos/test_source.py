@@ -3,6 +3,7 @@ import os
 import pkg_resources
 import pytest
 
+import req_compile.metadata
 from req_compile.errors import NoCandidateException
 from req_compile.repos.source import SourceRepository
 
@@ -61,3 +62,55 @@ def test_exclude_dirs(monorepo_dir):
     assert source_repo.get_candidates(pkg_resources.Requirement.parse("pkg4"))
     with pytest.raises(NoCandidateException):
         source_repo.get_candidate(pkg_resources.Requirement.parse("pkg3"))
+
+
+@pytest.fixture
+def extract_spy(mocker):
+    return mocker.spy(req_compile.metadata, "extract_metadata")
+
+
+def _extracted(extract_spy):
+    return sorted(
+        os.path.basename(call[0][0]) for call in extract_spy.call_args_list
+    )
+
+
+def test_lazy_extracts_requested(monorepo_dir, extract_spy):
+    source_repo = SourceRepository(monorepo_dir, lazy=True)
+    assert not extract_spy.called
+
+    result, _ = source_repo.get_candidate(pkg_resources.Requirement.parse("pkg2"))
+    assert result.name == "pkg2"
+    assert result.origin is source_repo
+    assert _extracted(extract_spy) == ["pkg2"]
+
+    source_repo.get_candidate(pkg_resources.Requirement.parse("pkg2"))
+    with pytest.raises(NoCandidateException):
+        source_repo.get_candidate(pkg_resources.Requirement.parse("pkg5"))
+    assert _extracted(extract_spy) == ["pkg2"]
+
+    assert sorted(
+        candidate.name for candidate in source_repo.get_candidates(None)
+    ) == ["pkg1", "pkg2", "pkg3", "pkg4"]
+    assert _extracted(extract_spy) == ["pkg1", "pkg2", "pkg3", "pkg4"]
+
+
+def test_lazy_undeclared_name(tmpdir, extract_spy):
+    """Projects whose name can't be read without extracting them are extracted up
+    front"""
+    tmpdir.join("declared", "setup.cfg").write(
+        "[metadata]\nname = declared\n", ensure=True
+    )
+    tmpdir.join("declared", "setup.py").write("from setuptools import setup\nsetup()\n")
+    tmpdir.join("computed", "setup.py").write(
+        "from setuptools import setup\n"
+        "import sys\n"
+        "setup(name=sys.argv[0] and 'computed', version='1.0')\n",
+        ensure=True,
+    )
+
+    source_repo = SourceRepository(str(tmpdir), lazy=True)
+    assert _extracted(extract_spy) == ["computed"]
+
+    assert source_repo.get_candidates(pkg_resources.Requirement.parse("declared"))
+    assert _extracted(extract_spy) == ["computed", "declared"]
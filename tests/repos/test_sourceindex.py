@@ -0,0 +1,220 @@
+import os
+import shutil
+import time
+
+import pkg_resources
+import pytest
+
+import req_compile.metadata
+from req_compile.repos.source import SourceRepository
+
+
+@pytest.fixture
+def monorepo(tmpdir):
+    source = os.path.join(os.path.dirname(__file__), "monorepo")
+    path = str(tmpdir.join("monorepo"))
+    shutil.copytree(source, path)
+    _age(path)
+    return path
+
+
+@pytest.fixture
+def index_file(tmpdir):
+    return str(tmpdir.join("cache", "sources.sqlite3"))
+
+
+@pytest.fixture
+def extract_spy(mocker):
+    return mocker.spy(req_compile.metadata, "extract_metadata")
+
+
+def _age(path):
+    """Move recent modification times in a tree far enough into the past for the
+    index to trust them"""
+    past = time.time() - 10
+    paths = [path]
+    for root, dirs, files in os.walk(path):
+        paths.extend(os.path.join(root, name) for name in dirs + files)
+    for changed in paths:
+        if os.stat(changed).st_mtime > past:
+            os.utime(changed, (past, past))
+
+
+def _extracted(extract_spy):
+    return sorted(
+        os.path.basename(call[0][0]) for call in extract_spy.call_args_list
+    )
+
+
+def _names(repo):
+    return sorted(candidate.name for candidate in repo.get_candidates(None))
+
+
+def test_reuse_unchanged(monorepo, index_file, extract_spy):
+    first = SourceRepository(monorepo, index_file=index_file)
+    assert first.index.misses == 4
+    assert _extracted(extract_spy) == ["pkg1", "pkg2", "pkg3", "pkg4"]
+
+    extract_spy.reset_mock()
+    second = SourceRepository(monorepo, index_file=index_file)
+    assert not extract_spy.called
+    assert second.index.hits == 4
+    assert _names(second) == _names(first)
+
+    result, _ = second.get_candidate(pkg_resources.Requirement.parse("pkg2"))
+    assert result.name == "pkg2"
+    assert result.origin is second
+
+
+def test_changed_project(monorepo, index_file, extract_spy):
+    SourceRepository(monorepo, index_file=index_file)
+
+    with open(os.path.join(monorepo, "pkg2", "setup.py"), "a") as handle:
+        handle.write("\n")
+    _age(monorepo)
+
+    extract_spy.reset_mock()
+    repo = SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg2"]
+    assert repo.get_candidate(pkg_resources.Requirement.parse("pkg2"))
+
+
+def test_added_and_removed_projects(monorepo, index_file, extract_spy):
+    SourceRepository(monorepo, index_file=index_file)
+
+    shutil.rmtree(os.path.join(monorepo, "pkg1"))
+    shutil.copytree(
+        os.path.join(monorepo, "subdir", "pkg3"), os.path.join(monorepo, "pkg6")
+    )
+    with open(os.path.join(monorepo, "pkg6", "setup.py")) as handle:
+        contents = handle.read()
+    with open(os.path.join(monorepo, "pkg6", "setup.py"), "w") as handle:
+        handle.write(contents.replace("pkg3", "pkg6"))
+    _age(monorepo)
+
+    extract_spy.reset_mock()
+    repo = SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg6"]
+    assert _names(repo) == ["pkg2", "pkg3", "pkg4", "pkg6"]
+
+    extract_spy.reset_mock()
+    repo = SourceRepository(monorepo, index_file=index_file)
+    assert not extract_spy.called
+    assert _names(repo) == ["pkg2", "pkg3", "pkg4", "pkg6"]
+
+
+def test_other_environment_extracts_again(monorepo, index_file, extract_spy, mocker):
+    """A setup.py may compute its requirements from the running interpreter"""
+    SourceRepository(monorepo, index_file=index_file)
+
+    mocker.patch(
+        "req_compile.repos.sourceindex.SOURCE_ENVIRONMENT", "cpython2.7-win32-amd64"
+    )
+    extract_spy.reset_mock()
+    SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg1", "pkg2", "pkg3", "pkg4"]
+
+    extract_spy.reset_mock()
+    SourceRepository(monorepo, index_file=index_file)
+    assert not extract_spy.called
+
+
+def test_recent_changes_not_trusted(monorepo, index_file, extract_spy):
+    """Files modified within the timestamp resolution may change again unseen"""
+    os.utime(os.path.join(monorepo, "pkg2", "setup.py"), None)
+    SourceRepository(monorepo, index_file=index_file)
+
+    extract_spy.reset_mock()
+    SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg2"]
+
+
+def test_exclusions_still_apply(monorepo, index_file):
+    SourceRepository(monorepo, index_file=index_file)
+    repo = SourceRepository(
+        monorepo,
+        excluded_paths=[os.path.join(monorepo, "subdir")],
+        marker_files=[".special_dir"],
+        index_file=index_file,
+    )
+    assert _names(repo) == ["pkg1", "pkg2"]
+
+
+def test_lazy_extractions_stored(monorepo, index_file, extract_spy):
+    repo = SourceRepository(monorepo, index_file=index_file, lazy=True)
+    assert repo.get_candidates(pkg_resources.Requirement.parse("pkg2"))
+    repo.close()
+    assert _extracted(extract_spy) == ["pkg2"]
+
+    extract_spy.reset_mock()
+    repo = SourceRepository(monorepo, index_file=index_file, lazy=True)
+    assert repo.index.hits == 1
+    assert repo.get_candidates(pkg_resources.Requirement.parse("pkg2"))
+    repo.close()
+    assert not extract_spy.called
+
+    # Projects never asked for are still extracted when a scan needs them
+    repo = SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg1", "pkg3", "pkg4"]
+    assert repo.index.hits == 1
+
+
+@pytest.mark.parametrize(
+    "files, changed",
+    [
+        # Requirement directories are tracked even if setup.py has to be run
+        (
+            {
+                "pkg2/setup.py": "from setuptools import setup\n"
+                "def read(name):\n"
+                "    with open(name) as handle:\n"
+                "        return handle.read().splitlines()\n"
+                "setup(name='pkg2', version='1.0',\n"
+                "      install_requires=read('requirements/base.txt'))\n",
+                "pkg2/requirements/base.txt": "requests\n",
+            },
+            "pkg2/requirements/base.txt",
+        ),
+        # Files the setup.py reads outside of its directory
+        (
+            {
+                "pkg2/setup.py": "import os\n"
+                "from setuptools import setup\n"
+                "here = os.path.dirname(__file__)\n"
+                "with open(os.path.join(here, '..', 'VERSION')) as handle:\n"
+                "    version = handle.read().strip()\n"
+                "setup(name='pkg2', version=version)\n",
+                "VERSION": "1.0",
+            },
+            "VERSION",
+        ),
+        (
+            {
+                "pkg2/setup.cfg": "[metadata]\nname = pkg2\n"
+                "long_description = file: docs/README.rst, CHANGES.rst\n",
+                "pkg2/docs/README.rst": "Readme",
+            },
+            "pkg2/docs/README.rst",
+        ),
+    ],
+)
+def test_read_files_tracked(monorepo, index_file, extract_spy, files, changed):
+    for name, contents in files.items():
+        path = os.path.join(monorepo, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(contents)
+    _age(monorepo)
+    SourceRepository(monorepo, index_file=index_file)
+
+    extract_spy.reset_mock()
+    SourceRepository(monorepo, index_file=index_file)
+    assert not extract_spy.called
+
+    with open(os.path.join(monorepo, changed), "a") as handle:
+        handle.write("\n")
+    _age(monorepo)
+    extract_spy.reset_mock()
+    SourceRepository(monorepo, index_file=index_file)
+    assert _extracted(extract_spy) == ["pkg2"]
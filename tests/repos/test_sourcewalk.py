@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from req_compile.repos.sourcewalk import PrefixTrie, list_dir, walk_parallel
+
+PREFIXES = [
+    os.path.join(os.sep, "src", "lib"),
+    os.path.join(os.sep, "src", "app", "vendor"),
+    os.path.join(os.sep, "other") + os.sep,
+]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        os.path.join(os.sep, "src", "lib"),
+        os.path.join(os.sep, "src", "lib", "pkg"),
+        os.path.join(os.sep, "src", "libs"),
+        os.path.join(os.sep, "src", "li"),
+        os.path.join(os.sep, "src", "app"),
+        os.path.join(os.sep, "src", "app", "vendored", "pkg"),
+        os.path.join(os.sep, "src", "app", "pkg"),
+        os.path.join(os.sep, "other"),
+        os.path.join(os.sep, "other", "pkg"),
+        os.path.join(os.sep, "others"),
+        os.path.join(os.sep, "src"),
+    ],
+)
+def test_prefix_trie_matches_startswith(path):
+    trie = PrefixTrie(PREFIXES)
+    expected = any(path.startswith(prefix) for prefix in PREFIXES)
+    assert trie.matches(path) == expected
+
+
+def test_prefix_trie_empty():
+    assert not PrefixTrie().matches(os.path.join(os.sep, "src"))
+    assert PrefixTrie([""]).matches(os.path.join(os.sep, "src"))
+
+
+def _make_tree(tmpdir):
+    for path in ("a/b/c", "a/skip/d", "e/f", "g"):
+        tmpdir.join(*path.split("/")).ensure(dir=True)
+    tmpdir.join("a", "b", "file.txt").write("")
+    tmpdir.join("e", "setup.py").write("")
+
+
+def _prune(root, dirs, files):
+    if "skip" in dirs:
+        dirs.remove("skip")
+    return root
+
+
+def test_walk_parallel_matches_os_walk(tmpdir):
+    _make_tree(tmpdir)
+
+    expected = []
+    for root, dirs, files in os.walk(str(tmpdir)):
+        expected.append(_prune(root, dirs, files))
+
+    assert sorted(walk_parallel(str(tmpdir), _prune, threads=2)) == sorted(expected)
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="Symlinks are not supported")
+def test_walk_parallel_does_not_follow_links(tmpdir):
+    _make_tree(tmpdir)
+    os.symlink(str(tmpdir.join("a")), str(tmpdir.join("link")))
+
+    dirs, files, links = list_dir(str(tmpdir))
+    assert sorted(dirs) == ["a", "e", "g", "link"]
+    assert links == ["link"]
+
+    visited = walk_parallel(str(tmpdir), lambda root, dirs, files: root)
+    assert str(tmpdir.join("link")) not in visited
+    assert str(tmpdir.join("a", "b", "c")) in visited
+
+
+def test_walk_parallel_missing_dir(tmpdir):
+    assert walk_parallel(str(tmpdir.join("missing")), _prune) == []
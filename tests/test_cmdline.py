@@ -54,6 +54,13 @@ def test_multiple_sources(compile_mock):
     ]
 
 
+@pytest.mark.parametrize("args", [["--jobs", "2"], ["--prefetch", "4"]])
+def test_in_process_setup_py_needs_one_thread(compile_mock, args):
+    with pytest.raises(SystemExit):
+        compile_main(["requirements.txt", "--setup-py-workers", "0"] + args)
+    assert not compile_mock.called
+
+
 def test_resolution_order(compile_mock):
     compile_main(
         [
@@ -91,6 +98,28 @@ def test_source_dirs_dont_hit_pypi(mocker, basic_compile_mock):
     assert perform_compile_args[0][0].name == "myproj"
 
 
+def test_metadata_cache_closed(mocker, basic_compile_mock, tmpdir):
+    mocker.patch("req_compile.cmdline._create_input_reqs")
+    compile_main(
+        [
+            "requirements.txt",
+            "--find-links",
+            str(tmpdir.mkdir("find-links")),
+            "--index-url",
+            "index",
+            "--prefetch",
+            "2",
+            "--cache-dir",
+            str(tmpdir.join("cache")),
+        ]
+    )
+
+    repos = list(basic_compile_mock.mock_calls[0][1][1])
+    assert [type(repo) for repo in repos] == [FindLinksRepository, PyPIRepository]
+    assert repos[0].metadata_cache is repos[1].metadata_cache
+    assert repos[0].metadata_cache.connection is None
+
+
 @pytest.fixture
 def mock_stdin(mocker):
     fake_stdin = StringIO()
@@ -5,7 +5,9 @@ import pytest
 from pytest import fixture
 
 import req_compile.compile
+import req_compile.dists
 import req_compile.errors
+import req_compile.metadata.source
 import req_compile.repos.pypi
 import req_compile.repos.repository
 import req_compile.utils
@@ -30,7 +32,7 @@ def _real_outputs(results):
 
 @fixture
 def perform_compile(mock_metadata, mock_pypi):
-    def _compile(scenario, index, reqs, constraint_reqs=None):
+    def _compile(scenario, index, reqs, constraint_reqs=None, jobs=1):
         if index is not None:
             index = [pkg_resources.Requirement.parse(req) for req in index]
         mock_pypi.load_scenario(scenario, index)
@@ -57,7 +59,7 @@ def perform_compile(mock_metadata, mock_pypi):
         ]
         return _real_outputs(
             req_compile.compile.perform_compile(
-                input_reqs, mock_pypi, constraint_reqs=constraint_reqs
+                input_reqs, mock_pypi, constraint_reqs=constraint_reqs, jobs=jobs
             )
         )
 
@@ -170,10 +172,13 @@ def perform_compile(mock_metadata, mock_pypi):
         ),
     ],
 )
-def test_simple_compile(perform_compile, scenario, index, reqs, constraints, results):
-    assert perform_compile(scenario, index, reqs, constraint_reqs=constraints) == set(
-        results
-    )
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_simple_compile(
+    perform_compile, scenario, index, reqs, constraints, results, jobs
+):
+    assert perform_compile(
+        scenario, index, reqs, constraint_reqs=constraints, jobs=jobs
+    ) == set(results)
 
 
 @pytest.mark.parametrize(
@@ -185,9 +190,25 @@ def test_simple_compile(perform_compile, scenario, index, reqs, constraints, res
         ("multi", ["x==1.0.0", "x==0.9.0", "y==5.0.0", "y==4.0.0"], ["y==5"], ["x>1"]),
     ],
 )
-def test_no_candidate(perform_compile, scenario, index, reqs, constraints):
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_no_candidate(perform_compile, scenario, index, reqs, constraints, jobs):
     with pytest.raises(req_compile.errors.NoCandidateException):
-        perform_compile(scenario, index, reqs, constraint_reqs=constraints)
+        perform_compile(scenario, index, reqs, constraint_reqs=constraints, jobs=jobs)
+
+
+def test_concurrent_fetch_isolates_setup_py(mocker):
+    """setup.py files can't run in this process while other threads fetch"""
+    mocker.patch.object(req_compile.metadata.source, "_SETUP_PY_POOL", None)
+    fetcher = req_compile.compile.FrontierFetcher(mocker.MagicMock(), 2)
+    assert req_compile.metadata.source._SETUP_PY_POOL is not None
+    fetcher.close()
+    assert req_compile.metadata.source._SETUP_PY_POOL is None
+
+    pool = mocker.MagicMock()
+    mocker.patch.object(req_compile.metadata.source, "_SETUP_PY_POOL", pool)
+    req_compile.compile.FrontierFetcher(mocker.MagicMock(), 2).close()
+    assert req_compile.metadata.source._SETUP_PY_POOL is pool
+    assert not pool.close.called
 
 
 @fixture
@@ -244,3 +265,110 @@ def test_compile_source_user2_recursive_root():
         "user-2==1.1.0",
         "util==8.0.0",
     }
+
+
+class ChainRepository(req_compile.repos.repository.Repository):
+    """Serves a chain of projects, each depending on the next one"""
+
+    def __init__(self, length):
+        super(ChainRepository, self).__init__("chain")
+        self.length = length
+
+    def get_candidates(self, req):
+        return [
+            req_compile.repos.repository.Candidate(
+                req.project_name,
+                req.project_name + "-1.0.tar.gz",
+                req_compile.utils.parse_version("1.0"),
+                None,
+                None,
+                "any",
+                None,
+            )
+        ]
+
+    def resolve_candidate(self, candidate):
+        index = int(candidate.name.split("-")[1])
+        reqs = []
+        if index + 1 < self.length:
+            reqs = [pkg_resources.Requirement.parse("chain-{}".format(index + 1))]
+        return DistInfo(candidate.name, candidate.version, reqs), False
+
+    def close(self):
+        pass
+
+
+def test_deep_graph():
+    results = req_compile.compile.perform_compile(
+        [DistInfo("test", None, [pkg_resources.Requirement.parse("chain-0")], meta=True)],
+        ChainRepository(250),
+    )
+    assert len(_real_outputs(results)) == 250
+
+
+class DictRepository(req_compile.repos.repository.Repository):
+    """Serves projects from a mapping of name to version to requirements"""
+
+    def __init__(self, projects):
+        super(DictRepository, self).__init__("dict")
+        self.projects = projects
+
+    def get_candidates(self, req):
+        return [
+            req_compile.repos.repository.Candidate(
+                req.project_name,
+                "{}-{}.tar.gz".format(req.project_name, version),
+                req_compile.utils.parse_version(version),
+                None,
+                None,
+                "any",
+                None,
+            )
+            for version in self.projects.get(req.project_name, {})
+        ]
+
+    def resolve_candidate(self, candidate):
+        reqs = self.projects[candidate.name][str(candidate.version)]
+        return (
+            DistInfo(
+                candidate.name,
+                candidate.version,
+                [pkg_resources.Requirement.parse(req) for req in reqs],
+            ),
+            False,
+        )
+
+    def close(self):
+        pass
+
+
+def test_backtrack_deep_graph(mocker):
+    """Backtracking removes the dependency chain of the downgraded node without
+    recursing through it"""
+    length = 5000
+    projects = {
+        "app": {"2.0": ["link-0", "pin<1"], "1.0": []},
+        "zlib": {"1.0": ["pin>=1"]},
+        "pin": {"0.5": [], "1.5": []},
+    }
+    for index in range(length):
+        projects["link-{}".format(index)] = {
+            "1.0": ["link-{}".format(index + 1)] if index + 1 < length else []
+        }
+    remove_spy = mocker.spy(req_compile.dists.DistributionCollection, "remove_dists")
+
+    results = req_compile.compile.perform_compile(
+        [
+            DistInfo(
+                "test",
+                None,
+                pkg_resources.parse_requirements(["app", "zlib"]),
+                meta=True,
+            )
+        ],
+        DictRepository(projects),
+    )
+
+    assert _real_outputs(results) == {"app==1.0", "pin==1.5", "zlib==1.0"}
+    assert not any(node.key.startswith("link-") for node in results[0])
+    assert remove_spy.called
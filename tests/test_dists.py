@@ -1,4 +1,7 @@
+import random
+
 import pkg_resources
+import pytest
 from pkg_resources import Requirement
 
 from req_compile.dists import DistributionCollection
@@ -174,3 +177,122 @@ def test_regular_and_extra_constraints():
     dists.add_dist(metadata_a, None, pkg_resources.Requirement.parse("a[test]"))
 
     assert dists["b"].build_constraints() == pkg_resources.Requirement.parse("b>2,>3")
+
+
+def test_placeholder_callback():
+    added = []
+    dists = DistributionCollection(on_placeholder=added.append)
+    dists.add_dist(
+        DistInfo("aaa", "1.2.0", pkg_resources.parse_requirements(["bbb<1.0"])),
+        None,
+        Requirement.parse("aaa"),
+    )
+    dists.add_dist(
+        DistInfo("ccc", "1.0.0", pkg_resources.parse_requirements(["bbb>0.5"])),
+        None,
+        Requirement.parse("ccc"),
+    )
+    assert added == [Requirement.parse("bbb<1.0")]
+
+
+def _brute_force_reaches(source, target):
+    seen = set()
+    stack = list(source.dependencies)
+    while stack:
+        node = stack.pop()
+        if node is target:
+            return True
+        if node not in seen:
+            seen.add(node)
+            stack.extend(node.dependencies)
+    return False
+
+
+def test_reaches_cycle():
+    dists = DistributionCollection()
+    dists.add_dist(
+        DistInfo(
+            "root", None, pkg_resources.parse_requirements(["aaa", "ccc"]), meta=True
+        ),
+        None,
+        None,
+    )
+    dists.add_dist(
+        DistInfo("aaa", "1.0.0", pkg_resources.parse_requirements(["bbb"])),
+        None,
+        None,
+    )
+    dists.add_dist(
+        DistInfo("bbb", "1.0.0", pkg_resources.parse_requirements(["ccc"])),
+        None,
+        None,
+    )
+    assert dists.reaches(dists["aaa"], dists["ccc"])
+    assert not dists.reaches(dists["ccc"], dists["aaa"])
+    assert not dists.reaches(dists["aaa"], dists["aaa"])
+
+    dists.add_dist(
+        DistInfo("ccc", "1.0.0", pkg_resources.parse_requirements(["aaa"])),
+        None,
+        None,
+    )
+    assert dists.reaches(dists["ccc"], dists["aaa"])
+    assert dists.reaches(dists["aaa"], dists["aaa"])
+
+    dists.remove_dists(dists["bbb"], remove_upstream=False)
+    assert not dists.reaches(dists["aaa"], dists["ccc"])
+    assert dists.reaches(dists["ccc"], dists["aaa"])
+    assert not dists.reaches(dists["aaa"], dists["aaa"])
+    assert dists.reaches(dists["root"], dists["aaa"])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reaches_matches_search(seed):
+    rand = random.Random(seed)
+    names = ["proj{}".format(idx) for idx in range(12)]
+    dists = DistributionCollection()
+    dists.add_dist(
+        DistInfo("root", None, pkg_resources.parse_requirements(names), meta=True),
+        None,
+        None,
+    )
+    for _ in range(60):
+        name = rand.choice(names)
+        if dists[name].metadata is not None and rand.random() < 0.3:
+            dists.remove_dists(dists[name], remove_upstream=False)
+        else:
+            others = [other for other in names if other != name]
+            deps = rand.sample(others, rand.randint(0, 3))
+            dists.add_dist(
+                DistInfo(name, "1.0.0", pkg_resources.parse_requirements(deps)),
+                None,
+                None,
+            )
+
+        for source in dists:
+            for target in dists:
+                assert dists.reaches(source, target) == _brute_force_reaches(
+                    source, target
+                )
+
+
+def test_constraints_follow_edges():
+    dists = DistributionCollection()
+    dists.add_dist(
+        DistInfo("aaa", "1.2.0", pkg_resources.parse_requirements(["bbb<1.0"])),
+        None,
+        Requirement.parse("aaa"),
+    )
+    assert dists["bbb"].build_constraints() == Requirement.parse("bbb<1.0")
+
+    dists.add_dist(
+        DistInfo("ccc", "1.0.0", pkg_resources.parse_requirements(["bbb[x]>0.5"])),
+        None,
+        Requirement.parse("ccc"),
+    )
+    assert dists["bbb"].build_constraints() == Requirement.parse("bbb[x]<1.0,>0.5")
+    assert dists["bbb"].extras == {"x"}
+
+    dists.remove_dists(dists["ccc"], remove_upstream=False)
+    assert dists["bbb"].build_constraints() == Requirement.parse("bbb<1.0")
+    assert dists["bbb"].extras == set()
@@ -1,6 +1,7 @@
+import pytest
 from pkg_resources import Requirement
 
-from req_compile.utils import merge_requirements
+from req_compile.utils import Constraint, merge_requirements
 
 
 def test_combine_reqs_conditions_and_markers():
@@ -90,3 +91,25 @@ def test_combine_with_extras_markers():
 
     result = merge_requirements(req1, req2)
     assert result == Requirement.parse('pylint; extra=="test"')
+
+
+def test_constraint_merges_in_place():
+    constraint = Constraint(Requirement.parse('Pylint[a]>1;python_version<"3.0"'))
+    constraint.merge(Requirement.parse("pylint<3"))
+    constraint.merge(Requirement.parse("pylint[b]!=2.0"))
+
+    assert constraint.name == "pylint"
+    assert constraint.extras == ("a", "b")
+    assert constraint.marker is None
+    assert constraint.to_requirement() == Requirement.parse("pylint[a,b]>1,<3,!=2.0")
+
+
+def test_constraint_unmerged_is_original():
+    req = Requirement.parse("Pylint>1")
+    assert Constraint(req).to_requirement() is req
+
+
+def test_constraint_other_project():
+    constraint = Constraint(Requirement.parse("pylint"))
+    with pytest.raises(ValueError):
+        constraint.merge(Requirement.parse("astroid"))
@@ -1,16 +1,22 @@
+import io
 import os
 import sys
+import tarfile
 
+import packaging.utils
 import pkg_resources
 import pytest
 import six
 
+import req_compile.containers
 import req_compile.metadata.dist_info
 import req_compile.metadata.extractor
 import req_compile.metadata
 import req_compile.filename
 import req_compile.metadata.metadata
+import req_compile.metadata.pyproject
 import req_compile.metadata.source
+import req_compile.utils
 
 
 def test_a_with_no_extra(metadata_provider):
@@ -65,6 +71,79 @@ def test_a_with_extra(metadata_provider):
     ]
 
 
+def test_requires_declared_extras():
+    info = req_compile.containers.DistInfo(
+        "a",
+        pkg_resources.parse_version("1.0"),
+        pkg_resources.parse_requirements(
+            [
+                "b",
+                "c; extra == 'x1'",
+                "d; python_version > '2.0' and (extra == 'x2' or extra == 'x3')",
+                "e; python_version > '2.0'",
+            ]
+        ),
+    )
+    assert info.declared_extras == {"x1", "x2", "x3"}
+    assert {req.name for req in info.requires()} == {"b", "e"}
+    assert {req.name for req in info.requires("x3")} == {"d", "e"}
+    assert {req.name for req in info.requires("nope")} == {"e"}
+    assert info.requires("x1") is info.requires("x1")
+
+    info.add_requirement(pkg_resources.Requirement.parse("f; extra == 'x1'"))
+    assert {req.name for req in info.requires("x1")} == {"c", "e", "f"}
+
+
+@pytest.mark.parametrize("extra", ["Security", "socks_proxy", "SOCKS.proxy"])
+def test_requires_extra_normalization(mocker, extra):
+    """Markers may match an extra spelled differently, which must not make the
+    requirements of undeclared extras any different"""
+    evaluate_marker = req_compile.utils.evaluate_marker
+    # packaging 22+ compares extras by their normalized names (PEP 685)
+    mocker.patch.object(
+        req_compile.utils,
+        "evaluate_marker",
+        side_effect=lambda marker, extra: evaluate_marker(
+            marker, packaging.utils.canonicalize_name(extra) if extra else extra
+        ),
+    )
+    info = req_compile.containers.DistInfo(
+        "a",
+        pkg_resources.parse_version("1.0"),
+        pkg_resources.parse_requirements(
+            [
+                "b",
+                "c; extra == 'security'",
+                "d; extra == 'socks-proxy'",
+            ]
+        ),
+    )
+    assert {req.name for req in info.requires(extra)} in ({"c"}, {"d"})
+    assert {req.name for req in info.requires("anything_else")} == set()
+    assert {req.name for req in info.requires("security")} == {"c"}
+    assert {req.name for req in info.requires("socks-proxy")} == {"d"}
+
+
+def test_pkg_resources_dist_info_temp_dir(tmpdir):
+    """Only the temporary directory the distribution was built in is removed"""
+    build_dir = tmpdir.join("build")
+    build_dir.join("setup.py").write("", ensure=True)
+
+    info = req_compile.containers.PkgResourcesDistInfo(
+        pkg_resources.Distribution(str(build_dir), project_name="a", version="1.0")
+    )
+    del info
+    assert build_dir.check(dir=True)
+
+    info = req_compile.containers.PkgResourcesDistInfo(
+        pkg_resources.Distribution(str(build_dir), project_name="a", version="1.0"),
+        temp_dir=str(build_dir),
+    )
+    del info
+    assert not build_dir.check()
+    assert tmpdir.check(dir=True)
+
+
 def test_a_with_wrong_extra(metadata_provider):
     info = metadata_provider("normal/a.METADATA", extras=("plop",))
     assert info.name == "a"
@@ -240,6 +319,69 @@ def test_source_dist(
         assert set(metadata.reqs) == set(pkg_resources.parse_requirements(reqs))
 
 
+@pytest.fixture
+def setup_py_workers():
+    req_compile.metadata.source.configure_setup_py_workers(2)
+    yield
+    req_compile.metadata.source.configure_setup_py_workers(0)
+
+
+@pytest.mark.parametrize("archive_fixture", ["mock_targz", "mock_zip"])
+@pytest.mark.parametrize(
+    "directory,name,version,reqs",
+    [source for source in sources if source[0] in ("dot-slash-dir-1.0", "svn-0.3.46")],
+)
+def test_source_dist_in_worker(
+    archive_fixture,
+    directory,
+    name,
+    version,
+    reqs,
+    mock_targz,
+    mock_zip,
+    mocker,
+    setup_py_workers,
+):
+    mock_parse = mocker.patch("req_compile.metadata.source._parse_setup_py")
+    mock_build = mocker.patch("req_compile.metadata.source._build_egg_info")
+
+    if archive_fixture == "mock_targz":
+        archive = mock_targz(directory)
+    else:
+        archive = mock_zip(directory)
+
+    metadata = req_compile.metadata.metadata.extract_metadata(archive)
+    # Only the worker process ran the setup.py
+    assert not mock_parse.called
+    assert not mock_build.called
+
+    assert metadata.name == name
+    assert metadata.version == pkg_resources.parse_version(version)
+    assert set(metadata.reqs) == set(pkg_resources.parse_requirements(reqs))
+
+
+def test_source_dist_static(mock_targz, mocker):
+    mock_parse = mocker.patch("req_compile.metadata.source._parse_setup_py")
+    # Nothing process-wide is patched, so other threads are unaffected
+    mocker.patch(
+        "req_compile.metadata.source._fake_working_dir", side_effect=AssertionError
+    )
+    mocker.patch("req_compile.metadata.source.patch", side_effect=AssertionError)
+    mocker.patch.dict(
+        req_compile.metadata.source.SETUP_PY_STATS, {"static": 0, "exec": 0}
+    )
+
+    metadata = req_compile.metadata.metadata.extract_metadata(
+        mock_targz("setup-cfg-0.2.0")
+    )
+
+    assert not mock_parse.called
+    assert req_compile.metadata.source.SETUP_PY_STATS == {"static": 1, "exec": 0}
+    expected = next(source for source in sources if source[0] == "setup-cfg-0.2.0")
+    assert metadata.name == expected[1]
+    assert set(metadata.reqs) == set(pkg_resources.parse_requirements(expected[3]))
+
+
 def test_relative_import(mock_targz):
     archive = mock_targz("relative-import-1.0")
 
@@ -259,3 +401,193 @@ def test_self_source():
 
     metadata = req_compile.metadata.metadata.extract_metadata(path)
     assert metadata.name == "req-compile"
+
+
+def _build_sdist(tmpdir, files):
+    archive = str(tmpdir.join("static-1.0.tar.gz"))
+    with tarfile.open(archive, "w:gz") as tarf:
+        for name, contents in files.items():
+            data = contents.encode("utf-8")
+            info = tarfile.TarInfo("static-1.0/" + name)
+            info.size = len(data)
+            tarf.addfile(info, io.BytesIO(data))
+    return archive
+
+
+FAILING_SETUP_PY = "raise RuntimeError('setup.py should not run')\n"
+
+
+PEP621_PYPROJECT = """
+[build-system]
+requires = ["not-installed-backend"]
+build-backend = "not_installed_backend.api"
+
+[project]
+name = "pep621"
+version = "1.2"
+dependencies = ["six", "enum34; python_version < '3'"]
+dynamic = ["readme"]
+
+[project.optional-dependencies]
+test = ["pytest>=4", "mock; python_version < '3.3' or implementation_name == 'pypy'"]
+"""
+
+
+def test_pyproject_static_project(tmpdir, mocker):
+    create_backend = mocker.patch(
+        "req_compile.metadata.pyproject._create_build_backend"
+    )
+    tmpdir.join("pyproject.toml").write(PEP621_PYPROJECT)
+
+    metadata = req_compile.metadata.metadata.extract_metadata(str(tmpdir))
+    assert not create_backend.called
+    assert metadata.name == "pep621"
+    assert metadata.version == pkg_resources.parse_version("1.2")
+    assert set(metadata.reqs) == set(
+        pkg_resources.parse_requirements(
+            [
+                "six",
+                "enum34; python_version < '3'",
+                'pytest>=4; extra == "test"',
+                "mock; (python_version < '3.3' or implementation_name == 'pypy') "
+                'and extra == "test"',
+            ]
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "dynamic", ["version", "dependencies", "optional-dependencies"]
+)
+def test_pyproject_dynamic_project(tmpdir, mocker, dynamic):
+    create_backend = mocker.patch(
+        "req_compile.metadata.pyproject._create_build_backend",
+        side_effect=ImportError,
+    )
+    tmpdir.join("pyproject.toml").write(
+        PEP621_PYPROJECT.replace('"readme"', '"readme", "{}"'.format(dynamic))
+    )
+
+    assert req_compile.metadata.pyproject.fetch_from_pyproject(str(tmpdir)) is None
+    assert create_backend.called
+
+
+@pytest.mark.parametrize(
+    "files, name",
+    [
+        ({"pyproject.toml": PEP621_PYPROJECT, "setup.py": ""}, "pep621"),
+        ({"setup.cfg": "[metadata]\nname = from-cfg\n"}, "from-cfg"),
+        ({"setup.cfg": "[metadata]\nname = attr: pkg.NAME\n"}, None),
+        (
+            {
+                "setup.py": "from setuptools import setup\n"
+                "NAME = 'from-setup'\n"
+                "setup(name=NAME, version=open('VERSION').read())\n",
+                "VERSION": "1.0",
+            },
+            "from-setup",
+        ),
+        ({"setup.py": "import setup_helper\nsetup_helper.setup()\n"}, None),
+        ({"pyproject.toml": "[build-system]\nrequires = []\n"}, None),
+    ],
+)
+def test_guess_project_name(tmpdir, files, name):
+    for filename, contents in files.items():
+        tmpdir.join(filename).write(contents)
+
+    assert req_compile.metadata.guess_project_name(str(tmpdir)) == name
+
+
+def test_sdist_static_pkg_info(tmpdir, mocker):
+    mock_setup_py = mocker.patch("req_compile.metadata.source._fetch_from_setup_py")
+    archive = _build_sdist(
+        tmpdir,
+        {
+            "PKG-INFO": "Metadata-Version: 2.2\nName: static\nVersion: 1.0\n"
+            "Dynamic: Description\nRequires-Dist: six\n"
+            "Requires-Dist: mock; extra == 'test'\n\n"
+            "Requires-Dist: not-a-header\n",
+            "setup.py": FAILING_SETUP_PY,
+        },
+    )
+
+    metadata = req_compile.metadata.metadata.extract_metadata(archive)
+    assert not mock_setup_py.called
+    assert metadata.name == "static"
+    assert metadata.version == pkg_resources.parse_version("1.0")
+    assert set(metadata.reqs) == set(
+        pkg_resources.parse_requirements(["six", "mock; extra == 'test'"])
+    )
+
+
+def test_sdist_egg_info_requires(tmpdir, mocker):
+    mock_setup_py = mocker.patch("req_compile.metadata.source._fetch_from_setup_py")
+    archive = _build_sdist(
+        tmpdir,
+        {
+            "PKG-INFO": "Metadata-Version: 1.0\nName: static\nVersion: 1.0\n",
+            "static.egg-info/PKG-INFO": "Metadata-Version: 1.0\nName: static\n",
+            "static.egg-info/requires.txt": "six>=1.0\n\n[test]\nmock\n\n"
+            '[:python_version < "3"]\nenum34\n\n'
+            '[win:sys_platform == "win32"]\npywin32\n',
+            "setup.py": FAILING_SETUP_PY,
+        },
+    )
+
+    metadata = req_compile.metadata.metadata.extract_metadata(archive)
+    assert not mock_setup_py.called
+    assert set(metadata.reqs) == set(
+        pkg_resources.parse_requirements(
+            [
+                "six>=1.0",
+                'mock; extra == "test"',
+                'enum34; python_version < "3"',
+                'pywin32; (sys_platform == "win32") and (extra == "win")',
+            ]
+        )
+    )
+
+
+def test_sdist_dynamic_ignores_egg_info_requires(tmpdir):
+    """The requires.txt shipped next to a PKG-INFO that declares its requirements
+    dynamic is no more reliable than the PKG-INFO"""
+    archive = _build_sdist(
+        tmpdir,
+        {
+            "PKG-INFO": "Metadata-Version: 2.2\nName: static\nVersion: 1.0\n"
+            "Dynamic: Requires-Dist\n",
+            "static.egg-info/PKG-INFO": "Metadata-Version: 2.2\nName: static\n",
+            "static.egg-info/requires.txt": "six\n",
+            "setup.py": "from setuptools import setup\n"
+            "setup(name='static', version='1.0', install_requires=['requests'])\n",
+        },
+    )
+
+    metadata = req_compile.metadata.metadata.extract_metadata(archive)
+    assert set(metadata.reqs) == set(pkg_resources.parse_requirements(["requests"]))
+
+
+@pytest.mark.parametrize(
+    "pkg_info",
+    [
+        # Requirements computed by setup.py
+        "Metadata-Version: 2.2\nName: static\nVersion: 1.0\nDynamic: Requires-Dist\n",
+        # Too old to say, and there is no .egg-info
+        "Metadata-Version: 2.1\nName: static\nVersion: 1.0\nRequires-Dist: six\n",
+        # Doesn't match the filename
+        "Metadata-Version: 2.2\nName: other\nVersion: 1.0\n",
+    ],
+)
+def test_sdist_dynamic_runs_setup_py(tmpdir, pkg_info):
+    archive = _build_sdist(
+        tmpdir,
+        {
+            "PKG-INFO": pkg_info,
+            "setup.py": "from setuptools import setup\n"
+            "setup(name='static', version='1.0', install_requires=['requests'])\n",
+        },
+    )
+
+    metadata = req_compile.metadata.metadata.extract_metadata(archive)
+    assert metadata.name == "static"
+    assert set(metadata.reqs) == set(pkg_resources.parse_requirements(["requests"]))
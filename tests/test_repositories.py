@@ -1,9 +1,20 @@
 import random
+import sys
 
 import pkg_resources
 import pytest
 
-from req_compile.repos.repository import WheelVersionTags, Candidate, sort_candidates, _wheel_candidate
+from req_compile.repos.repository import (
+    WheelVersionTags,
+    Candidate,
+    CandidateIndex,
+    SUPPORTED_TAGS,
+    check_usability,
+    filter_candidates,
+    sort_candidates,
+    _wheel_candidate,
+    _wheel_filename_compatible,
+)
 
 
 @pytest.mark.parametrize(
@@ -74,7 +85,10 @@ def test_sort_non_semver():
 
 def test_sort_specific_platforms(mock_py_version, mocker):
     mock_py_version("3.7.4")
-    mocker.patch("req_compile.repos.repository._get_platform_tags", return_value=("this_platform",))
+    mocker.patch.dict(
+        "req_compile.repos.repository._TAG_PRIORITY",
+        {("cp37", "none", "this_platform"): sys.maxsize},
+    )
     candidate_wheels = (
         "sounddevice-0.4.1-cp32.cp33.cp34.cp35.cp36.cp37.cp38.cp39.pp32.pp33.pp34.pp35.pp36.pp37.py3-None-this_platform.whl",
         "sounddevice-0.4.1-py3-None-any.whl",
@@ -91,3 +105,72 @@ def test_sort_specific_platforms(mock_py_version, mocker):
 
     candidates = sort_candidates(reversed(candidates))
     assert reference == candidates
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "",
+        "==1.0",
+        ">1.0,<2",
+        "~=1.1",
+        "==1.*",
+        "!=1.*",
+        "!=1.1,!=2.0",
+        ">=2.0rc1",
+        "<=1.0",
+        "==3",
+    ],
+)
+@pytest.mark.parametrize("allow_prereleases", [False, True])
+def test_candidate_index_matches_filter(mock_py_version, spec, allow_prereleases):
+    mock_py_version("3.7.4")
+    wheels = (
+        "thing-0.9-py3-none-any.whl",
+        "thing-1.0-py2-none-any.whl",
+        "thing-1.0-py3-none-any.whl",
+        "thing-1.0+local-py3-none-any.whl",
+        "thing-1.0.post1-py3-none-any.whl",
+        "thing-1.1-py2.py3-none-any.whl",
+        "thing-1.1.5-py3-none-any.whl",
+        "thing-2.0rc1-py3-none-any.whl",
+        "thing-2.0-py3-none-any.whl",
+        "thing-2.0-py3-none-not_a_platform.whl",
+        "thing-2.1.dev0-py3-none-any.whl",
+    )
+    candidates = [_wheel_candidate("pypi", wheel) for wheel in wheels]
+    random.shuffle(candidates)
+    req = pkg_resources.Requirement.parse("thing" + spec)
+
+    expected = sort_candidates(
+        filter_candidates(req, candidates, allow_prereleases=allow_prereleases)
+    )
+    index = CandidateIndex(candidates)
+    assert list(index.matching(req, allow_prereleases=allow_prereleases)) == expected
+    assert index.source is candidates
+    assert not index.all_prereleases
+
+
+@pytest.mark.parametrize(
+    "filename, compatible",
+    [
+        ("thing-1.0-py3-none-any.whl", True),
+        ("thing-1.0-py2.py3-none-any.whl", True),
+        ("thing-1.0-py2-none-any.whl", False),
+        ("thing-1.0-py3-none-not_a_platform.whl", False),
+        ("thing-1.0-py3-none-not_a_platform.any.whl", True),
+        ("thing-1.0-cp20-cp20m-any.whl", False),
+    ],
+)
+def test_wheel_tags_supported(filename, compatible):
+    candidate = _wheel_candidate("pypi", filename)
+    assert (candidate.tag_priority is not None) is compatible
+    assert (check_usability(None, candidate) is None) is compatible
+    assert _wheel_filename_compatible(filename) is compatible
+
+
+def test_supported_tags_preference():
+    assert SUPPORTED_TAGS
+    specific = _wheel_candidate("pypi", "thing-1.0-{}-{}-{}.whl".format(*SUPPORTED_TAGS[0]))
+    generic = _wheel_candidate("pypi", "thing-1.0-py3-none-any.whl")
+    assert sort_candidates([generic, specific]) == [specific, generic]
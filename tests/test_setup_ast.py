@@ -0,0 +1,196 @@
+import io
+import posixpath
+import textwrap
+
+import pytest
+
+from req_compile.metadata.setup_ast import evaluate_setup_kwargs
+
+FILES = {
+    "/pkg/requirements.txt": "six\n# comment\n\nrequests>=2.0\n",
+    "/pkg/version.txt": "1.2.3\n",
+}
+
+
+def _open(filename, *_args, **_kwargs):
+    assert posixpath.isabs(filename)
+    if filename not in FILES:
+        raise IOError("No such file {}".format(filename))
+    return io.StringIO(FILES[filename])
+
+
+def _evaluate(contents):
+    return evaluate_setup_kwargs(textwrap.dedent(contents), "/pkg/setup.py", _open)
+
+
+@pytest.mark.parametrize(
+    "contents, expected",
+    [
+        (
+            """
+            from setuptools import setup
+            setup(name="pkg", version="1.0", install_requires=["six"])
+            """,
+            {"name": "pkg", "version": "1.0", "install_requires": ["six"]},
+        ),
+        (
+            """
+            import setuptools
+            NAME = "pkg"
+            REQUIRES = ["six"]
+            REQUIRES += ["requests"]
+            REQUIRES.append("attrs")
+            setuptools.setup(name=NAME, install_requires=REQUIRES, zip_safe=False)
+            """,
+            {"name": "pkg", "install_requires": ["six", "requests", "attrs"]},
+        ),
+        (
+            """
+            import os
+            from setuptools import setup, find_packages
+            here = os.path.abspath(os.path.dirname(__file__))
+            with open(os.path.join(here, "requirements.txt")) as f:
+                reqs = [line.strip() for line in f if not line.startswith("#")]
+            reqs = [req for req in reqs if req]
+            setup(
+                name="pkg",
+                version=open("version.txt").read().strip(),
+                packages=find_packages(),
+                install_requires=reqs,
+                long_description=read("README.rst"),
+            )
+            """,
+            {
+                "name": "pkg",
+                "version": "1.2.3",
+                "install_requires": ["six", "requests>=2.0"],
+            },
+        ),
+        (
+            """
+            from distutils.core import setup
+            kwargs = dict(name="pkg", extras_require={"test": ["pytest"]})
+            kwargs["version"] = "2.0"
+            if __name__ == "__main__":
+                setup(install_requires=open("requirements.txt").read().splitlines(), **kwargs)
+            """,
+            {
+                "name": "pkg",
+                "version": "2.0",
+                "extras_require": {"test": ["pytest"]},
+                "install_requires": ["six", "# comment", "", "requests>=2.0"],
+            },
+        ),
+        (
+            """
+            from setuptools import setup
+            reqs = ["six"]
+            setup(name="pkg", install_requires=reqs)
+            reqs.append("requests")
+            """,
+            {"name": "pkg", "install_requires": ["six"]},
+        ),
+    ],
+)
+def test_static(contents, expected):
+    assert _evaluate(contents) == expected
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        # Conditional requirements depend on the running interpreter
+        """
+        import sys
+        from setuptools import setup
+        reqs = ["six"]
+        if sys.version_info < (3,):
+            reqs.append("futures")
+        setup(name="pkg", install_requires=reqs)
+        """,
+        # Aliases of a changed value are also unknown
+        """
+        import sys
+        from setuptools import setup
+        reqs = ["six"]
+        kwargs = {"install_requires": reqs}
+        if sys.platform == "win32":
+            reqs.append("pywin32")
+        setup(name="pkg", **kwargs)
+        """,
+        """
+        from setuptools import setup
+        from pkg import __version__
+        setup(name="pkg", version=__version__)
+        """,
+        """
+        from setuptools import setup
+        __version__ = None
+        exec(open("version.txt").read())
+        setup(name="pkg", version=__version__)
+        """,
+        # Placeholders for values of the running interpreter never compare equal
+        """
+        import sys
+        from setuptools import setup
+        setup(name="pkg", install_requires=["pywin32"] if sys.platform == "win32" else [])
+        """,
+        """
+        import os
+        from setuptools import setup
+        setup(name="pkg", install_requires=[] if os.name != "nt" else ["pywin32"])
+        """,
+        """
+        import sys
+        from setuptools import setup
+        setup(name="pkg", install_requires=["pywin32"] if sys.platform in ("win32",) else [])
+        """,
+        """
+        import sys
+        from setuptools import setup
+        setup(name="pkg", install_requires=sys.platform.startswith("win") and ["pywin32"] or [])
+        """,
+        """
+        import sys
+        from setuptools import setup
+        setup(name="pkg", install_requires=["enum34"] if not sys.version_info else [])
+        """,
+        """
+        import os
+        from setuptools import setup
+        setup(name="pkg", install_requires=["pywin32"] if os.name else [])
+        """,
+        """
+        import os
+        from setuptools import setup
+        setup(name="pkg", version="1.0.{}".format(os.name))
+        """,
+        """
+        import sys
+        from setuptools import setup
+        setup(name="pkg", version=f"1.0+{sys.platform}")
+        """,
+        """
+        from setuptools import setup
+        def main():
+            setup(name="pkg", version="1.0")
+        main()
+        """,
+        """
+        from setuptools import setup
+        setup(name="pkg", version="1.0", pbr=True)
+        """,
+        """
+        from setuptools import setup
+        setup(name="pkg", version="1.0", install_requires=open("missing.txt").readlines())
+        """,
+        """
+        print "Python 2"
+        """,
+        """
+        from setuptools import setup
+        """,
+    ],
+)
+def test_too_dynamic(contents):
+    assert _evaluate(contents) is None
@@ -1,26 +1,11 @@
 import pkg_resources
 import pytest
 
-from req_compile.versions import is_possible, _offset_minor_version
+from req_compile.versions import VersionSet, is_possible
 
 parse_req = pkg_resources.Requirement.parse
 
 
-@pytest.mark.parametrize(
-    "version, offset, result",
-    [
-        ("1", 1, "1.0.1"),
-        ("1", -1, "0.999999999.999999999"),
-        ("1.4.0", -1, "1.3.999999999"),
-        ("1.4.0", 1, "1.4.1"),
-        ("1.4.4.22", 1, "1.4.5.22"),
-    ],
-)
-def test_offset_version(version, offset, result):
-    version = pkg_resources.parse_version(version)
-    assert _offset_minor_version(version, offset) == pkg_resources.parse_version(result)
-
-
 def test_two_equals():
     assert not is_possible(parse_req("thing==1,==2"))
 
@@ -72,3 +57,63 @@ def test_gr():
 
 def test_lt():
     assert is_possible(parse_req("thing<1"))
+
+
+def test_compatible_release():
+    assert is_possible(parse_req("thing~=1.4.5,<1.5"))
+    assert not is_possible(parse_req("thing~=1.4.5,>=1.5"))
+    assert not is_possible(parse_req("thing~=2.2,<2.2"))
+    assert is_possible(parse_req("thing~=2.2,==2.9.1"))
+
+
+def test_prefix_match():
+    assert is_possible(parse_req("thing==1.*,>=1.9"))
+    assert is_possible(parse_req("thing==1.*,==1.0rc1"))
+    assert not is_possible(parse_req("thing==1.*,>=2.0.dev0"))
+    assert not is_possible(parse_req("thing==1.2.*,==1.3"))
+
+
+def test_not_equals_prefix():
+    assert not is_possible(parse_req("thing!=1.*,>=1,<1.9"))
+    assert is_possible(parse_req("thing!=1.*,>=1"))
+    assert not is_possible(parse_req("thing!=1.*,==1.5.post1"))
+
+
+def test_arbitrary_equality():
+    assert not is_possible(parse_req("thing===1.0,==2.0"))
+    assert is_possible(parse_req("thing===1.0,>=1.0"))
+    assert is_possible(parse_req("thing===foobar,==2.0"))
+
+
+def test_local_versions():
+    assert is_possible(parse_req("thing==1.0+cpu,!=1.0+gpu"))
+    assert is_possible(parse_req("thing==1.0+cpu,<=1.0"))
+
+
+@pytest.mark.parametrize(
+    "spec, version, contained",
+    [
+        ("==1.*", "1.5", True),
+        ("==1.*", "2.0", False),
+        ("!=1.*", "1.5", False),
+        ("!=1.*", "0.9", True),
+        ("~=1.4.5", "1.4.9", True),
+        ("~=1.4.5", "1.5.0", False),
+        (">1,!=2", "2.0+local", False),
+        (">1,!=2", "3", True),
+        ("", "0.1", True),
+    ],
+)
+def test_version_set_contains(spec, version, contained):
+    versions = VersionSet.from_requirement(parse_req("thing" + spec))
+    assert (pkg_resources.parse_version(version) in versions) is contained
+
+
+def test_version_set_intersection():
+    first = VersionSet.from_requirement(parse_req("thing>1,!=2,!=3"))
+    second = VersionSet.from_requirement(parse_req("thing>=2,<=3"))
+    result = first.intersection(second)
+    assert pkg_resources.parse_version("2.5") in result
+    assert pkg_resources.parse_version("2") not in result
+    assert pkg_resources.parse_version("3") not in result
+    assert first.isdisjoint(VersionSet.from_requirement(parse_req("thing<=1")))
@@ -0,0 +1,55 @@
+import os
+import time
+
+import pytest
+
+from req_compile.metadata.workers import WorkerError, WorkerPool
+
+
+@pytest.fixture
+def pool():
+    worker_pool = WorkerPool(1, timeout=10)
+    yield worker_pool
+    worker_pool.close()
+
+
+def _worker_pid(worker_pool):
+    return worker_pool.run(os.getpid)
+
+
+def test_run_returns_result(pool):
+    assert pool.run(sum, [1, 2, 3]) == 6
+    assert _worker_pid(pool) != os.getpid()
+
+
+def test_job_error_keeps_worker(pool):
+    pid = _worker_pid(pool)
+    with pytest.raises(WorkerError, match="ValueError"):
+        pool.run(int, "not a number")
+    assert _worker_pid(pool) == pid
+
+
+def test_timeout_replaces_worker(pool):
+    pid = _worker_pid(pool)
+    pool.timeout = 0.5
+    with pytest.raises(WorkerError, match="Timed out"):
+        pool.run(time.sleep, 30)
+    pool.timeout = 10
+    assert _worker_pid(pool) != pid
+
+
+def test_exited_worker_replaced(pool):
+    pid = _worker_pid(pool)
+    with pytest.raises(WorkerError, match="exited"):
+        pool.run(os._exit, 3)
+    assert _worker_pid(pool) != pid
+
+
+def test_worker_recycled_after_max_jobs():
+    worker_pool = WorkerPool(1, timeout=10, max_jobs_per_worker=2)
+    try:
+        first = _worker_pid(worker_pool)
+        assert _worker_pid(worker_pool) == first
+        assert _worker_pid(worker_pool) != first
+    finally:
+        worker_pool.close()